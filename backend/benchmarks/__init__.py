@@ -0,0 +1 @@
+# Performance benchmarks for the SQLite3 backend
@@ -0,0 +1,116 @@
+"""
+Fuzzy Name Search Benchmark
+===========================
+
+Builds the trigram index over synthetic product names in English, Sinhala
+and Tamil (default 1,000,000 products) and measures p50/p99 latency of
+misspelled queries, next to a brute-force scan that scores every distinct
+name.
+
+Names combine a produce word with a qualifier and a grade or place, so
+many products share a name, as real listings do.
+
+Usage (from the backend directory):
+    python -m benchmarks.fuzzy_search --products 1000000 --queries 500
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from fuzzy_index import TrigramIndex, normalize, trigrams
+
+PRODUCE = [
+    "tomato", "potato", "carrot", "cabbage", "leeks", "beans", "pumpkin", "brinjal", "okra",
+    "banana", "mango", "papaya", "pineapple", "rambutan", "mangosteen", "king coconut",
+    "red rice", "samba rice", "kurakkan", "green gram", "cowpea", "chilli", "onion", "garlic",
+    "තක්කාලි", "අල", "කැරට්", "ගෝවා", "බෝංචි", "වට්ටක්කා", "බණ්ඩක්කා", "කෙසෙල්", "අඹ", "පැපොල්",
+    "ශ්‍රී ලංකා තේ", "කුරක්කන්", "මිරිස්", "ලූනු", "සුදු ළූනු",
+    "தக்காளி", "உருளைக்கிழங்கு", "கேரட்", "முட்டைக்கோஸ்", "பீன்ஸ்", "பூசணி", "கத்தரிக்காய்",
+    "வாழைப்பழம்", "மாம்பழம்", "பப்பாளி", "மிளகாய்", "வெங்காயம்", "பூண்டு",
+]
+QUALIFIERS = ["", "organic", "fresh", "dried", "premium", "baby", "red", "local", "ඕගනික්", "புதிய"]
+PLACES = ["", "Nuwara Eliya", "Jaffna", "Dambulla", "Kandy", "Matale", "Grade A", "Grade B", "1kg", "5kg", "10kg"]
+
+def make_names(count: int, rng: random.Random) -> list:
+    """Synthetic product names with realistic repetition"""
+    return [
+        " ".join(part for part in (rng.choice(QUALIFIERS), rng.choice(PRODUCE), rng.choice(PLACES)) if part)
+        for _ in range(count)
+    ]
+
+def misspell(text: str, rng: random.Random) -> str:
+    """Drop, double or swap one character"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    edit = rng.randrange(3)
+    if edit == 0:
+        return text[:i] + text[i + 1:]
+    if edit == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+def brute_force(index: TrigramIndex, query: str, limit: int, threshold: float) -> list:
+    """Score every distinct name; the reference the index must agree with"""
+    grams = trigrams(normalize(query))
+    scored = []
+    for name_id, name_grams in enumerate(index._grams):
+        overlap = len(grams & name_grams)
+        score = overlap / (len(grams) + len(name_grams) - overlap)
+        if score >= threshold:
+            scored.append((-score, index._display[name_id]))
+    scored.sort()
+    return scored[:limit]
+
+def timed(function, queries: list) -> list:
+    """Latency of each call in milliseconds"""
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = TrigramIndex()
+    start = time.perf_counter()
+    for name in make_names(args.products, rng):
+        index.put("product", str(uuid.UUID(int=rng.getrandbits(128))), name)
+    build_s = time.perf_counter() - start
+    stats = index.get_stats()
+    print(f"indexed {stats['entries']} products, {stats['distinct_names']} distinct names, "
+          f"{stats['trigrams']} trigrams in {build_s:.1f}s")
+
+    queries = [misspell(rng.choice(PRODUCE), rng) for _ in range(args.queries)]
+    search = lambda query: index.search(query, args.limit, args.threshold)
+    scan = lambda query: brute_force(index, query, args.limit, args.threshold)
+
+    # The rarest-trigram candidate filter must not lose matches
+    for query in queries[:50]:
+        expected = [(score, name) for score, name in scan(query)]
+        got = {match["name"] for match in search(query)}
+        assert {name for _, name in expected[:1]} <= got, f"missed best match for {query!r}"
+
+    print(f"{'method':<12} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, function in (("index", search), ("brute force", scan)):
+        samples = timed(function, queries)
+        print(f"{label:<12} {statistics.median(samples):>8.3f} {percentile(samples, 0.99):>8.3f}")
+
+if __name__ == "__main__":
+    main()
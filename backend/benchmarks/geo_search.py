@@ -0,0 +1,164 @@
+"""
+Geospatial Search Benchmark
+===========================
+
+Builds a database with synthetic listings (default 1,000,000) spread around
+Sri Lankan towns, then measures p50/p99 latency of the "near me" product
+query (first page, nearest first) with and without a category filter and
+the farmer directory radius query, all through geo.fetch_nearest. Baselines:
+the same R*Tree query over the whole radius at once, and a full scan that
+computes the distance for every listing.
+
+The database is built once and reused on later runs with the same path.
+
+Usage (from the backend directory):
+    python -m benchmarks.geo_search --listings 1000000 --queries 300
+    python -m benchmarks.geo_search --db /tmp/geo.db --radius 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import time
+import uuid
+
+import aiosqlite
+
+from database import DatabaseManager
+from geo import bounding_box, fetch_nearest, haversine_km, parse_near
+from routes.products import PRODUCT_NEAR_QUERY
+from routes.users import FARMER_NEAR_QUERY
+from benchmarks.fuzzy_search import make_names, percentile
+
+# (latitude, longitude) of towns listings cluster around
+TOWNS = [
+    (6.9271, 79.8612), (7.2906, 80.6337), (9.6615, 80.0255), (7.8731, 80.6511), (6.0535, 80.2210),
+    (6.9497, 80.7891), (7.4675, 80.6234), (8.3114, 80.4037), (7.2083, 79.8358), (6.7056, 80.3847),
+    (7.7102, 81.6924), (8.5874, 81.2152), (6.9934, 81.0550), (8.0362, 79.8283), (6.1429, 81.1212),
+]
+
+CATEGORIES = 20
+
+def point(rng: random.Random) -> tuple:
+    """A location scattered around a random town, roughly 15 km across"""
+    lat, lon = rng.choice(TOWNS)
+    return round(rng.gauss(lat, 0.07), 6), round(rng.gauss(lon, 0.07), 6)
+
+def build(path: str, listings: int, farmers: int, rng: random.Random):
+    """Create and fill the benchmark database through the normal migrations and triggers"""
+    manager = DatabaseManager()
+    manager.db_path = path
+    asyncio.run(manager.init_database())
+    db = sqlite3.connect(path)
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128)))
+    categories = [new_id() for _ in range(CATEGORIES)]
+    db.executemany(
+        "INSERT INTO product_categories (category_id, name) VALUES (?, ?)",
+        [(category_id, f"Category {number}") for number, category_id in enumerate(categories)],
+    )
+    sellers = [new_id() for _ in range(farmers)]
+    db.executemany(
+        "INSERT INTO users (user_id, user_type, full_name, latitude, longitude) VALUES (?, 'farmer', ?, ?, ?)",
+        [(user_id, f"Farmer {number}", *point(rng)) for number, user_id in enumerate(sellers)],
+    )
+    batch = 50_000
+    names = make_names(min(listings, batch), rng)
+    for offset in range(0, listings, batch):
+        db.executemany(
+            """
+            INSERT INTO products (product_id, seller_id, category_id, name, price, latitude, longitude, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now', ?))
+            """,
+            [
+                (new_id(), rng.choice(sellers), rng.choice(categories), names[i % len(names)],
+                 rng.randrange(50, 5000), *point(rng), f"-{offset + i} seconds")
+                for i in range(min(batch, listings - offset))
+            ],
+        )
+        db.commit()
+    db.execute("ANALYZE")
+    db.commit()
+    db.close()
+
+async def timed(run, arguments: list) -> list:
+    """Latency of each awaited call in milliseconds"""
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        await run(argument)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+async def measure(args, rng: random.Random):
+    db = await aiosqlite.connect(args.db)
+    await db.create_function("haversine_km", 4, haversine_km, deterministic=True)
+    cursor = await db.execute("SELECT COUNT(*), COUNT(latitude) FROM products")
+    total, located = await cursor.fetchone()
+    cursor = await db.execute("SELECT category_id FROM product_categories")
+    category_ids = [row[0] for row in await cursor.fetchall()]
+    print(f"{total} listings, {located} with coordinates, radius {args.radius} km")
+
+    centres = [f"{lat},{lon}" for lat, lon in (point(rng) for _ in range(args.queries))]
+    categories = {centre: rng.choice(category_ids) for centre in centres}
+
+    async def rings(centre):
+        await fetch_nearest(db, PRODUCT_NEAR_QUERY, {}, centre, args.radius, args.limit)
+
+    async def rings_category(centre):
+        values = {"category_id": categories[centre], "status": "active"}
+        await fetch_nearest(db, PRODUCT_NEAR_QUERY, values, centre, args.radius, args.limit)
+
+    async def farmers(centre):
+        await fetch_nearest(db, FARMER_NEAR_QUERY, {}, centre, args.radius, args.limit)
+
+    async def whole_radius(centre):
+        lat, lon = parse_near(centre)
+        query, params = PRODUCT_NEAR_QUERY.build(
+            {}, args.limit, base_params=(lat, lon, *bounding_box(lat, lon, args.radius), args.radius)
+        )
+        await (await db.execute(query, params)).fetchall()
+
+    async def full_scan(centre):
+        await (await db.execute("""
+            SELECT p.*, haversine_km(p.latitude, p.longitude, ?, ?) AS distance_km
+            FROM products p
+            WHERE distance_km <= ?
+            ORDER BY distance_km, p.product_id LIMIT ?
+        """, (*parse_near(centre), args.radius, args.limit))).fetchall()
+
+    print(f"{'query':<22} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, run, sample in (
+        ("near", rings, centres),
+        ("near + category", rings_category, centres),
+        ("farmers near", farmers, centres),
+        ("near, single radius", whole_radius, centres),
+        ("full scan", full_scan, centres[:args.scan_queries]),
+    ):
+        samples = await timed(run, sample)
+        print(f"{label:<22} {statistics.median(samples):>9.3f} {percentile(samples, 0.99):>9.3f}")
+    await db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--farmers", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--scan-queries", type=int, default=5, help="queries for the slow full-scan baseline")
+    parser.add_argument("--radius", type=float, default=10.0)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", default="/tmp/geo_search_benchmark.db")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if not os.path.exists(args.db):
+        start = time.perf_counter()
+        build(args.db, args.listings, args.farmers, rng)
+        print(f"built {args.listings} listings in {time.perf_counter() - start:.1f}s")
+    asyncio.run(measure(args, rng))
+
+if __name__ == "__main__":
+    main()
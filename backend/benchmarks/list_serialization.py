@@ -0,0 +1,116 @@
+"""
+List Endpoint Serialization Benchmark
+=====================================
+
+Measures p50/p99 latency of a limit=1000 product page encoded two ways:
+
+- response_model: the route returns mapped models and FastAPI validates
+  every row again against List[ProductWithDetails] before encoding
+- fast path: the route returns encode_list(...), which serializes the
+  trusted rows straight to JSON bytes with one compiled TypeAdapter
+
+Both routes map the same in-memory rows per request, so the difference
+is the response encoding path only.
+
+Usage (from the backend directory):
+    python -m benchmarks.list_serialization --rows 1000 --requests 300
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from models import ProductWithDetails, product_details_mapper
+from serialization import encode_list
+
+COLUMNS = (
+    "product_id", "seller_id", "category_id", "name", "description", "price",
+    "quantity_available", "unit", "images", "location", "harvest_date", "expiry_date",
+    "is_organic", "status", "created_at", "updated_at", "seller_name", "category_name",
+)
+
+class FakeCursor:
+    """Stands in for an aiosqlite cursor over the products listing query"""
+    description = tuple((name, None, None, None, None, None, None) for name in COLUMNS)
+
+def make_rows(count: int) -> list:
+    """Rows shaped like SELECT p.*, seller_name, category_name"""
+    now = datetime(2025, 1, 1)
+    return [
+        (
+            str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4()), f"Product {i}",
+            "Fresh produce from the hill country, harvested this week.", 120.5 + i, 40,
+            "kg", None, "Nuwara Eliya", "2025-01-01", "2025-01-15", i % 2, "active",
+            str(now - timedelta(minutes=i)), str(now - timedelta(minutes=i)),
+            "Farmer Name", "Vegetables",
+        )
+        for i in range(count)
+    ]
+
+def build_app(rows: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/response-model", response_model=List[ProductWithDetails])
+    async def response_model_path():
+        return product_details_mapper.from_rows(FakeCursor, rows)
+
+    @app.get("/fast-path", response_model=List[ProductWithDetails])
+    async def fast_path():
+        return encode_list(ProductWithDetails, product_details_mapper.from_rows(FakeCursor, rows))
+
+    return app
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> dict:
+    """Sequential request latencies in milliseconds"""
+    for _ in range(10):
+        await client.get(path)
+    samples = []
+    body_size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        body_size = len(response.content)
+    return {
+        "path": path,
+        "p50": statistics.median(samples),
+        "p99": percentile(samples, 0.99),
+        "bytes": body_size,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    app = build_app(make_rows(args.rows))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        slow = await client.get("/response-model")
+        fast = await client.get("/fast-path")
+        assert slow.json() == fast.json(), "fast path must produce the same JSON"
+
+        results = [
+            await measure(client, "/response-model", args.requests),
+            await measure(client, "/fast-path", args.requests),
+        ]
+
+    print(f"{'path':<16} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>9}")
+    for r in results:
+        print(f"{r['path']:<16} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['bytes']:>9}")
+    print(f"p50 speedup: {results[0]['p50'] / results[1]['p50']:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Chat Message Write Throughput Benchmark
+=======================================
+
+Compares messages/sec for a per-message commit against the group-commit
+writer used by POST /api/messages/. Both write the statements of
+routes.messages.message_statements, exactly as create_message does: take
+the conversation's next sequence number, insert the message and bump the
+recipient's unread counter.
+
+Runs against a throwaway database, never backend/data/application.db.
+
+Usage (from the backend directory):
+    python -m benchmarks.message_throughput --messages 5000 --senders 64
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from database import DatabaseManager
+from models import MessageCreate
+from routes.messages import message_statements
+
+async def setup(manager: DatabaseManager):
+    """Create the schema plus two users and a conversation"""
+    await manager.init_database()
+    buyer_id, farmer_id, conversation_id = (str(uuid.uuid4()) for _ in range(3))
+    async with await manager.get_write_connection() as db:
+        await db.executemany(
+            "INSERT INTO users (user_id, user_type, full_name) VALUES (?, ?, ?)",
+            [(buyer_id, "buyer", "Bench Buyer"), (farmer_id, "farmer", "Bench Farmer")],
+        )
+        await db.execute(
+            "INSERT INTO conversations (conversation_id, participant_1_id, participant_2_id) VALUES (?, ?, ?)",
+            (conversation_id, buyer_id, farmer_id),
+        )
+        await db.commit()
+    return conversation_id, buyer_id
+
+def statements(conversation_id: str, sender_id: str, i: int):
+    """Statements written for one chat message"""
+    message = MessageCreate(conversation_id=conversation_id, sender_id=sender_id, content=f"Benchmark message {i}")
+    return message_statements(str(uuid.uuid4()), message, datetime.utcnow())
+
+async def per_message_commit(manager, conversation_id, sender_id, i):
+    """One transaction and one fsync per message"""
+    async with await manager.get_write_connection() as db:
+        for sql, params in statements(conversation_id, sender_id, i):
+            await db.execute(sql, params)
+        await db.commit()
+
+async def group_commit(manager, conversation_id, sender_id, i):
+    """Group-commit path used by create_message"""
+    await manager.group_commit(statements(conversation_id, sender_id, i))
+
+async def run(mode, write, total: int, senders: int) -> dict:
+    """Send `total` messages from `senders` concurrent tasks"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager()
+        manager.db_path = str(Path(tmp) / "bench.db")
+        conversation_id, sender_id = await setup(manager)
+
+        async def sender(offset: int):
+            for i in range(offset, total, senders):
+                await write(manager, conversation_id, sender_id, i)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(n) for n in range(senders)))
+        elapsed = time.perf_counter() - start
+
+        stats = manager.get_pool_stats()["group_commit"]
+        await manager.close()
+    return {
+        "mode": mode,
+        "messages": total,
+        "seconds": elapsed,
+        "messages_per_sec": total / elapsed,
+        "avg_batch": stats["avg_batch_size"] or 1.0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=64)
+    args = parser.parse_args()
+
+    results = [
+        await run("per-message commit", per_message_commit, args.messages, args.senders),
+        await run("group commit", group_commit, args.messages, args.senders),
+    ]
+
+    print(f"{'mode':<20} {'messages':>9} {'seconds':>9} {'msg/sec':>10} {'avg batch':>10}")
+    for r in results:
+        print(f"{r['mode']:<20} {r['messages']:>9} {r['seconds']:>9.2f} {r['messages_per_sec']:>10.0f} {r['avg_batch']:>10.1f}")
+    print(f"speedup: {results[1]['messages_per_sec'] / results[0]['messages_per_sec']:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Autocomplete Benchmark
+======================
+
+Loads the suggestion index with synthetic products (default 1,000,000)
+through SuggestIndex.load(), as on server startup, then replays keystroke sequences: every prefix of a random produce name, as the
+search box sends them. Reports p50/p99 latency per keystroke and the time to
+apply a product write.
+
+Usage (from the backend directory):
+    python -m benchmarks.suggest --products 1000000 --words 300
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import aiosqlite
+
+from suggest_index import SuggestIndex
+from benchmarks.fuzzy_search import PRODUCE, make_names, percentile
+
+async def load(index: SuggestIndex, inserts: list):
+    """Fill an in-memory database with just the columns load() reads, then load from it"""
+    async with aiosqlite.connect(":memory:") as db:
+        await db.executescript("""
+            CREATE TABLE product_categories (category_id, name, is_active);
+            CREATE TABLE users (user_id, full_name, user_type, is_active);
+            CREATE TABLE products (product_id, name, category_id, seller_id, status);
+            CREATE TABLE orders (product_id);
+        """)
+        for sql, rows in inserts:
+            await db.executemany(sql, rows)
+        await index.load(db)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--farmers", type=int, default=20_000)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128)))
+    categories = [new_id() for _ in range(args.categories)]
+    farmers = [new_id() for _ in range(args.farmers)]
+    product_ids = [new_id() for _ in range(args.products)]
+    index = SuggestIndex()
+    start = time.perf_counter()
+    asyncio.run(load(index, [
+        ("INSERT INTO product_categories VALUES (?, ?, 1)",
+         [(category_id, f"{rng.choice(PRODUCE)} {number}") for number, category_id in enumerate(categories)]),
+        ("INSERT INTO users VALUES (?, ?, 'farmer', 1)",
+         [(user_id, f"Farmer {number}") for number, user_id in enumerate(farmers)]),
+        ("INSERT INTO products VALUES (?, ?, ?, ?, 'active')",
+         [(product_id, name, rng.choice(categories), rng.choice(farmers))
+          for product_id, name in zip(product_ids, make_names(args.products, rng))]),
+    ]))
+    stats = index.get_stats()
+    print(f"loaded {stats['suggestions']} suggestions, {stats['keys']} keys in {time.perf_counter() - start:.1f}s (incl. database fill)")
+
+    keystrokes = []
+    for _ in range(args.words):
+        word = rng.choice(PRODUCE)
+        keystrokes.extend(word[:length] for length in range(1, len(word) + 1))
+
+    samples = []
+    for prefix in keystrokes:
+        # A listing changes between keystrokes, invalidating some cached prefixes
+        index.put_product(rng.choice(product_ids), rng.choice(PRODUCE), rng.choice(categories), rng.choice(farmers))
+        started = time.perf_counter()
+        index.suggest(prefix, 10)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    writes = []
+    for _ in range(1000):
+        started = time.perf_counter()
+        index.put_product(rng.choice(product_ids), rng.choice(PRODUCE), rng.choice(categories), rng.choice(farmers))
+        writes.append((time.perf_counter() - started) * 1000)
+
+    print(f"{'operation':<10} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'keystroke':<10} {statistics.median(samples):>8.3f} {percentile(samples, 0.99):>8.3f}")
+    print(f"{'write':<10} {statistics.median(writes):>8.3f} {percentile(writes, 0.99):>8.3f}")
+    print(f"cache hit rate: {index.get_stats()['cache_hit_rate']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Content-addressed blob store for product images.
+
+A blob is stored once under data/blobs, named by the SHA-256 of its bytes,
+so uploading the same photo twice costs no extra space and a blob's id never
+points at different content. Products keep only blob ids in their images
+column; the bytes are served by the images route, which can cache them
+forever because an id's content never changes.
+
+Uploads are streamed to a temporary file while hashing and moved into place
+once complete, so a reader never sees a partial blob. Size and content type
+are recorded in the blobs table.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from database import DATABASE_PATH
+
+BLOB_ROOT = DATABASE_PATH.parent / "blobs"
+
+# Largest accepted upload
+MAX_BLOB_BYTES = 10 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of accepted image formats
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+class BlobTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_BLOB_BYTES"""
+
+class UnsupportedBlobError(Exception):
+    """Raised when an upload is not an accepted image format"""
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Image content type from a blob's first bytes, None if not an accepted format"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+class BlobStore:
+    """SHA-256 addressed files under a root directory"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path_for(self, blob_id: str) -> Path:
+        """File holding a blob; the first two hex digits fan out directories"""
+        return self.root / blob_id[:2] / blob_id
+
+    def exists(self, blob_id: str) -> bool:
+        return bool(BLOB_ID.match(blob_id)) and self.path_for(blob_id).is_file()
+
+    async def save(self, chunks: AsyncIterator[bytes], max_bytes: int = MAX_BLOB_BYTES) -> Tuple[str, int, str, bool]:
+        """
+        Stream chunks to disk; returns (blob_id, size, content_type, created).
+        created is False when identical content was already stored.
+        """
+        staging = self.root / "tmp"
+        await asyncio.to_thread(staging.mkdir, parents=True, exist_ok=True)
+        temp_path = staging / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        file = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BlobTooLargeError(f"Uploads are limited to {max_bytes} bytes")
+                if len(head) < 16:
+                    head += chunk[:16]
+                digest.update(chunk)
+                await asyncio.to_thread(file.write, chunk)
+            await asyncio.to_thread(file.close)
+
+            content_type = sniff_content_type(head)
+            if content_type is None:
+                raise UnsupportedBlobError("Only JPEG, PNG, GIF and WebP images are accepted")
+            blob_id = digest.hexdigest()
+            created = await asyncio.to_thread(self._commit, temp_path, blob_id)
+            return blob_id, size, content_type, created
+        finally:
+            file.close()
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def save_bytes(self, data: bytes) -> Tuple[str, int, str]:
+        """Store an in-memory blob; returns (blob_id, size, content_type)"""
+        content_type = sniff_content_type(data[:16])
+        if content_type is None:
+            raise UnsupportedBlobError("Only JPEG, PNG, GIF and WebP images are accepted")
+        blob_id = hashlib.sha256(data).hexdigest()
+        staging = self.root / "tmp"
+        staging.mkdir(parents=True, exist_ok=True)
+        temp_path = staging / uuid.uuid4().hex
+        try:
+            temp_path.write_bytes(data)
+            self._commit(temp_path, blob_id)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return blob_id, len(data), content_type
+
+    def _commit(self, temp_path: Path, blob_id: str) -> bool:
+        """Move a finished upload into place unless identical content is already stored"""
+        final = self.path_for(blob_id)
+        if final.exists():
+            return False
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, final)
+        return True
+
+    def discard(self, blob_id: str):
+        """Remove a blob file whose metadata was never recorded"""
+        self.path_for(blob_id).unlink(missing_ok=True)
+
+    def read_range(self, blob_id: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield bytes start..end (inclusive) of a blob without blocking the event loop"""
+        return read_file_range(self.path_for(blob_id), start, end, chunk_size)
+
+async def read_file_range(path: Path, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a file without blocking the event loop"""
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(file.close)
+
+# Global blob store instance
+blob_store = BlobStore(BLOB_ROOT)
@@ -0,0 +1,266 @@
+"""
+Read-through caches of serialized responses.
+
+Product, category, user and profile details change rarely but are read on
+every page view. An EntityCache keeps the encoded JSON body (and ETag) of
+those responses keyed by entity ID, so a repeat read is served without a
+connection, a JOIN or serialization.
+
+Entries are invalidated precisely by the routes that write the entity
+(invalidate()), and by writes to entities whose data they embed, such as a
+product's seller and category names (depends_on / invalidate_dependents()).
+Writes made outside the API (scripts, the shell) are not seen; TTL bounds how
+long such a change can go unnoticed. Entries are evicted least recently used
+beyond MAX_ENTRIES or MAX_BYTES of bodies. The cache is per process.
+
+A TaggedCache does the same for list queries, keyed by normalized query
+parameters: each entry is tagged with what it was filtered by, and a write
+drops only the entries whose tags it touches.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Request, Response
+
+from etags import matches, not_modified, tagged
+from serialization import json_response
+
+# Seconds an entry is served before it is read again
+TTL = 60.0
+
+# Bounds per cache
+MAX_ENTRIES = 10_000
+MAX_BYTES = 16 * 1024 * 1024
+
+class CachedResponse(NamedTuple):
+    """An encoded response body with its ETag, if any, and other headers"""
+    body: bytes
+    etag: Optional[str]
+    expires: float
+    headers: Optional[dict] = None
+
+    def respond(self, request: Request) -> Response:
+        """The cached response, or 304 when If-None-Match lists its ETag"""
+        if self.etag is None:
+            return json_response(self.body, self.headers)
+        if matches(request, self.etag):
+            return not_modified(self.etag)
+        return tagged(json_response(self.body, self.headers), self.etag)
+
+class ResponseCache:
+    """LRU + TTL cache of encoded responses, bounded by entries and body bytes"""
+
+    def __init__(self, name: str, ttl: float = TTL, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self.bytes = 0
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Take before reading the database; put() skips the result if a write invalidated since"""
+        return self.invalidations
+
+    def _get(self, key: tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _put(self, key: tuple, response: Response, generation: int, headers: Optional[dict] = None) -> bool:
+        """Keep a full response; False when a write invalidated since generation or the body is too large"""
+        if generation != self.invalidations or len(response.body) > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        entry = CachedResponse(response.body, response.headers.get("etag"), time.monotonic() + self.ttl, headers)
+        self._entries[key] = entry
+        self.bytes += len(entry.body)
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry.body)
+
+    def clear(self):
+        """Drop every entry"""
+        self.invalidations += 1
+        self._entries.clear()
+        self.bytes = 0
+
+    def get_stats(self) -> dict:
+        """Get hit rate and memory use"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class EntityCache(ResponseCache):
+    """Response cache per entity ID and field selection"""
+
+    def __init__(self, name: str, ttl: float = TTL, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        super().__init__(name, ttl, max_entries, max_bytes)
+        # entity ID -> its cached variants, and (kind, ID) it embeds -> entity IDs
+        self._variants: Dict[str, Set[tuple]] = {}
+        self._dependents: Dict[Tuple[str, str], Set[str]] = {}
+        self._depends_on: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        _registry[name] = self
+
+    def get(self, entity_id: str, variant: tuple = ()) -> Optional[CachedResponse]:
+        return self._get((entity_id, variant))
+
+    def put(
+        self,
+        entity_id: str,
+        variant: tuple,
+        response: Response,
+        generation: int,
+        depends_on: Iterable[Tuple[str, Optional[str]]] = (),
+    ):
+        """
+        Keep a full response's body and ETag. depends_on lists the (kind, ID)
+        of other entities whose data the body embeds, e.g. ("user", seller_id).
+        """
+        if not self._put((entity_id, variant), response, generation):
+            return
+        self._variants.setdefault(entity_id, set()).add(variant)
+        dependencies = tuple(dependency for dependency in depends_on if dependency[1] is not None)
+        if dependencies and entity_id not in self._depends_on:
+            self._depends_on[entity_id] = dependencies
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(entity_id)
+        self._evict()
+
+    def _remove(self, key: tuple):
+        super()._remove(key)
+        entity_id, variant = key
+        variants = self._variants[entity_id]
+        variants.discard(variant)
+        if not variants:
+            del self._variants[entity_id]
+            self._forget_dependencies(entity_id)
+
+    def _forget_dependencies(self, entity_id: str):
+        for dependency in self._depends_on.pop(entity_id, ()):
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(entity_id)
+                if not dependents:
+                    del self._dependents[dependency]
+
+    def invalidate(self, entity_id: str):
+        """Drop every cached variant of an entity after it is written"""
+        self.invalidations += 1
+        for variant in list(self._variants.get(entity_id, ())):
+            self._remove((entity_id, variant))
+
+    def invalidate_dependents(self, kind: str, entity_id: str):
+        """Drop the entries embedding data of another entity after that entity is written"""
+        self.invalidations += 1
+        for dependent in list(self._dependents.get((kind, entity_id), ())):
+            for variant in list(self._variants.get(dependent, ())):
+                self._remove((dependent, variant))
+
+    def clear(self):
+        super().clear()
+        self._variants.clear()
+        self._dependents.clear()
+        self._depends_on.clear()
+
+    def get_stats(self) -> dict:
+        """Get hit rate and memory use"""
+        return {**super().get_stats(), "entities": len(self._variants)}
+
+class TaggedCache(ResponseCache):
+    """
+    Response cache per normalized query, invalidated by tag. Each entry
+    carries the tags of the data it was read from, e.g. ("category", id), and
+    a write drops only the entries carrying one of the tags it touches.
+    """
+
+    def __init__(self, name: str, ttl: float = TTL, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        super().__init__(name, ttl, max_entries, max_bytes)
+        self._tagged: Dict[tuple, Set[tuple]] = {}
+        self._tags: Dict[tuple, Tuple[tuple, ...]] = {}
+        self.dropped = 0
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        return self._get(key)
+
+    def put(self, key: tuple, response: Response, generation: int, tags: Iterable[tuple], headers: Optional[dict] = None):
+        """Keep a full response and the headers to send with it"""
+        if not self._put(key, response, generation, headers):
+            return
+        self._tags[key] = tuple(tags)
+        for tag in self._tags[key]:
+            self._tagged.setdefault(tag, set()).add(key)
+        self._evict()
+
+    def _remove(self, key: tuple):
+        super()._remove(key)
+        for tag in self._tags.pop(key, ()):
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def invalidate(self, tags: Iterable[tuple]):
+        """Drop the entries carrying any of tags after a write"""
+        self.invalidations += 1
+        for tag in set(tags):
+            for key in list(self._tagged.get(tag, ())):
+                self._remove(key)
+                self.dropped += 1
+
+    def clear(self):
+        self.dropped += len(self._entries)
+        super().clear()
+        self._tagged.clear()
+        self._tags.clear()
+
+    def get_stats(self) -> dict:
+        """Get hit rate, memory use and invalidation counts"""
+        return {**super().get_stats(), "tags": len(self._tagged), "dropped_by_invalidation": self.dropped}
+
+_registry: Dict[str, EntityCache] = {}
+
+def get_cache_stats() -> dict:
+    """Get statistics for every entity cache"""
+    caches = {name: cache.get_stats() for name, cache in _registry.items()}
+    return {
+        "bytes": sum(stats["bytes"] for stats in caches.values()),
+        "caches": caches,
+    }
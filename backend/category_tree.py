@@ -0,0 +1,121 @@
+"""
+In-memory snapshot of the category hierarchy.
+
+product_categories.parent_category_id links each category to its parent.
+The whole table is small, so it is read into an immutable snapshot: parent
+and children per category, descendant lists computed on first use, and the
+encoded GET /api/categories/tree body. Lookups never touch the database.
+
+The category routes rebuild the snapshot after each committed write. The
+tree endpoint also compares the snapshot with the product_categories change
+counter (table_versions) and rebuilds when a write bypassed the routes. A
+rebuild replaces the snapshot in one assignment, so readers always see a
+consistent tree. The snapshot is per process.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from etags import table_version
+from models import CategoryTreeNode, category_mapper
+
+_tree_adapter = TypeAdapter(List[CategoryTreeNode])
+
+# The whole table, read on every rebuild
+CATEGORY_TREE_SQL = "SELECT * FROM product_categories"
+
+class CategorySnapshot:
+    """The hierarchy as of one product_categories version"""
+
+    def __init__(self, categories: list, version: int):
+        self.version = version
+        self.categories = {category.category_id: category for category in categories}
+        self.children: Dict[Optional[str], List[str]] = {}
+        for category in categories:
+            parent = category.parent_category_id
+            # A dangling parent makes its children roots rather than unreachable
+            if parent is not None and parent not in self.categories:
+                parent = None
+            self.children.setdefault(parent, []).append(category.category_id)
+        for ids in self.children.values():
+            ids.sort(key=lambda category_id: self.categories[category_id].name.casefold())
+        self._subtrees: Dict[str, Tuple[str, ...]] = {}
+        self._encoded: Dict[bool, bytes] = {}
+
+    def subtree(self, category_id: str) -> Tuple[str, ...]:
+        """A category and all of its descendants, active or not"""
+        ids = self._subtrees.get(category_id)
+        if ids is None:
+            ids = [category_id]
+            seen = {category_id}
+            for current in ids:  # grows while iterating: breadth first
+                for child in self.children.get(current, ()):
+                    if child not in seen:  # parent cycles in hand-edited data
+                        seen.add(child)
+                        ids.append(child)
+            ids = self._subtrees[category_id] = tuple(ids)
+        return ids
+
+    def _nodes(self, parent: Optional[str], include_inactive: bool, seen: set) -> List[CategoryTreeNode]:
+        nodes = []
+        for category_id in self.children.get(parent, ()):
+            category = self.categories[category_id]
+            if category_id in seen or not (include_inactive or category.is_active):
+                continue
+            seen.add(category_id)
+            nodes.append(CategoryTreeNode(
+                **category.model_dump(), children=self._nodes(category_id, include_inactive, seen)
+            ))
+        return nodes
+
+    def encoded(self, include_inactive: bool = False) -> bytes:
+        """The nested tree as JSON; inactive categories hide their whole subtree unless included"""
+        body = self._encoded.get(include_inactive)
+        if body is None:
+            body = self._encoded[include_inactive] = _tree_adapter.dump_json(
+                self._nodes(None, include_inactive, set())
+            )
+        return body
+
+class CategoryTree:
+    """Holds the current snapshot and rebuilds it after category writes"""
+
+    def __init__(self):
+        self.snapshot = CategorySnapshot([], 0)
+        self.rebuilds = 0
+        self.rebuild_ms = 0.0
+
+    async def load(self, db):
+        """Rebuild the snapshot from product_categories"""
+        started = time.perf_counter()
+        version = await table_version(db, "product_categories")
+        cursor = await db.execute(CATEGORY_TREE_SQL)
+        categories = category_mapper.from_rows(cursor, await cursor.fetchall())
+        self.snapshot = CategorySnapshot(categories, version)
+        self.rebuilds += 1
+        self.rebuild_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    async def current(self, db) -> CategorySnapshot:
+        """The snapshot, rebuilt first if product_categories changed behind the routes"""
+        if await table_version(db, "product_categories") != self.snapshot.version:
+            await self.load(db)
+        return self.snapshot
+
+    def subtree(self, category_id: str) -> Tuple[str, ...]:
+        return self.snapshot.subtree(category_id)
+
+    def get_stats(self) -> dict:
+        """Get snapshot size and rebuild timing"""
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "categories": len(snapshot.categories),
+            "roots": len(snapshot.children.get(None, ())),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": self.rebuild_ms,
+        }
+
+# Global category tree instance
+category_tree = CategoryTree()
@@ -0,0 +1,281 @@
+"""
+Response compression negotiated by Accept-Encoding.
+
+JSON pages of a few hundred products shrink six to eight times compressed,
+which matters to buyers on slow mobile links. The middleware picks the best
+encoding the client accepts (zstd, then br, then gzip at equal q-values),
+compresses text-like bodies above MINIMUM_SIZE and leaves images, ranged and
+already encoded responses alone.
+
+Levels are chosen for cost, not maximum ratio: above LARGE_SIZE a cheaper
+level keeps a 1000-row page to a few milliseconds of CPU for a slightly
+larger body. Bodies above OFFLOAD_SIZE are compressed in a worker thread
+(the codecs release the GIL), so the event loop keeps serving other
+requests meanwhile. Streaming bodies are compressed chunk by chunk and
+flushed as they go.
+
+brotli and zstandard are optional; without them only gzip is offered.
+"""
+
+import asyncio
+import time
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # br is not offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is not offered
+    zstandard = None
+
+# Smaller bodies are sent as is; compression would barely save a packet
+MINIMUM_SIZE = 1024
+
+# Bodies above this are compressed off the event loop
+OFFLOAD_SIZE = 64 * 1024
+
+# Bodies above this use the cheaper level
+LARGE_SIZE = 256 * 1024
+
+# (level up to LARGE_SIZE, level above it) per encoding
+LEVELS = {
+    "zstd": (3, 1),
+    "br": (4, 1),
+    "gzip": (6, 1),
+}
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+def available_encodings() -> list:
+    """Encodings this process can produce, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+ENCODINGS = available_encodings()
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Best available encoding for an Accept-Encoding header, None for identity"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def level_for(encoding: str, size: int) -> int:
+    small, large = LEVELS[encoding]
+    return large if size > LARGE_SIZE else small
+
+def compress(encoding: str, data: bytes, level: int) -> bytes:
+    """Compress a complete body"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return zlib.compress(data, level, wbits=31)
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, flushing after each so clients see data as it is sent"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._codec = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._codec = brotli.Compressor(quality=level)
+        else:
+            self._codec = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self._codec.compress(data) + self._codec.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._codec.process(data) + self._codec.flush()
+        return self._codec.compress(data) + self._codec.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._codec.finish()
+        return self._codec.flush()
+
+class CompressionStats:
+    """Per-route bytes before and after compression and time spent"""
+
+    def __init__(self):
+        self.routes: Dict[str, dict] = {}
+
+    def record(self, route: str, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0, "encodings": {}}
+        stats["responses"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["seconds"] += seconds
+        stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+
+    def get_stats(self) -> dict:
+        """Get compression ratio and timing per route"""
+        routes = {}
+        for route, stats in sorted(self.routes.items()):
+            routes[route] = {
+                "responses": stats["responses"],
+                "bytes_in": stats["bytes_in"],
+                "bytes_out": stats["bytes_out"],
+                "ratio": round(stats["bytes_in"] / stats["bytes_out"], 2) if stats["bytes_out"] else 0.0,
+                "avg_compress_ms": round(stats["seconds"] / stats["responses"] * 1000, 3),
+                "encodings": dict(stats["encodings"]),
+            }
+        return {
+            "encodings": ENCODINGS,
+            "minimum_size": MINIMUM_SIZE,
+            "offload_size": OFFLOAD_SIZE,
+            "routes": routes,
+        }
+
+# Global compression statistics
+compression_stats = CompressionStats()
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return f"{scope['method']} {path}" if path else "unmatched"
+
+def _compressible(headers: Headers, status: int) -> bool:
+    if status < 200 or status in (204, 206, 304):
+        return False
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", ""):
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the encoding the client prefers"""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Wrapped even when nothing is acceptable: the response still needs Vary
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        await _CompressingResponder(self, scope, encoding, send).run(receive)
+
+class _CompressingResponder:
+    """Send wrapper for one response: holds the start message until the first body chunk decides"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.passthrough = False
+        self.stream: Optional[StreamCompressor] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    async def run(self, receive):
+        await self.middleware.app(self.scope, receive, self.wrapped_send)
+
+    def _set_encoding_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The encoded bytes differ from the identity representation
+            headers["ETag"] = f"W/{etag}"
+
+    async def _compress(self, body: bytes) -> bytes:
+        level = level_for(self.encoding, len(body))
+        started = time.perf_counter()
+        if len(body) > OFFLOAD_SIZE:
+            compressed = await asyncio.to_thread(compress, self.encoding, body, level)
+        else:
+            compressed = compress(self.encoding, body, level)
+        self.seconds += time.perf_counter() - started
+        return compressed
+
+    async def wrapped_send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not _compressible(headers, self.start["status"]):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            # Compressible, so the body depends on Accept-Encoding even when sent as is
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is None or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self._set_encoding_headers(headers)
+            if not more_body:
+                compressed = await self._compress(body)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                compression_stats.record(
+                    _route_name(self.scope), self.encoding, len(body), len(compressed), self.seconds
+                )
+                return
+
+            # Streaming body: the final length is unknown
+            del headers["Content-Length"]
+            self.stream = StreamCompressor(self.encoding, level_for(self.encoding, 0))
+            await self.send(self.start)
+
+        started = time.perf_counter()
+        if len(body) > OFFLOAD_SIZE:
+            chunk = await asyncio.to_thread(self.stream.chunk, body)
+        else:
+            chunk = self.stream.chunk(body)
+        if not more_body:
+            chunk += self.stream.finish()
+        self.seconds += time.perf_counter() - started
+        self.bytes_in += len(body)
+        self.bytes_out += len(chunk)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            compression_stats.record(_route_name(self.scope), self.encoding, self.bytes_in, self.bytes_out, self.seconds)
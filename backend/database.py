@@ -1,8 +1,15 @@
 import aiosqlite
+import asyncio
 import os
+import sqlite3
+import time
+from datetime import datetime
 from pathlib import Path
 import logging
 
+from geo import haversine_km
+from migrations import MIGRATIONS
+
 logger = logging.getLogger(__name__)
 
 # Database configuration
@@ -12,183 +19,480 @@ DATABASE_PATH = ROOT_DIR / "data" / "application.db"
 # Ensure data directory exists
 DATABASE_PATH.parent.mkdir(exist_ok=True)
 
+# PRAGMAs applied to every pooled connection when it is opened
+CONNECTION_PRAGMAS = {
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # ~16 MB page cache per connection
+    "mmap_size": 67108864,
+}
+
+# Prepared statements kept per connection (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 256
+
+# Readers must never write; WAL lets them run alongside the writer
+READER_PRAGMAS = {**CONNECTION_PRAGMAS, "query_only": "ON"}
+
+# The single writer owns the WAL; FULL sync makes every commit durable,
+# which group commit keeps affordable by sharing one fsync per batch
+WRITER_PRAGMAS = {**CONNECTION_PRAGMAS, "journal_mode": "WAL", "synchronous": "FULL"}
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection could be checked out in time"""
+
+class ConnectionPool:
+    """Bounded pool of long-lived aiosqlite connections"""
+
+    def __init__(self, db_path: str, max_size: int = 10, checkout_timeout: float = 10.0, pragmas: dict = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.pragmas = CONNECTION_PRAGMAS if pragmas is None else pragmas
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        # Statistics
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._discarded = 0
+
+    async def _open(self):
+        """Open a new connection and apply per-connection setup"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        try:
+            for name, value in self.pragmas.items():
+                await conn.execute(f"PRAGMA {name} = {value}")
+            await conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+        except Exception:
+            await conn.close()
+            raise
+        self._size += 1
+        return conn
+
+    async def acquire(self):
+        """Check out a connection, waiting up to checkout_timeout for a free slot"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        start = time.perf_counter()
+        if self._slots.locked():
+            self._waits += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.checkout_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeoutError(
+                f"No database connection available within {self.checkout_timeout}s"
+            )
+        self._wait_time += time.perf_counter() - start
+
+        try:
+            conn = self._idle.pop() if self._idle else await self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        self._checkouts += 1
+        return conn
+
+    async def release(self, conn):
+        """Return a connection to the pool, rolling back any unfinished transaction"""
+        try:
+            if self._closed:
+                await self._discard(conn)
+                return
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception as e:
+                logger.warning(f"Discarding broken pooled connection: {e}")
+                await self._discard(conn)
+                return
+            self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    async def _discard(self, conn):
+        """Close a connection and drop it from the pool"""
+        self._size -= 1
+        self._discarded += 1
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """Close all idle connections; checked-out ones are closed on release"""
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.pop())
+
+    def get_stats(self) -> dict:
+        """Get pool statistics"""
+        return {
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+            "checkouts": self._checkouts,
+            "waits": self._waits,
+            "timeouts": self._timeouts,
+            "discarded": self._discarded,
+            "avg_wait_ms": round(self._wait_time / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+        }
+
+class WriterLane:
+    """Single writer connection handed to queued callers one at a time"""
+
+    def __init__(self, db_path: str, checkout_timeout: float = 10.0, pragmas: dict = None):
+        self.db_path = db_path
+        self.checkout_timeout = checkout_timeout
+        self.pragmas = WRITER_PRAGMAS if pragmas is None else pragmas
+        self._queue = asyncio.Queue()
+        self._conn = None
+        self._worker = None
+        self._start_lock = asyncio.Lock()
+        self._released = None
+        self._closed = False
+        # Statistics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_queue_depth = 0
+
+    async def _start(self):
+        """Open the writer connection and start the queue worker"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        try:
+            for name, value in self.pragmas.items():
+                await conn.execute(f"PRAGMA {name} = {value}")
+            await conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+        except Exception:
+            await conn.close()
+            raise
+        self._conn = conn
+        self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Grant the writer connection to queued callers in FIFO order"""
+        while True:
+            grant, released = await self._queue.get()
+            if grant.cancelled():
+                continue
+            grant.set_result(self._conn)
+            await released.wait()
+
+    async def acquire(self):
+        """Queue for the writer connection, waiting up to checkout_timeout"""
+        if self._closed:
+            raise RuntimeError("Writer lane is closed")
+        if self._worker is None:
+            async with self._start_lock:
+                # Callers arriving together must share one connection and worker
+                if self._worker is None:
+                    await self._start()
+
+        start = time.perf_counter()
+        grant = asyncio.get_running_loop().create_future()
+        released = asyncio.Event()
+        self._queue.put_nowait((grant, released))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        try:
+            conn = await asyncio.wait_for(grant, timeout=self.checkout_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeoutError(
+                f"Database writer not available within {self.checkout_timeout}s"
+            )
+        except BaseException:
+            # Cancelled after the grant landed: hand the lane to the next caller
+            if grant.done() and not grant.cancelled():
+                released.set()
+            raise
+        self._wait_time += time.perf_counter() - start
+        self._checkouts += 1
+        self._released = released
+        return conn
+
+    async def release(self, conn):
+        """Roll back any unfinished transaction and pass the lane on"""
+        released, self._released = self._released, None
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception as e:
+            logger.error(f"Writer rollback failed: {e}")
+        finally:
+            released.set()
+
+    async def close(self):
+        """Stop the queue worker, fail queued callers and close the writer connection"""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while not self._queue.empty():
+            grant, _ = self._queue.get_nowait()
+            if not grant.done():
+                grant.set_exception(RuntimeError("Writer lane is closed"))
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def get_stats(self) -> dict:
+        """Get writer lane statistics"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self._max_queue_depth,
+            "busy": self._released is not None,
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "avg_wait_ms": round(self._wait_time / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+        }
+
+class PooledConnection:
+    """Async context manager that checks a connection out of a pool or lane"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._pool.acquire()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+class GroupCommitWriter:
+    """Collects small write jobs arriving within a short window and commits them together"""
+
+    def __init__(self, lane_factory, window: float = 0.002, max_batch: int = 128):
+        self._lane_factory = lane_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flusher = None
+        # Statistics
+        self._jobs = 0
+        self._batches = 0
+        self._failed_jobs = 0
+        self._largest_batch = 0
+
+    async def submit(self, statements: list):
+        """Run (sql, params) statements atomically and return once they are committed"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((statements, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        await future
+
+    async def _run(self):
+        """Flush pending jobs in batches, one transaction per batch"""
+        while True:
+            await self._wakeup.wait()
+            # Give concurrent callers a moment to join the batch
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if not self._pending:
+                self._wakeup.clear()
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        """Apply a batch inside one transaction, isolating each job in a savepoint"""
+        results = []
+        try:
+            async with PooledConnection(self._lane_factory()) as db:
+                await db.execute("BEGIN")
+                for statements, _ in batch:
+                    await db.execute("SAVEPOINT job")
+                    try:
+                        for sql, params in statements:
+                            await db.execute(sql, params)
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO job")
+                        results.append(e)
+                    else:
+                        results.append(None)
+                    await db.execute("RELEASE job")
+                await db.commit()
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self._batches += 1
+        self._jobs += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        for (_, future), error in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                self._failed_jobs += 1
+                future.set_exception(error)
+
+    async def close(self):
+        """Stop the flusher task and fail jobs that were never flushed"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        pending, self._pending = self._pending, []
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Group commit writer is closed"))
+
+    def get_stats(self) -> dict:
+        """Get group commit statistics"""
+        return {
+            "jobs": self._jobs,
+            "batches": self._batches,
+            "failed_jobs": self._failed_jobs,
+            "largest_batch": self._largest_batch,
+            "avg_batch_size": round(self._jobs / self._batches, 2) if self._batches else 0.0,
+            "pending": len(self._pending),
+        }
+
 class DatabaseManager:
     def __init__(self):
         self.db_path = str(DATABASE_PATH)
-    
+        self._readers = None
+        self._writer = None
+        self._group_writer = None
+
+    @property
+    def readers(self) -> ConnectionPool:
+        """Read-only connection pool, created on first use so .env settings are loaded"""
+        if self._readers is None:
+            self._readers = ConnectionPool(
+                self.db_path,
+                max_size=int(os.environ.get("SQLITE_POOL_SIZE", "10")),
+                checkout_timeout=float(os.environ.get("SQLITE_POOL_TIMEOUT", "10")),
+                pragmas=READER_PRAGMAS,
+            )
+        return self._readers
+
+    @property
+    def writer(self) -> WriterLane:
+        """Serialized writer lane, created on first use so .env settings are loaded"""
+        if self._writer is None:
+            self._writer = WriterLane(
+                self.db_path,
+                checkout_timeout=float(os.environ.get("SQLITE_POOL_TIMEOUT", "10")),
+            )
+        return self._writer
+
+    @property
+    def group_writer(self) -> GroupCommitWriter:
+        """Group-commit writer that batches small writes onto the writer lane"""
+        if self._group_writer is None:
+            self._group_writer = GroupCommitWriter(lambda: self.writer)
+        return self._group_writer
+
+    async def group_commit(self, statements: list):
+        """Durably apply (sql, params) statements as one job of a shared transaction"""
+        await self.group_writer.submit(statements)
+
+    async def get_read_connection(self):
+        """Get a read-only pooled connection for queries"""
+        return PooledConnection(self.readers)
+
+    async def get_write_connection(self):
+        """Get the writer connection once every earlier write has finished"""
+        return PooledConnection(self.writer)
+
     async def get_connection(self):
-        """Get database connection"""
-        return aiosqlite.connect(self.db_path)
+        """Get a database connection that may write"""
+        return await self.get_write_connection()
+
+    async def close(self):
+        """Close pooled and writer connections"""
+        if self._group_writer is not None:
+            await self._group_writer.close()
+            self._group_writer = None
+        if self._readers is not None:
+            await self._readers.close()
+            self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    def get_pool_stats(self) -> dict:
+        """Get reader pool and writer lane statistics"""
+        return {
+            "readers": self.readers.get_stats(),
+            "writer": self.writer.get_stats(),
+            "group_commit": self.group_writer.get_stats(),
+        }
     
-    async def init_database(self):
-        """Initialize database with all tables"""
+    async def _get_schema_version(self, db) -> int:
+        """Get the applied schema version, 0 for an unversioned database"""
+        try:
+            cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+            row = await cursor.fetchone()
+            return row[0] or 0
+        except sqlite3.OperationalError:
+            return 0
+
+    async def init_database(self) -> dict:
+        """Bring the schema up to date, skipping all DDL when it is already current"""
+        start = time.perf_counter()
+        applied = []
         async with aiosqlite.connect(self.db_path) as db:
             # Enable foreign keys
             await db.execute("PRAGMA foreign_keys = ON")
             
-            # Users table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id TEXT PRIMARY KEY,
-                    user_type TEXT NOT NULL CHECK (user_type IN ('buyer', 'farmer', 'admin')),
-                    full_name TEXT NOT NULL,
-                    email TEXT UNIQUE,
-                    phone_number TEXT,
-                    location TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Profiles table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS profiles (
-                    profile_id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    bio TEXT,
-                    avatar_url TEXT,
-                    address TEXT,
-                    city TEXT,
-                    state TEXT,
-                    country TEXT,
-                    postal_code TEXT,
-                    date_of_birth DATE,
-                    gender TEXT,
-                    occupation TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Product categories table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS product_categories (
-                    category_id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL UNIQUE,
-                    description TEXT,
-                    parent_category_id TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    FOREIGN KEY (parent_category_id) REFERENCES product_categories (category_id)
-                )
-            """)
-            
-            # Products table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    product_id TEXT PRIMARY KEY,
-                    seller_id TEXT NOT NULL,
-                    category_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    price DECIMAL(10, 2) NOT NULL,
-                    quantity_available INTEGER DEFAULT 0,
-                    unit TEXT DEFAULT 'kg',
-                    images TEXT, -- JSON array of image URLs/base64
-                    location TEXT,
-                    harvest_date DATE,
-                    expiry_date DATE,
-                    is_organic BOOLEAN DEFAULT 0,
-                    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'sold_out')),
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (seller_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (category_id) REFERENCES product_categories (category_id)
-                )
-            """)
-            
-            # Orders table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS orders (
-                    order_id TEXT PRIMARY KEY,
-                    buyer_id TEXT NOT NULL,
-                    seller_id TEXT NOT NULL,
-                    product_id TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    unit_price DECIMAL(10, 2) NOT NULL,
-                    total_amount DECIMAL(10, 2) NOT NULL,
-                    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')),
-                    delivery_address TEXT,
-                    order_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    delivery_date DATETIME,
-                    notes TEXT,
-                    payment_status TEXT DEFAULT 'pending' CHECK (payment_status IN ('pending', 'paid', 'failed', 'refunded')),
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (buyer_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (seller_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Conversations table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    conversation_id TEXT PRIMARY KEY,
-                    participant_1_id TEXT NOT NULL,
-                    participant_2_id TEXT NOT NULL,
-                    last_message TEXT,
-                    last_message_at DATETIME,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    FOREIGN KEY (participant_1_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (participant_2_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    UNIQUE(participant_1_id, participant_2_id)
-                )
-            """)
-            
-            # Messages table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    message_id TEXT PRIMARY KEY,
-                    conversation_id TEXT NOT NULL,
-                    sender_id TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    message_type TEXT DEFAULT 'text' CHECK (message_type IN ('text', 'image', 'file', 'system')),
-                    is_read BOOLEAN DEFAULT 0,
-                    sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    read_at DATETIME,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id) ON DELETE CASCADE,
-                    FOREIGN KEY (sender_id) REFERENCES users (user_id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Reviews table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS reviews (
-                    review_id TEXT PRIMARY KEY,
-                    reviewer_id TEXT NOT NULL,
-                    reviewed_user_id TEXT,
-                    product_id TEXT,
-                    order_id TEXT,
-                    rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
-                    comment TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_verified BOOLEAN DEFAULT 0,
-                    FOREIGN KEY (reviewer_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (reviewed_user_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE CASCADE,
-                    FOREIGN KEY (order_id) REFERENCES orders (order_id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Create indexes for better performance
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_type ON users (user_type)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_products_seller ON products (seller_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_products_status ON products (status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_buyer ON orders (buyer_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_seller ON orders (seller_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (sender_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_conversations_participants ON conversations (participant_1_id, participant_2_id)")
+            # Write-ahead logging lets readers run concurrently with the writer
+            await db.execute("PRAGMA journal_mode = WAL")
             
-            await db.commit()
-            logger.info("Database initialized successfully")
+            version = await self._get_schema_version(db)
+            for number, description, statements in MIGRATIONS:
+                if number <= version:
+                    continue
+                try:
+                    await db.execute("BEGIN")
+                    await db.execute("""
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            description TEXT NOT NULL,
+                            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+                    for statement in statements:
+                        await db.execute(statement)
+                    await db.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                        (number, description, datetime.utcnow())
+                    )
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    logger.error(f"Schema migration {number} ({description}) failed")
+                    raise
+                version = number
+                applied.append(number)
+                logger.info(f"Applied schema migration {number}: {description}")
+        
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        logger.info(f"Database ready at schema version {version} in {elapsed_ms} ms")
+        return {
+            "schema_version": version,
+            "applied_migrations": applied,
+            "time_to_ready_ms": elapsed_ms,
+        }
 
 # Global database manager instance
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Entity tags for conditional GETs.
+
+Frequently polled reads send a strong ETag built from version numbers, and
+answer a matching If-None-Match with 304 after one indexed version lookup,
+before the full query and serialization run. Versions are kept by triggers
+(migration 9), so every write path bumps them, including scripts that
+bypass the routes:
+
+- row_version on products and users, bumped by every update of the row;
+  a profile write bumps its user's row_version
+- table_versions, one counter per whole table, bumped by every insert,
+  update and delete, for list responses
+"""
+
+from fastapi import Request, Response
+
+# Clients may keep a response but must revalidate it before reuse
+REVALIDATE = "no-cache"
+
+def entity_tag(*parts) -> str:
+    """Strong ETag from version parts"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def matches(request: Request, etag: str) -> bool:
+    """
+    Whether If-None-Match lists etag. Comparison is weak, as required for
+    If-None-Match: compressed responses carry the W/ form of the same tag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+def tagged(response: Response, etag: str) -> Response:
+    """Add the ETag and revalidation headers to a full response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return response
+
+TABLE_VERSION_SQL = "SELECT version FROM table_versions WHERE table_name = ?"
+
+async def table_version(db, table: str) -> int:
+    """Current change counter of a table listed in migrations.TABLE_VERSIONED"""
+    cursor = await db.execute(TABLE_VERSION_SQL, (table,))
+    row = await cursor.fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,150 @@
+"""
+Facet counts for the product listing.
+
+One statement computes every facet for a filter set: the matching products
+are materialized once in a CTE and each facet is a GROUP BY over that CTE,
+joined with UNION ALL. The SQL for each combination of active filters is
+compiled once, like the list queries in query_builder.
+
+Results are cached per normalized filter set and the whole cache is dropped
+whenever a product or category is written (see invalidate()). The cache is
+per process.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from query_builder import _sql_literal
+
+# Upper bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [100, 250, 500, 1000, 2500, 5000]
+
+# Most frequent values returned for the category and location facets
+FACET_LIMIT = 20
+
+# Filter sets whose counts are kept
+CACHE_SIZE = 256
+
+def _price_bucket_sql() -> str:
+    cases = " ".join(f"WHEN price < {bound} THEN {index}" for index, bound in enumerate(PRICE_BUCKETS))
+    return f"CASE {cases} ELSE {len(PRICE_BUCKETS)} END"
+
+def _price_bucket(index: int) -> dict:
+    """Bounds and label of a price bucket"""
+    low = PRICE_BUCKETS[index - 1] if index else 0
+    high = PRICE_BUCKETS[index] if index < len(PRICE_BUCKETS) else None
+    label = f"{low}-{high}" if high is not None else f"{low}+"
+    return {"value": label, "min_price": low, "max_price": high}
+
+class FacetEngine:
+    """Facet counts over products for the product listing filters"""
+
+    def __init__(self, filters: Dict[str, str], literals: Optional[Dict[str, object]] = None):
+        self.filters = list(filters.items())
+        self.literals = literals or {}
+        self._compiled: Dict[Tuple[int, int], str] = {}
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _compile(self, mask: int, inlined: int) -> str:
+        """Build the facet statement for the filters selected by mask"""
+        where = "WHERE 1=1"
+        for bit, (name, fragment) in enumerate(self.filters):
+            if mask & (1 << bit):
+                if inlined & (1 << bit):
+                    fragment = fragment.replace("?", _sql_literal(self.literals[name]))
+                where += f" AND {fragment}"
+        return f"""
+            WITH matched AS MATERIALIZED (
+                SELECT p.category_id, p.is_organic, p.price, p.location
+                FROM products p
+                {where}
+            )
+            SELECT 'total', NULL, NULL, COUNT(*) FROM matched
+            UNION ALL
+            SELECT 'category', m.category_id, pc.name, COUNT(*)
+            FROM matched m LEFT JOIN product_categories pc ON pc.category_id = m.category_id
+            GROUP BY m.category_id
+            UNION ALL
+            SELECT 'is_organic', is_organic, NULL, COUNT(*) FROM matched GROUP BY is_organic
+            UNION ALL
+            SELECT 'price', {_price_bucket_sql()}, NULL, COUNT(*) FROM matched GROUP BY 2
+            UNION ALL
+            SELECT 'location', location, NULL, COUNT(*) FROM matched GROUP BY location
+        """
+
+    def build(self, values: Dict[str, object]) -> Tuple[str, List]:
+        """Get cached SQL and parameters; filters whose value is None are skipped"""
+        mask = 0
+        inlined = 0
+        params = []
+        for bit, (name, fragment) in enumerate(self.filters):
+            value = values.get(name)
+            if value is None:
+                continue
+            mask |= 1 << bit
+            if name in self.literals and value == self.literals[name]:
+                inlined |= 1 << bit
+            elif "?" in fragment:
+                params.append(value)
+        sql = self._compiled.get((mask, inlined))
+        if sql is None:
+            sql = self._compiled[(mask, inlined)] = self._compile(mask, inlined)
+        return sql, params
+
+    async def get(self, db, values: Dict[str, object]) -> dict:
+        """Facet counts for a filter set, from cache when unchanged since the last write"""
+        key = tuple(sorted((name, value) for name, value in values.items() if value is not None))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        # A write landing while this query runs must not be cached over
+        generation = self.invalidations
+        sql, params = self.build(values)
+        cursor = await db.execute(sql, params)
+        facets = {"total": 0, "category": [], "is_organic": [], "price": [], "location": []}
+        for facet, value, label, count in await cursor.fetchall():
+            if facet == "total":
+                facets["total"] = count
+            elif facet == "category":
+                facets["category"].append({"value": value, "label": label, "count": count})
+            elif facet == "is_organic":
+                facets["is_organic"].append({"value": bool(value), "count": count})
+            elif facet == "price":
+                facets["price"].append({**_price_bucket(value), "count": count})
+            elif value is not None:
+                facets["location"].append({"value": value, "count": count})
+        for facet in ("category", "location"):
+            facets[facet].sort(key=lambda item: (-item["count"], str(item["value"])))
+            del facets[facet][FACET_LIMIT:]
+        facets["price"].sort(key=lambda item: item["min_price"])
+
+        if generation == self.invalidations:
+            self._cache[key] = facets
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return facets
+
+    def invalidate(self):
+        """Drop every cached result after a product or category write"""
+        if self._cache:
+            self._cache.clear()
+        self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        """Get result cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "cached_filter_sets": len(self._cache),
+            "variants": len(self._compiled),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
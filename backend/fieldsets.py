@@ -0,0 +1,111 @@
+"""
+Sparse fieldsets for list and detail endpoints.
+
+A client that shows only a few fields passes ?fields=product_id,name,price
+and gets just those. The requested fields narrow the SELECT list itself, so
+columns nobody asked for are never read from SQLite, mapped into models or
+encoded.
+
+A FieldSet pairs a response model with the SQL expression of each of its
+fields. Each distinct selection compiles once into its column list, a
+partial response model holding only the requested fields, and a RowMapper
+and JSON encoder for that model. Columns the query itself needs (the sort
+key used for cursors) are selected even when not requested, but are left
+out of the response.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from pydantic import TypeAdapter, create_model
+
+from models import RowMapper
+from serialization import json_response
+
+# Distinct field selections kept per FieldSet
+CACHE_SIZE = 64
+
+# Description of the fields query parameter
+FIELDS_HELP = "Comma-separated fields to return, e.g. product_id,name,price; every field when omitted"
+
+class Selection:
+    """One compiled choice of fields: SELECT list, partial model and encoders"""
+
+    def __init__(self, model, fields: Tuple[str, ...], columns: str, partial: bool = False):
+        self.model = model
+        self.fields = fields
+        self.columns = columns
+        # Added to ETags, since a partial body is a different representation
+        self.tag_parts = fields if partial else ()
+        self.mapper = RowMapper(model)
+        self._item_adapter = TypeAdapter(model)
+        self._list_adapter = TypeAdapter(List[model])
+
+    def wants(self, name: str) -> bool:
+        return name in self.fields
+
+    def encode_rows(self, cursor, rows: list, headers: dict = None) -> Response:
+        """Map rows of cursor's result set and encode them as a JSON array"""
+        return json_response(self._list_adapter.dump_json(self.mapper.from_rows(cursor, rows)), headers)
+
+    def encode_row(self, cursor, row, **extra) -> Response:
+        """Map one row of cursor's result set and encode it as a JSON object"""
+        return json_response(self._item_adapter.dump_json(self.mapper.from_row(cursor, row, **extra)))
+
+class FieldSet:
+    """A response model's fields and the SQL expressions that select them"""
+
+    def __init__(self, model, alias: str = "", expressions: Optional[Dict[str, Optional[str]]] = None):
+        """
+        Fields default to the column of the same name on alias. expressions
+        overrides that per field; None marks a field the query or route
+        provides itself (e.g. distance_km), which is never put in the list.
+        """
+        self.model = model
+        prefix = f"{alias}." if alias else ""
+        overrides = expressions or {}
+        self.expressions = {
+            name: overrides[name] if name in overrides else f"{prefix}{name}" for name in model.model_fields
+        }
+        self._selections: "OrderedDict[tuple, Selection]" = OrderedDict()
+        self.all = Selection(model, tuple(model.model_fields), self._columns(model.model_fields))
+
+    def _columns(self, names) -> str:
+        columns = []
+        for name in names:
+            expr = self.expressions.get(name)
+            if expr is None:
+                continue
+            columns.append(expr if expr.rpartition(".")[2] == name else f"{expr} AS {name}")
+        return ", ".join(columns)
+
+    def select(self, fields: Optional[str], required: Sequence[str] = ()) -> Selection:
+        """Compile a comma-separated fields parameter; None or empty selects every field"""
+        requested = {name.strip() for name in (fields or "").split(",") if name.strip()}
+        if not requested:
+            return self.all
+        unknown = requested - self.expressions.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(self.expressions)}"
+            )
+
+        # Model order, so the same fields in any order share one selection
+        names = tuple(name for name in self.expressions if name in requested)
+        key = (names, tuple(required))
+        selection = self._selections.get(key)
+        if selection is not None:
+            self._selections.move_to_end(key)
+            return selection
+
+        partial = create_model(
+            f"{self.model.__name__}Fields",
+            **{name: (self.model.model_fields[name].annotation, None) for name in names}
+        )
+        selected = [name for name in self.expressions if name in requested or name in required]
+        selection = self._selections[key] = Selection(partial, names, self._columns(selected), partial=True)
+        if len(self._selections) > CACHE_SIZE:
+            self._selections.popitem(last=False)
+        return selection
@@ -0,0 +1,173 @@
+"""
+In-memory trigram index for typo-tolerant name search.
+
+Product and category names are normalized (NFKC, case folded, zero-width
+joiners and other format characters removed) and split into padded character
+trigrams, so misspellings and alternative transliterations still share most
+of their trigrams with the stored name. This works the same for Sinhala,
+Tamil and Latin script because it never relies on word stemming or prefixes.
+
+Identical names are indexed once: a million products usually carry far fewer
+distinct names, and each distinct name keeps the set of entries that use it.
+A query only collects candidates from its rarest trigrams (any name reaching
+the similarity threshold must contain at least one of them) and then scores
+those candidates exactly, so common trigrams never dominate the cost.
+
+The index is loaded from the database on startup and updated by the product
+and category routes after each committed write. It is per process; with
+several workers each one holds its own copy.
+"""
+
+import math
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+# Candidates scored per query at most; keeps worst-case latency bounded
+MAX_CANDIDATES = 20000
+
+DEFAULT_THRESHOLD = 0.3
+
+def normalize(text: str) -> str:
+    """Fold a name to the form that is indexed and searched"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    # Drops ZWJ/ZWNJ (used inside Sinhala conjuncts) and other invisible format characters
+    return "".join(char for char in text if unicodedata.category(char) != "Cf")
+
+def _words(text: str) -> List[str]:
+    """Split on anything that is not a letter, combining mark or digit"""
+    words = []
+    current = []
+    for char in text:
+        # Sinhala and Tamil vowel signs are combining marks, so keep M* too
+        if unicodedata.category(char)[0] in "LMN":
+            current.append(char)
+        elif current:
+            words.append("".join(current))
+            current = []
+    if current:
+        words.append("".join(current))
+    return words
+
+def trigrams(text: str) -> frozenset:
+    """Padded trigrams of every word in a normalized string"""
+    grams = set()
+    for word in _words(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+class TrigramIndex:
+    """Fuzzy name index over (kind, id) entries such as ("product", product_id)"""
+
+    def __init__(self):
+        self._reset()
+        self.searches = 0
+        self.total_search_ms = 0.0
+        self.loaded = False
+
+    def _reset(self):
+        """Drop every indexed name"""
+        self._name_ids: Dict[str, int] = {}
+        self._display: List[str] = []
+        self._grams: List[frozenset] = []
+        self._owners: List[Set[Tuple[str, str]]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._entries: Dict[Tuple[str, str], int] = {}
+
+    async def load(self, db):
+        """Index every active product and category"""
+        self._reset()
+        cursor = await db.execute("SELECT product_id, name FROM products WHERE status = 'active'")
+        for product_id, name in await cursor.fetchall():
+            self.put("product", product_id, name)
+        cursor = await db.execute("SELECT category_id, name FROM product_categories WHERE is_active = 1")
+        for category_id, name in await cursor.fetchall():
+            self.put("category", category_id, name)
+        self.loaded = True
+
+    def put(self, kind: str, entry_id: str, name: Optional[str]):
+        """Add or rename an entry"""
+        key = (kind, entry_id)
+        self.remove(kind, entry_id)
+        if not name:
+            return
+        normalized = normalize(name)
+        name_id = self._name_ids.get(normalized)
+        if name_id is None:
+            grams = trigrams(normalized)
+            if not grams:
+                return
+            name_id = len(self._display)
+            self._name_ids[normalized] = name_id
+            self._display.append(name)
+            self._grams.append(grams)
+            self._owners.append(set())
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(name_id)
+        self._owners[name_id].add(key)
+        self._entries[key] = name_id
+
+    def remove(self, kind: str, entry_id: str):
+        """Drop an entry; its name stays indexed for reuse but stops matching"""
+        name_id = self._entries.pop((kind, entry_id), None)
+        if name_id is not None:
+            self._owners[name_id].discard((kind, entry_id))
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        threshold: float = DEFAULT_THRESHOLD,
+        kinds: Optional[Set[str]] = None,
+    ) -> List[dict]:
+        """Ranked approximate matches as dicts of kind, id, name and score"""
+        started = time.perf_counter()
+        grams = trigrams(normalize(query))
+        matches = []
+        if grams:
+            # Similarity o / (|q| + |n| - o) >= t needs an overlap o >= t * |q|,
+            # so a match must contain one of the |q| - ceil(t * |q|) + 1 rarest grams
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            needed = max(1, math.ceil(threshold * len(grams)))
+            candidates = set()
+            for posting in postings[:len(grams) - needed + 1]:
+                candidates.update(posting)
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+
+            scored = []
+            for name_id in candidates:
+                if not self._owners[name_id]:
+                    continue
+                name_grams = self._grams[name_id]
+                overlap = len(grams & name_grams)
+                score = overlap / (len(grams) + len(name_grams) - overlap)
+                if score >= threshold:
+                    scored.append((-score, self._display[name_id], name_id))
+            scored.sort()
+
+            for negative_score, display, name_id in scored:
+                for kind, entry_id in sorted(self._owners[name_id]):
+                    if kinds is None or kind in kinds:
+                        matches.append({"kind": kind, "id": entry_id, "name": display, "score": round(-negative_score, 4)})
+                if len(matches) >= limit:
+                    break
+
+        self.searches += 1
+        self.total_search_ms += (time.perf_counter() - started) * 1000
+        return matches[:limit]
+
+    def get_stats(self) -> dict:
+        """Get index size and search timing"""
+        return {
+            "loaded": self.loaded,
+            "entries": len(self._entries),
+            "distinct_names": len(self._display),
+            "trigrams": len(self._postings),
+            "searches": self.searches,
+            "avg_search_ms": round(self.total_search_ms / self.searches, 3) if self.searches else 0.0,
+        }
+
+# Global fuzzy index instance
+fuzzy_index = TrigramIndex()
@@ -0,0 +1,108 @@
+"""
+Great-circle distances and radius lookups for "near me" queries.
+
+Products and users with coordinates are indexed in SQLite R*Tree tables
+(products_geo, users_geo). A radius query first selects the R*Tree entries
+overlapping the bounding box of the circle, then keeps and orders those
+within the radius by haversine_km(), which DatabaseManager registers on every
+connection so distances are computed and sorted in SQL.
+
+Every point inside the radius has to be read and sorted, which is costly for
+a wide radius over a dense area. fetch_nearest() therefore searches growing
+rings: a nearest-first page only depends on points closer than its last row,
+so a page that fills within a small ring is exactly the page the full radius
+would return.
+"""
+
+import math
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from pagination import decode_cursor
+
+# Mean Earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_RADIUS_KM = 25.0
+MAX_RADIUS_KM = 500.0
+
+# Radius of the first ring searched; each retry doubles it
+FIRST_RING_KM = 1.0
+
+def haversine_km(lat1: Optional[float], lon1: Optional[float], lat2: Optional[float], lon2: Optional[float]) -> Optional[float]:
+    """Great-circle distance in kilometres; NULL when either point is missing"""
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return None
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) enclosing every point within radius_km"""
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+    # Near a pole, or for huge radii, the circle spans every longitude
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = dlat / math.cos(math.radians(widest))
+    if dlon >= 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    # Boxes are not split at the antimeridian; listings there are out of scope
+    return min_lat, max_lat, max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+def parse_near(near: str) -> Tuple[float, float]:
+    """Parse a 'lat,lon' query parameter"""
+    try:
+        lat, lon = (float(part) for part in near.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'near' must be 'latitude,longitude'")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="'near' is outside valid latitude/longitude ranges")
+    return lat, lon
+
+async def fetch_nearest(
+    db,
+    list_query,
+    values: dict,
+    near: str,
+    radius_km: float,
+    limit: int,
+    skip: int = 0,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    columns: Optional[str] = None,
+):
+    """
+    Run a radius FilterQuery keyed on (distance_km, id), widening the ring
+    until the page is full or the requested radius is reached. The query's
+    base parameters are the centre, the ring's bounding box and the ring's
+    radius; columns is passed on to build(). Returns the cursor and rows of
+    the last run.
+    """
+    lat, lon = parse_near(near)
+    ring = FIRST_RING_KM
+    if after:
+        # The next page starts beyond the last row seen
+        distance = decode_cursor(after, len(list_query.key_exprs))[0]
+        if not isinstance(distance, (int, float)):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+        ring += distance
+    elif before:
+        ring = radius_km
+    while True:
+        ring = min(ring, radius_km)
+        base_params = (lat, lon, *bounding_box(lat, lon, ring), ring)
+        query, params = list_query.build(values, limit, skip, after, before, base_params=base_params, columns=columns)
+        cursor = await db.execute(query, params)
+        rows = await cursor.fetchall()
+        if len(rows) == limit or ring >= radius_km:
+            return cursor, rows
+        ring *= 2
@@ -0,0 +1,187 @@
+"""
+Resized image derivatives for listing cards and product pages.
+
+Decoding, resizing and re-encoding a photo takes tens of milliseconds of
+CPU, so it runs in a ProcessPoolExecutor and the event loop only awaits the
+result. Each derivative is a WebP file under data/blobs/derived/<size>/,
+named after the source blob. Source blobs never change, so a derivative
+never goes stale and is rendered at most once per size.
+
+Uploads queue their derivatives in the background; a request for a size
+that is not rendered yet renders it on demand, sharing the work with any
+render already in flight.
+
+Sources that cannot be decoded are remembered (bounded, least recently used
+first out) so they are not decoded again. Other failures, such as a worker
+process dying or a file system error, are not remembered; a dead pool is
+replaced and the render is tried once more.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from blob_store import BLOB_ROOT, blob_store
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels per derivative size
+DERIVATIVE_SIZES = {"thumb": 320, "medium": 1024}
+
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+WEBP_QUALITY = 80
+
+# Larger sources are refused rather than decoded (decompression bombs)
+MAX_SOURCE_PIXELS = 50_000_000
+
+IMAGE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Failures that say the source itself is bad; anything else may succeed later
+DECODE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError)
+
+# Undecodable sources remembered at most
+MAX_UNPROCESSABLE = 10_000
+
+class ImageProcessingError(Exception):
+    """Raised when a source image cannot be decoded"""
+
+def render_derivative(source: str, target: str, max_edge: int) -> int:
+    """Write a resized WebP copy of source to target; runs in a worker process"""
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    partial = f"{target}.{os.getpid()}.part"
+    try:
+        with Image.open(source) as image:
+            image.draft("RGB", (max_edge, max_edge))  # JPEG decodes at a reduced scale
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                transparent = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if transparent else "RGB")
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            image.save(partial, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return os.path.getsize(target)
+
+class ImagePipeline:
+    """Renders derivatives in a process pool and tracks them on disk"""
+
+    def __init__(self, root: Path, workers: int = IMAGE_WORKERS):
+        self.root = root
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._background = set()
+        # Sources that failed to decode; they would fail again
+        self._unprocessable: "OrderedDict[str, str]" = OrderedDict()
+        # Statistics
+        self.rendered = 0
+        self.failed = 0
+        self.render_time = 0.0
+
+    def path_for(self, blob_id: str, size: str) -> Path:
+        return self.root / size / f"{blob_id}.webp"
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def ensure(self, blob_id: str, size: str) -> Path:
+        """Path of a derivative, rendering it first if needed"""
+        path = self.path_for(blob_id, size)
+        if path.is_file():
+            return path
+        if blob_id in self._unprocessable:
+            self._unprocessable.move_to_end(blob_id)
+            raise ImageProcessingError(self._unprocessable[blob_id])
+        key = (blob_id, size)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(blob_id, size, path))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        await asyncio.shield(future)
+        return path
+
+    async def _render(self, blob_id: str, size: str, path: Path):
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        started = time.perf_counter()
+        try:
+            try:
+                await self._run_render(blob_id, size, path)
+            except BrokenProcessPool:
+                # A worker died (killed, out of memory); later renders need a new pool
+                logger.warning(f"Image worker pool broke rendering {size} of {blob_id}; restarting it")
+                self._reset_pool()
+                await self._run_render(blob_id, size, path)
+        except DECODE_ERRORS as e:
+            self.failed += 1
+            self._remember_unprocessable(blob_id, f"Image could not be processed: {e}")
+            raise ImageProcessingError(self._unprocessable[blob_id]) from e
+        except Exception:
+            self.failed += 1
+            raise
+        self.rendered += 1
+        self.render_time += time.perf_counter() - started
+
+    async def _run_render(self, blob_id: str, size: str, path: Path):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._pool(), render_derivative, str(blob_store.path_for(blob_id)), str(path), DERIVATIVE_SIZES[size]
+        )
+
+    def _reset_pool(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _remember_unprocessable(self, blob_id: str, reason: str):
+        self._unprocessable[blob_id] = reason
+        self._unprocessable.move_to_end(blob_id)
+        while len(self._unprocessable) > MAX_UNPROCESSABLE:
+            self._unprocessable.popitem(last=False)
+
+    def queue_all(self, blob_id: str):
+        """Render every size of a new upload in the background"""
+        async def render_all():
+            for size in DERIVATIVE_SIZES:
+                try:
+                    await self.ensure(blob_id, size)
+                except ImageProcessingError as e:
+                    logger.warning(f"Derivative {size} of {blob_id} failed: {e}")
+                    return
+                except Exception as e:
+                    # Rendered again on demand when the size is requested
+                    logger.error(f"Derivative {size} of {blob_id} could not be rendered: {e}")
+                    return
+        task = asyncio.ensure_future(render_all())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._reset_pool()
+
+    def get_stats(self) -> dict:
+        """Get render counts and timing"""
+        return {
+            "workers": self.workers,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "in_flight": len(self._in_flight),
+            "unprocessable": len(self._unprocessable),
+            "avg_render_ms": round(self.render_time / self.rendered * 1000, 2) if self.rendered else 0.0,
+        }
+
+# Global image pipeline instance
+image_pipeline = ImagePipeline(BLOB_ROOT / "derived")
@@ -0,0 +1,176 @@
+"""
+Index Advisor
+=============
+
+Replays the SQL issued by the route handlers through EXPLAIN QUERY PLAN and
+flags plans that read a whole table (SCAN without an index) or sort through
+a temporary B-tree. Every compiled variant of the list queries is checked
+(each filter combination, inlined literal and paging mode), plus the fixed
+point lookups and aggregates used elsewhere.
+
+The schema is brought up to date first, exactly as on server startup.
+
+Usage (from the backend directory):
+    python index_advisor.py                  # report flagged plans
+    python index_advisor.py --verbose        # also print clean plans
+    python index_advisor.py --strict         # exit 1 if anything is flagged
+    python index_advisor.py --db path/to.db  # check another database
+"""
+
+import argparse
+import asyncio
+import re
+import sqlite3
+import sys
+
+from database import db_manager
+from geo import haversine_km
+from query_builder import get_registered_queries
+# Importing the routers registers their list queries
+from routes import users, products, orders, conversations, messages, categories, reviews, profiles, images
+
+from category_tree import CATEGORY_TREE_SQL
+from etags import TABLE_VERSION_SQL
+from migrations import ANALYTICS_SUMMARY_SQL
+from models import MessageCreate
+
+def projections(label: str, sql: str, fields, key: str):
+    """A detail query with every column, and with only its key as ?fields= can narrow it"""
+    return [
+        (f"{label}[all fields]", sql.format(columns=fields.all.columns)),
+        (f"{label}[fields={key}]", sql.format(columns=fields.select(key, (key,)).columns)),
+    ]
+
+# Fixed route queries that do not go through FilterQuery, taken from the routes
+ROUTE_QUERIES = [
+    ("products.get_product.version", products.PRODUCT_VERSION_SQL),
+    *projections("products.get_product", products.PRODUCT_DETAIL_SQL, products.PRODUCT_FIELDS, "product_id"),
+    *projections("orders.get_order", orders.ORDER_DETAIL_SQL, orders.ORDER_FIELDS, "order_id"),
+    ("users.get_user.version", users.USER_VERSION_SQL),
+    *projections("users.get_user", users.USER_DETAIL_SQL, users.USER_DETAIL_FIELDS, "user_id"),
+    ("users.get_user.profile", users.PROFILE_BY_USER_SQL),
+    ("conversations.create_conversation", conversations.CONVERSATION_BETWEEN_SQL),
+    ("conversations.get_conversation", conversations.CONVERSATION_DETAIL_SQL),
+    ("messages.get_message", messages.MESSAGE_SELECT + " WHERE m.message_id = ?"),
+    *((f"messages.create_message[{number}]", sql) for number, (sql, _) in enumerate(messages.message_statements(
+        "", MessageCreate(conversation_id="", sender_id="", content=""), None
+    ), 1)),
+    ("messages.mark_conversation_messages_read", messages.MARK_READ_SQL),
+    ("messages.adjust_unread", messages.ADJUST_UNREAD_SQL),
+    ("messages.lower_watermark.read", messages.WATERMARK_SQL),
+    ("messages.lower_watermark.flag", messages.FLAG_COVERED_SQL),
+    ("messages.lower_watermark.move", messages.LOWER_WATERMARK_SQL),
+    ("reviews.get_review_stats", reviews.REVIEW_STATS_SQL),
+    ("categories.table_version", TABLE_VERSION_SQL),
+    ("categories.tree.load", CATEGORY_TREE_SQL),
+    ("images.get_image", images.BLOB_META_SQL),
+    ("server.analytics_summary", ANALYTICS_SUMMARY_SQL),
+]
+
+# Temp B-tree sorts that are deliberate trade-offs: (label pattern, reason)
+ACCEPTED_SORTS = [
+    (re.compile(r"^conversations\["),
+     "OR lookup on both participant indexes; sorts one user's inbox only"),
+    (re.compile(r"^products\[category_id, (seller_id, )?status(='active')?, (is_organic, )?(min_price|max_price)"),
+     "category+status+price index narrows to one price slice before sorting"),
+    (re.compile(r"^products\[category_ids(, is_organic)?(, min_price)?(, max_price)?;"),
+     "IN list reads each subtree category's index range; only the subtree's products are sorted"),
+    (re.compile(r"^products\[category_id, category_ids, "),
+     "never issued: include_descendants replaces the category_id filter"),
+    (re.compile(r"^products_search\["),
+     "relevance is computed per match; only the matching documents are sorted"),
+    (re.compile(r"^(products|farmers)_near\["),
+     "distance is computed per point; only R*Tree hits inside the radius are sorted"),
+]
+
+# Full table reads that are the point of the statement: (label pattern, reason)
+ACCEPTED_SCANS = [
+    (re.compile(r"^categories\.tree\.load$"),
+     "the snapshot holds the whole category table; rebuilt only after category writes"),
+]
+
+# Tables whose size is fixed by design, so scanning them is constant cost
+BOUNDED_TABLES = {"message_buckets", "counters"}
+
+# Quoted SQL strings, which may contain a literal ?
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|SET\b|LEFT\b|JOIN\b)(\w+))?", re.I)
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+def table_names(sql: str) -> set:
+    """Names and aliases of real tables referenced by a statement"""
+    names = set()
+    for table, alias in TABLE_REF.findall(sql):
+        names.add(table)
+        if alias:
+            names.add(alias)
+    return names
+
+def explain(db: sqlite3.Connection, sql: str):
+    """Get plan details and the problems found in them"""
+    params = [None] * STRING_LITERAL.sub("", sql).count("?")
+    details = [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    tables = table_names(sql)
+    problems = []
+    for detail in details:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in tables and match.group(1) not in BOUNDED_TABLES:
+            problems.append(f"full table scan: {detail}")
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(f"temp b-tree sort: {detail}")
+    return details, problems
+
+def route_statements():
+    """Yield (label, SQL) for every statement the routes can issue"""
+    for name, query in sorted(get_registered_queries().items()):
+        for filters, mode, sql in query.variants():
+            label = f"{name}[{', '.join(filters) or 'no filters'}; {mode}]"
+            yield label, sql
+    yield from ROUTE_QUERIES
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database file (default: the application database)")
+    parser.add_argument("--verbose", action="store_true", help="print plans that are not flagged too")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 if any plan is flagged")
+    args = parser.parse_args()
+
+    if args.db:
+        db_manager.db_path = args.db
+    asyncio.run(db_manager.init_database())
+
+    db = sqlite3.connect(db_manager.db_path)
+    db.create_function("haversine_km", 4, haversine_km, deterministic=True)
+    checked = 0
+    flagged = 0
+    accepted = 0
+    for label, sql in route_statements():
+        checked += 1
+        details, problems = explain(db, sql)
+        sort_reason = next((why for pattern, why in ACCEPTED_SORTS if pattern.match(label)), None)
+        scan_reason = next((why for pattern, why in ACCEPTED_SCANS if pattern.match(label)), None)
+        if problems and all(
+            sort_reason if problem.startswith("temp b-tree") else scan_reason for problem in problems
+        ):
+            accepted += 1
+            if args.verbose:
+                kind, reason = ("scan", scan_reason) if scan_reason else ("sort", sort_reason)
+                print(f"NOTE  {label}\n      - accepted {kind}: {reason}")
+        elif problems:
+            flagged += 1
+            print(f"FLAG  {label}")
+            for problem in problems:
+                print(f"      - {problem}")
+        elif args.verbose:
+            print(f"OK    {label}")
+            for detail in details:
+                print(f"      {detail}")
+    db.close()
+
+    print(f"\n{checked} statements checked, {flagged} flagged, {accepted} accepted")
+    if args.strict and flagged:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
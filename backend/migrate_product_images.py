@@ -0,0 +1,106 @@
+"""
+Move Inline Product Images to the Blob Store
+============================================
+
+Products used to keep images as a JSON array of URLs or inline base64 in
+products.images. This moves every inline image (base64, with or without a
+data: URI prefix) into the blob store and rewrites the column to hold blob
+ids only, which keeps product list pages small.
+
+External URLs cannot be moved without downloading them; they are dropped
+from the rewritten column and reported, unless --keep-urls is given, in
+which case products that have any are left untouched.
+
+Usage (from the backend directory):
+    python migrate_product_images.py                  # convert and report
+    python migrate_product_images.py --check          # report only
+    python migrate_product_images.py --keep-urls      # skip products with URLs
+    python migrate_product_images.py --db path/to.db  # use another database
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import sqlite3
+from datetime import datetime
+
+from blob_store import BLOB_ID, blob_store, sniff_content_type
+from database import db_manager
+
+def parse_images(value: str) -> list:
+    """Entries of a legacy images value: a JSON array, or one bare entry"""
+    try:
+        entries = json.loads(value)
+    except ValueError:
+        entries = value
+    if not isinstance(entries, list):
+        entries = [entries]
+    return [entry for entry in entries if isinstance(entry, str) and entry]
+
+def decode_inline(entry: str):
+    """Bytes of an inline base64 image, None if the entry is not one"""
+    if entry.startswith("data:"):
+        entry = entry.partition(",")[2]
+    try:
+        return base64.b64decode(entry, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database file (default: the application database)")
+    parser.add_argument("--check", action="store_true", help="report without converting")
+    parser.add_argument("--keep-urls", action="store_true", help="leave products that reference external URLs unchanged")
+    args = parser.parse_args()
+
+    if args.db:
+        db_manager.db_path = args.db
+    asyncio.run(db_manager.init_database())
+
+    db = sqlite3.connect(db_manager.db_path, isolation_level=None, timeout=30)
+    converted = moved = urls = rejected = 0
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        rows = db.execute("SELECT product_id, images FROM products WHERE images IS NOT NULL").fetchall()
+        for product_id, value in rows:
+            blob_ids = []
+            external = []
+            for entry in parse_images(value):
+                if BLOB_ID.match(entry):
+                    blob_ids.append(entry)
+                    continue
+                data = decode_inline(entry)
+                if data is None:
+                    external.append(entry)
+                    continue
+                if sniff_content_type(data[:16]) is None:
+                    rejected += 1
+                    continue
+                moved += 1
+                if not args.check:
+                    blob_id, size, content_type = blob_store.save_bytes(data)
+                    db.execute(
+                        "INSERT OR IGNORE INTO blobs (blob_id, size, content_type, created_at) VALUES (?, ?, ?, ?)",
+                        (blob_id, size, content_type, datetime.utcnow())
+                    )
+                    entry = blob_id
+                blob_ids.append(entry)
+            urls += len(external)
+            if external and args.keep_urls:
+                continue
+            rewritten = json.dumps(blob_ids)
+            if rewritten != value:
+                converted += 1
+                if not args.check:
+                    db.execute("UPDATE products SET images = ? WHERE product_id = ?", (rewritten, product_id))
+        db.execute("ROLLBACK" if args.check else "COMMIT")
+    finally:
+        db.close()
+
+    print(f"{converted} products {'to convert' if args.check else 'converted'}, {moved} inline images, "
+          f"{rejected} unsupported images dropped, {urls} external URLs {'kept' if args.keep_urls else 'dropped'}")
+
+if __name__ == "__main__":
+    main()
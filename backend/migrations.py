@@ -0,0 +1,627 @@
+"""
+Numbered SQLite3 schema migrations.
+
+DatabaseManager.init_database() records applied versions in the
+schema_version table and only runs migrations newer than the recorded
+version. Never edit a migration that has shipped; append a new one.
+"""
+
+# review_stats subjects: (subject_type, reviews column)
+REVIEW_STATS_SUBJECTS = [("product", "product_id"), ("user", "reviewed_user_id")]
+
+STAR_COLUMNS = ["one_star", "two_star", "three_star", "four_star", "five_star"]
+
+REVIEW_STATS_COLUMNS = "subject_type, subject_id, total_reviews, rating_sum, " + ", ".join(STAR_COLUMNS)
+
+# review_stats rows computed from scratch, in REVIEW_STATS_COLUMNS order
+REVIEW_STATS_AGGREGATE = "\nUNION ALL\n".join(
+    f"""
+    SELECT '{subject}', {column}, COUNT(*), SUM(rating), {", ".join(f"SUM(rating = {n})" for n in range(1, 6))}
+    FROM reviews WHERE {column} IS NOT NULL GROUP BY {column}
+    """
+    for subject, column in REVIEW_STATS_SUBJECTS
+)
+
+def _review_stats_add(row: str) -> str:
+    """Trigger body counting one review row into review_stats"""
+    return "\n".join(f"""
+            INSERT INTO review_stats ({REVIEW_STATS_COLUMNS})
+            SELECT '{subject}', {row}.{column}, 1, {row}.rating, {", ".join(f"{row}.rating = {n}" for n in range(1, 6))}
+            WHERE {row}.{column} IS NOT NULL
+            ON CONFLICT (subject_type, subject_id) DO UPDATE SET
+                total_reviews = total_reviews + 1,
+                rating_sum = rating_sum + excluded.rating_sum,
+                {", ".join(f"{star} = {star} + excluded.{star}" for star in STAR_COLUMNS)};"""
+        for subject, column in REVIEW_STATS_SUBJECTS)
+
+def _review_stats_remove(row: str) -> str:
+    """Trigger body taking one review row out of review_stats"""
+    return "\n".join(f"""
+            UPDATE review_stats SET
+                total_reviews = total_reviews - 1,
+                rating_sum = rating_sum - {row}.rating,
+                {", ".join(f"{star} = {star} - ({row}.rating = {n})" for n, star in enumerate(STAR_COLUMNS, 1))}
+            WHERE subject_type = '{subject}' AND subject_id = {row}.{column};"""
+        for subject, column in REVIEW_STATS_SUBJECTS)
+
+# Maintained counters: (name, table, column, condition on that column a row
+# must meet to be counted); rows without a condition are all counted
+COUNTERS = [
+    ("total_users", "users", None, None),
+    ("active_products", "products", "status", "IS 'active'"),
+    ("total_orders", "orders", None, None),
+    ("active_conversations", "conversations", "is_active", "IS 1"),
+]
+
+# Minutes kept in the message_buckets ring
+MESSAGE_BUCKET_MINUTES = 1440
+
+# The counters and the last day of message buckets, read by the analytics
+# summary; a handful of rows however large the tables grow
+ANALYTICS_SUMMARY_SQL = f"""
+    SELECT
+        (SELECT value FROM counters WHERE name = 'total_users'),
+        (SELECT value FROM counters WHERE name = 'active_products'),
+        (SELECT value FROM counters WHERE name = 'total_orders'),
+        (SELECT value FROM counters WHERE name = 'active_conversations'),
+        (SELECT COALESCE(SUM(count), 0) FROM message_buckets
+         WHERE minute > CAST(strftime('%s', 'now') AS INTEGER) / 60 - {MESSAGE_BUCKET_MINUTES})
+"""
+
+# Unix minute of a timestamp column
+MESSAGE_MINUTE = "CAST(strftime('%s', {row}.sent_at) AS INTEGER) / 60"
+
+def _counted(row: str, column: str, condition: str) -> str:
+    """SQL that is 1 when a row counts towards its counter and 0 otherwise"""
+    return f"({row}.{column} {condition})" if column else "1"
+
+def _counter_triggers(name: str, table: str, column: str, condition: str) -> list:
+    """Triggers keeping one counters row in step with its table"""
+    counted = lambda row: _counted(row, column, condition)
+    triggers = [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE counters SET value = value + {counted('NEW')} WHERE name = '{name}';
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE counters SET value = value - {counted('OLD')} WHERE name = '{name}';
+        END
+        """,
+    ]
+    if column:
+        triggers.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_count_update AFTER UPDATE OF {column} ON {table}
+        BEGIN
+            UPDATE counters SET value = value + {counted('NEW')} - {counted('OLD')} WHERE name = '{name}';
+        END
+        """)
+    return triggers
+
+# Point R*Tree indexes: (table, key column, id map table, R*Tree table).
+# The R*Tree id is the entity's permanent integer id from the map table
+GEO_INDEXES = [
+    ("products", "product_id", "product_doc_ids", "products_geo"),
+    ("users", "user_id", "user_doc_ids", "users_geo"),
+]
+
+def _geo_put(key: str, ids: str, geo: str) -> str:
+    """Trigger body indexing NEW's coordinates, if it has both"""
+    return f"""
+            INSERT OR IGNORE INTO {ids} ({key})
+            SELECT NEW.{key} WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+            INSERT OR REPLACE INTO {geo} (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT doc_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            FROM {ids} WHERE {key} = NEW.{key} AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;"""
+
+def _geo_triggers(table: str, key: str, ids: str, geo: str) -> list:
+    """Triggers keeping a point R*Tree in step with inserts and coordinate updates"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_geo_insert AFTER INSERT ON {table}
+        BEGIN{_geo_put(key, ids, geo)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_geo_update AFTER UPDATE OF latitude, longitude ON {table}
+        BEGIN
+            DELETE FROM {geo} WHERE id = (SELECT doc_id FROM {ids} WHERE {key} = OLD.{key});{_geo_put(key, ids, geo)}
+        END
+        """,
+    ]
+
+# Tables whose row_version column is bumped by every update of a row
+ROW_VERSIONED = ["products", "users"]
+
+# Tables with a table_versions counter bumped by every insert, update and delete
+TABLE_VERSIONED = ["product_categories"]
+
+def _row_version_trigger(table: str) -> str:
+    """Trigger bumping an updated row's row_version; the guard skips its own update"""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_row_version AFTER UPDATE ON {table}
+        WHEN NEW.row_version = OLD.row_version
+        BEGIN
+            UPDATE {table} SET row_version = OLD.row_version + 1 WHERE rowid = NEW.rowid;
+        END
+        """
+
+def _table_version_triggers(table: str) -> list:
+    """Triggers bumping a table's table_versions counter on every change"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+        """
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, "Initial marketplace schema", [
+        # Users table
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            user_type TEXT NOT NULL CHECK (user_type IN ('buyer', 'farmer', 'admin')),
+            full_name TEXT NOT NULL,
+            email TEXT UNIQUE,
+            phone_number TEXT,
+            location TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+        """,
+        # Profiles table
+        """
+        CREATE TABLE IF NOT EXISTS profiles (
+            profile_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            bio TEXT,
+            avatar_url TEXT,
+            address TEXT,
+            city TEXT,
+            state TEXT,
+            country TEXT,
+            postal_code TEXT,
+            date_of_birth DATE,
+            gender TEXT,
+            occupation TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        """,
+        # Product categories table
+        """
+        CREATE TABLE IF NOT EXISTS product_categories (
+            category_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            parent_category_id TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (parent_category_id) REFERENCES product_categories (category_id)
+        )
+        """,
+        # Products table
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            seller_id TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            quantity_available INTEGER DEFAULT 0,
+            unit TEXT DEFAULT 'kg',
+            images TEXT, -- JSON array of image URLs/base64
+            location TEXT,
+            harvest_date DATE,
+            expiry_date DATE,
+            is_organic BOOLEAN DEFAULT 0,
+            status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'sold_out')),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (seller_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (category_id) REFERENCES product_categories (category_id)
+        )
+        """,
+        # Orders table
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id TEXT PRIMARY KEY,
+            buyer_id TEXT NOT NULL,
+            seller_id TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price DECIMAL(10, 2) NOT NULL,
+            total_amount DECIMAL(10, 2) NOT NULL,
+            status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')),
+            delivery_address TEXT,
+            order_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            delivery_date DATETIME,
+            notes TEXT,
+            payment_status TEXT DEFAULT 'pending' CHECK (payment_status IN ('pending', 'paid', 'failed', 'refunded')),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (buyer_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (seller_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE CASCADE
+        )
+        """,
+        # Conversations table
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            conversation_id TEXT PRIMARY KEY,
+            participant_1_id TEXT NOT NULL,
+            participant_2_id TEXT NOT NULL,
+            last_message TEXT,
+            last_message_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (participant_1_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (participant_2_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            UNIQUE(participant_1_id, participant_2_id)
+        )
+        """,
+        # Messages table
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id TEXT PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            sender_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            message_type TEXT DEFAULT 'text' CHECK (message_type IN ('text', 'image', 'file', 'system')),
+            is_read BOOLEAN DEFAULT 0,
+            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            read_at DATETIME,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id) ON DELETE CASCADE,
+            FOREIGN KEY (sender_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        """,
+        # Reviews table
+        """
+        CREATE TABLE IF NOT EXISTS reviews (
+            review_id TEXT PRIMARY KEY,
+            reviewer_id TEXT NOT NULL,
+            reviewed_user_id TEXT,
+            product_id TEXT,
+            order_id TEXT,
+            rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+            comment TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_verified BOOLEAN DEFAULT 0,
+            FOREIGN KEY (reviewer_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (reviewed_user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE CASCADE,
+            FOREIGN KEY (order_id) REFERENCES orders (order_id) ON DELETE CASCADE
+        )
+        """,
+        # Indexes
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)",
+        "CREATE INDEX IF NOT EXISTS idx_users_type ON users (user_type)",
+        "CREATE INDEX IF NOT EXISTS idx_products_seller ON products (seller_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_status ON products (status)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_buyer ON orders (buyer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_seller ON orders (seller_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (sender_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_participants ON conversations (participant_1_id, participant_2_id)",
+    ]),
+    (2, "Composite and partial indexes for list, filter and soft-delete queries", [
+        # Products: listing order, status/category/seller filters and the active-only partials
+        "CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at, product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_status_created ON products (status, created_at, product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_active_created ON products (created_at, product_id) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_products_active_category ON products (category_id, created_at, product_id) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_products_category_created ON products (category_id, created_at, product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category_status_price ON products (category_id, status, price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_seller_created ON products (seller_id, created_at, product_id)",
+        "DROP INDEX IF EXISTS idx_products_status",
+        "DROP INDEX IF EXISTS idx_products_category",
+        "DROP INDEX IF EXISTS idx_products_seller",
+        # Orders: seller dashboards by status, buyer history, listing order
+        "CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at, order_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at, order_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_seller_created ON orders (seller_id, created_at, order_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_seller_status_created ON orders (seller_id, status, created_at, order_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_buyer_created ON orders (buyer_id, created_at, order_id)",
+        "DROP INDEX IF EXISTS idx_orders_status",
+        "DROP INDEX IF EXISTS idx_orders_seller",
+        "DROP INDEX IF EXISTS idx_orders_buyer",
+        # Messages: conversation history in send order and unread lookups
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_sent ON messages (conversation_id, sent_at, message_id)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages (conversation_id, sender_id) WHERE is_read = 0",
+        "DROP INDEX IF EXISTS idx_messages_conversation",
+        # Reviews: per product, per reviewed user, per reviewer, listing order
+        "CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews (created_at, review_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_product_created ON reviews (product_id, created_at, review_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_reviewed_user_created ON reviews (reviewed_user_id, created_at, review_id)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_reviewer_created ON reviews (reviewer_id, created_at, review_id)",
+        # Profiles are always looked up by user
+        "CREATE INDEX IF NOT EXISTS idx_profiles_user ON profiles (user_id)",
+        # Users: listing order, type filter, active-only partial
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_type_created ON users (user_type, created_at, user_id)",
+        "DROP INDEX IF EXISTS idx_users_type",
+        "CREATE INDEX IF NOT EXISTS idx_users_active_created ON users (created_at, user_id) WHERE is_active = 1",
+        # Categories: listing order, children of a parent, active-only partial
+        "CREATE INDEX IF NOT EXISTS idx_categories_created ON product_categories (created_at, category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_categories_parent_created ON product_categories (parent_category_id, created_at, category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_categories_active_created ON product_categories (created_at, category_id) WHERE is_active = 1",
+        # Conversations: inbox lookups by either participant, active only
+        "CREATE INDEX IF NOT EXISTS idx_conversations_active_p1 ON conversations (participant_1_id) WHERE is_active = 1",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_active_p2 ON conversations (participant_2_id) WHERE is_active = 1",
+    ]),
+    (3, "Per-participant read watermarks and unread counters", [
+        # Messages are numbered per conversation; conversations hand out the
+        # next number as messages are sent
+        "ALTER TABLE messages ADD COLUMN seq INTEGER",
+        "ALTER TABLE conversations ADD COLUMN message_seq INTEGER NOT NULL DEFAULT 0",
+        """
+        UPDATE messages SET seq = numbered.seq
+        FROM (
+            SELECT message_id,
+                   ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY sent_at, message_id) AS seq
+            FROM messages
+        ) AS numbered
+        WHERE messages.message_id = numbered.message_id
+        """,
+        """
+        UPDATE conversations SET message_seq = COALESCE(
+            (SELECT MAX(seq) FROM messages WHERE messages.conversation_id = conversations.conversation_id), 0
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_conversation_seq ON messages (conversation_id, seq)",
+        # Everything a participant received up to last_read_seq is read;
+        # unread_count is kept in step by message writes and mark-read
+        """
+        CREATE TABLE IF NOT EXISTS conversation_reads (
+            conversation_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            last_read_seq INTEGER NOT NULL DEFAULT 0,
+            last_read_at DATETIME,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (conversation_id, user_id),
+            FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
+        ) WITHOUT ROWID
+        """,
+        # The watermark sits just below the oldest message still unread, so
+        # per-message flags and the watermark agree for existing data
+        """
+        INSERT OR IGNORE INTO conversation_reads (conversation_id, user_id, last_read_seq, last_read_at, unread_count)
+        SELECT c.conversation_id, p.user_id,
+               COALESCE(
+                   (SELECT MIN(m.seq) - 1 FROM messages m
+                    WHERE m.conversation_id = c.conversation_id AND m.sender_id != p.user_id AND m.is_read = 0),
+                   c.message_seq
+               ),
+               (SELECT MAX(m.read_at) FROM messages m
+                WHERE m.conversation_id = c.conversation_id AND m.sender_id != p.user_id),
+               (SELECT COUNT(*) FROM messages m
+                WHERE m.conversation_id = c.conversation_id AND m.sender_id != p.user_id AND m.is_read = 0)
+        FROM conversations c
+        JOIN (
+            SELECT conversation_id, participant_1_id AS user_id FROM conversations
+            UNION ALL
+            SELECT conversation_id, participant_2_id AS user_id FROM conversations
+        ) p ON p.conversation_id = c.conversation_id
+        """,
+        # Unread lookups now go through conversation_reads
+        "DROP INDEX IF EXISTS idx_messages_unread",
+    ]),
+    (4, "Review statistics rollup per product and reviewed user", [
+        """
+        CREATE TABLE IF NOT EXISTS review_stats (
+            subject_type TEXT NOT NULL CHECK (subject_type IN ('product', 'user')),
+            subject_id TEXT NOT NULL,
+            total_reviews INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            five_star INTEGER NOT NULL DEFAULT 0,
+            four_star INTEGER NOT NULL DEFAULT 0,
+            three_star INTEGER NOT NULL DEFAULT 0,
+            two_star INTEGER NOT NULL DEFAULT 0,
+            one_star INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (subject_type, subject_id)
+        ) WITHOUT ROWID
+        """,
+        f"INSERT INTO review_stats ({REVIEW_STATS_COLUMNS}) {REVIEW_STATS_AGGREGATE}",
+        # Triggers keep the rollup in the same transaction as the review write
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_insert AFTER INSERT ON reviews
+        BEGIN
+            {_review_stats_add('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_update
+        AFTER UPDATE OF rating, product_id, reviewed_user_id ON reviews
+        BEGIN
+            {_review_stats_remove('OLD')}
+            {_review_stats_add('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_delete AFTER DELETE ON reviews
+        BEGIN
+            {_review_stats_remove('OLD')}
+        END
+        """,
+    ]),
+    (5, "Maintained counters and per-minute message buckets for analytics", [
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID",
+        "INSERT OR REPLACE INTO counters (name, value) " + " UNION ALL ".join(
+            f"SELECT '{name}', COUNT(*) FROM {table} WHERE {_counted(table, column, condition)}"
+            for name, table, column, condition in COUNTERS
+        ),
+        *[trigger for counter in COUNTERS for trigger in _counter_triggers(*counter)],
+        # A ring of one-minute message counts; a slot is reused when its
+        # minute comes round again the next day
+        f"""
+        CREATE TABLE IF NOT EXISTS message_buckets (
+            slot INTEGER PRIMARY KEY CHECK (slot >= 0 AND slot < {MESSAGE_BUCKET_MINUTES}),
+            minute INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        INSERT OR REPLACE INTO message_buckets (slot, minute, count)
+        SELECT minute % {MESSAGE_BUCKET_MINUTES}, minute, COUNT(*)
+        FROM (SELECT {MESSAGE_MINUTE.format(row='messages')} AS minute FROM messages
+              WHERE sent_at >= datetime('now', '-24 hours'))
+        WHERE minute IS NOT NULL
+        GROUP BY minute
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_bucket_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO message_buckets (slot, minute, count)
+            SELECT minute % {MESSAGE_BUCKET_MINUTES}, minute, 1
+            FROM (SELECT {MESSAGE_MINUTE.format(row='NEW')} AS minute)
+            WHERE minute IS NOT NULL
+            ON CONFLICT (slot) DO UPDATE SET
+                count = CASE WHEN minute = excluded.minute THEN count + 1 ELSE 1 END,
+                minute = excluded.minute
+            WHERE excluded.minute >= minute;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_bucket_delete AFTER DELETE ON messages
+        BEGIN
+            UPDATE message_buckets SET count = count - 1
+            WHERE slot = {MESSAGE_MINUTE.format(row='OLD')} % {MESSAGE_BUCKET_MINUTES}
+              AND minute = {MESSAGE_MINUTE.format(row='OLD')};
+        END
+        """,
+    ]),
+    (6, "Full-text search over product name, description and location", [
+        # products has a TEXT key and no stable rowid (VACUUM may renumber
+        # it), so each product gets a permanent integer document id
+        """
+        CREATE TABLE IF NOT EXISTS product_doc_ids (
+            doc_id INTEGER PRIMARY KEY,
+            product_id TEXT NOT NULL UNIQUE
+        )
+        """,
+        "INSERT OR IGNORE INTO product_doc_ids (product_id) SELECT product_id FROM products ORDER BY created_at",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, location,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        """
+        INSERT INTO products_fts (rowid, name, description, location)
+        SELECT d.doc_id, p.name, p.description, p.location
+        FROM products p JOIN product_doc_ids d ON d.product_id = p.product_id
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products
+        BEGIN
+            INSERT OR IGNORE INTO product_doc_ids (product_id) VALUES (NEW.product_id);
+            INSERT INTO products_fts (rowid, name, description, location)
+            VALUES ((SELECT doc_id FROM product_doc_ids WHERE product_id = NEW.product_id),
+                    NEW.name, NEW.description, NEW.location);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+        AFTER UPDATE OF name, description, location ON products
+        BEGIN
+            UPDATE products_fts SET name = NEW.name, description = NEW.description, location = NEW.location
+            WHERE rowid = (SELECT doc_id FROM product_doc_ids WHERE product_id = NEW.product_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_fts
+            WHERE rowid = (SELECT doc_id FROM product_doc_ids WHERE product_id = OLD.product_id);
+            DELETE FROM product_doc_ids WHERE product_id = OLD.product_id;
+        END
+        """,
+    ]),
+    (7, "Coordinates and R*Tree point indexes for products and users", [
+        "ALTER TABLE products ADD COLUMN latitude REAL",
+        "ALTER TABLE products ADD COLUMN longitude REAL",
+        "ALTER TABLE users ADD COLUMN latitude REAL",
+        "ALTER TABLE users ADD COLUMN longitude REAL",
+        # Products reuse their full-text document ids; users get their own
+        """
+        CREATE TABLE IF NOT EXISTS user_doc_ids (
+            doc_id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL UNIQUE
+        )
+        """,
+        *[
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {geo} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            for _, _, _, geo in GEO_INDEXES
+        ],
+        *[trigger for index in GEO_INDEXES for trigger in _geo_triggers(*index)],
+        # Index entries must go before the id mapping they are keyed by, and
+        # trigger order is unspecified, so products get one delete trigger
+        "DROP TRIGGER IF EXISTS trg_products_fts_delete",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_products_index_delete AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_fts
+            WHERE rowid = (SELECT doc_id FROM product_doc_ids WHERE product_id = OLD.product_id);
+            DELETE FROM products_geo
+            WHERE id = (SELECT doc_id FROM product_doc_ids WHERE product_id = OLD.product_id);
+            DELETE FROM product_doc_ids WHERE product_id = OLD.product_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_users_geo_delete AFTER DELETE ON users
+        BEGIN
+            DELETE FROM users_geo WHERE id = (SELECT doc_id FROM user_doc_ids WHERE user_id = OLD.user_id);
+            DELETE FROM user_doc_ids WHERE user_id = OLD.user_id;
+        END
+        """,
+    ]),
+    (8, "Metadata for content-addressed image blobs", [
+        # The bytes live in the blob store under data/blobs; blob_id is their SHA-256
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            blob_id TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (9, "Row versions and table change counters for conditional GETs", [
+        *[f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0" for table in ROW_VERSIONED],
+        *[_row_version_trigger(table) for table in ROW_VERSIONED],
+        # A user's detail response includes the profile
+        *[
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_profiles_user_version_{event.lower()} AFTER {event} ON profiles
+            BEGIN
+                UPDATE users SET row_version = row_version + 1 WHERE user_id = {row}.user_id;
+            END
+            """
+            for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+        ],
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        *[f"INSERT OR IGNORE INTO table_versions (table_name) VALUES ('{table}')" for table in TABLE_VERSIONED],
+        *[trigger for table in TABLE_VERSIONED for trigger in _table_version_triggers(table)],
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin
 from datetime import datetime, date
 from enum import Enum
 import uuid
@@ -40,6 +40,8 @@ class UserBase(BaseModel):
     email: Optional[EmailStr] = None
     phone_number: Optional[str] = None
     location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     user_type: UserType
 
 class UserCreate(UserBase):
@@ -50,6 +52,8 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     phone_number: Optional[str] = None
     location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     is_active: Optional[bool] = None
 
 class User(UserBase):
@@ -118,8 +122,10 @@ class ProductBase(BaseModel):
     price: float
     quantity_available: int = 0
     unit: str = "kg"
-    images: Optional[str] = None  # JSON string of image URLs/base64
+    images: Optional[str] = None  # JSON array of image ids from POST /api/images
     location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     harvest_date: Optional[date] = None
     expiry_date: Optional[date] = None
     is_organic: bool = False
@@ -136,6 +142,8 @@ class ProductUpdate(BaseModel):
     unit: Optional[str] = None
     images: Optional[str] = None
     location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     harvest_date: Optional[date] = None
     expiry_date: Optional[date] = None
     is_organic: Optional[bool] = None
@@ -263,6 +271,13 @@ class UserWithProfile(User):
 class ProductWithDetails(Product):
     seller_name: Optional[str] = None
     category_name: Optional[str] = None
+    thumbnail_url: Optional[str] = None  # Resized first image, for listing cards
+
+class NearbyProduct(ProductWithDetails):
+    distance_km: float
+
+class NearbyUser(User):
+    distance_km: Optional[float] = None  # Only when the farmer directory is searched near a location
 
 class OrderWithDetails(Order):
     buyer_name: Optional[str] = None
@@ -274,10 +289,146 @@ class ConversationWithLastMessage(Conversation):
     participant_2_name: Optional[str] = None
     unread_count: int = 0
 
+class CategoryTreeNode(ProductCategory):
+    children: List["CategoryTreeNode"] = []
+
+# Search Models
+class FuzzyMatch(BaseModel):
+    kind: str  # 'product' or 'category'
+    id: str
+    name: str
+    score: float  # trigram similarity, 0-1
+
+class FacetCount(BaseModel):
+    value: Optional[Union[bool, str]] = None
+    label: Optional[str] = None
+    count: int
+
+class PriceBucketCount(BaseModel):
+    value: str  # e.g. '100-250' or '5000+'
+    min_price: float
+    max_price: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int
+    category: List[FacetCount]
+    is_organic: List[FacetCount]
+    price: List[PriceBucketCount]
+    location: List[FacetCount]
+
+class Suggestion(BaseModel):
+    kind: str  # 'product', 'category' or 'farmer'
+    text: str
+    weight: int  # popularity; listings and orders behind the suggestion
+
+# Image Models
+class ImageBlob(BaseModel):
+    blob_id: str  # SHA-256 of the image bytes
+    size: int
+    content_type: str
+    url: str
+    thumbnail_url: str
+
 # Pagination
 class PaginatedResponse(BaseModel):
     items: List[dict]
     total: int
     page: int
     per_page: int
-    pages: int
\ No newline at end of file
+    pages: int
+
+# Row mapping
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _parse_date(value):
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+def _enum_converter(enum_cls):
+    def convert(value):
+        try:
+            return enum_cls(value)
+        except ValueError:
+            return value
+    return convert
+
+def _converter_for(annotation) -> Optional[Callable[[Any], Any]]:
+    """Get the SQLite-to-Python converter for a field type, None if values pass through"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    if annotation is bool:
+        return bool
+    if annotation is float:
+        return float
+    if annotation is datetime:
+        return _parse_datetime
+    if annotation is date:
+        return _parse_date
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return _enum_converter(annotation)
+    return None
+
+class RowMapper:
+    """Builds models from trusted database rows by column name, without re-validation"""
+
+    def __init__(self, model):
+        self.model = model
+        self._converters = {
+            name: _converter_for(field.annotation) for name, field in model.model_fields.items()
+        }
+        self._plans: Dict[Tuple[str, ...], List[Tuple[int, str, Optional[Callable]]]] = {}
+
+    def _plan(self, description) -> List[Tuple[int, str, Optional[Callable]]]:
+        """Get the column plan for a result layout, compiled on first use"""
+        columns = tuple(column[0] for column in description)
+        plan = self._plans.get(columns)
+        if plan is None:
+            plan = [
+                (index, name, self._converters[name])
+                for index, name in enumerate(columns)
+                if name in self._converters
+            ]
+            self._plans[columns] = plan
+        return plan
+
+    def _build(self, plan, row, extra: dict):
+        values = {}
+        for index, name, convert in plan:
+            value = row[index]
+            if value is not None and convert is not None:
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError):
+                    pass
+            values[name] = value
+        if extra:
+            values.update(extra)
+        return self.model.model_construct(**values)
+
+    def from_row(self, cursor, row, **extra):
+        """Build a model from one row of cursor's result set"""
+        if row is None:
+            return None
+        return self._build(self._plan(cursor.description), row, extra)
+
+    def from_rows(self, cursor, rows) -> list:
+        """Build models from rows of cursor's result set"""
+        plan = self._plan(cursor.description)
+        return [self._build(plan, row, None) for row in rows]
+
+user_mapper = RowMapper(User)
+nearby_user_mapper = RowMapper(NearbyUser)
+user_with_profile_mapper = RowMapper(UserWithProfile)
+profile_mapper = RowMapper(Profile)
+category_mapper = RowMapper(ProductCategory)
+product_mapper = RowMapper(Product)
+product_details_mapper = RowMapper(ProductWithDetails)
+nearby_product_mapper = RowMapper(NearbyProduct)
+order_mapper = RowMapper(Order)
+order_details_mapper = RowMapper(OrderWithDetails)
+conversation_mapper = RowMapper(Conversation)
+conversation_details_mapper = RowMapper(ConversationWithLastMessage)
+message_mapper = RowMapper(Message)
+review_mapper = RowMapper(Review)
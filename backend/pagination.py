@@ -0,0 +1,38 @@
+"""
+Opaque keyset cursors for list endpoints.
+
+A cursor encodes the sort key of a boundary row, e.g. (created_at, id). A
+page requested with `after=<cursor>` or `before=<cursor>` seeks straight to
+that key through the sort index, so every page costs the same no matter how
+deep it is, unlike LIMIT/OFFSET which reads and discards all earlier rows.
+"""
+
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+def encode_cursor(key: tuple) -> str:
+    """Encode a sort key as an opaque URL-safe token"""
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, size: int) -> list:
+    """Decode a cursor token, rejecting anything that is not a key of the given size"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return key
+
+def check_cursor_params(after: Optional[str], before: Optional[str]):
+    """Reject requests that page in both directions at once"""
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
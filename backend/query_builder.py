@@ -0,0 +1,208 @@
+"""
+Compiled filter queries for list endpoints.
+
+Each list endpoint declares its base SELECT, the optional filter fragments it
+supports and its sort key once at import time. The SQL text for a given
+combination of active filters and paging mode (offset, after, before) is built
+on first use and cached, so repeat requests neither concatenate strings nor
+produce new SQL variants. Because the text is identical for every request
+using the same filters, SQLite's per-connection prepared statement cache
+(sized by STATEMENT_CACHE_SIZE on pooled connections) reuses the compiled
+statement instead of preparing it again.
+
+A base may select "{columns}" instead of a fixed column list; build() then
+takes the columns of a sparse fieldset (see fieldsets.py) and each distinct
+column list compiles to its own cached text.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from database import STATEMENT_CACHE_SIZE
+from pagination import (
+    NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER, check_cursor_params, decode_cursor, encode_cursor,
+)
+
+OFFSET, AFTER, BEFORE = 0, 1, 2
+
+# Compiled variants kept per query; beyond this, new column lists compile per request
+MAX_COMPILED = 512
+
+class FilterQuery:
+    """List query compiled once per combination of active filters and paging mode"""
+
+    def __init__(
+        self,
+        name: str,
+        base: str,
+        filters: Dict[str, str],
+        key: Sequence[Tuple[str, str]],
+        descending: bool = True,
+        literals: Optional[Dict[str, object]] = None,
+        columns: Optional[str] = None,
+    ):
+        """
+        key is the unique sort key as (SQL expression, result column) pairs,
+        e.g. [("p.created_at", "created_at"), ("p.product_id", "product_id")].
+        Offset and cursor pages share this order, so the two can be mixed.
+        literals maps a filter to the one value that is inlined into the SQL
+        instead of bound, e.g. {"status": "active"}, so the planner can match
+        partial indexes declared WHERE status = 'active'.
+        columns is the default SELECT list for a base written with {columns}.
+        """
+        self.name = name
+        self.base = base.rstrip()
+        self.columns = columns
+        self.filters = list(filters.items())
+        self.literals = literals or {}
+        self.key_exprs = [expr for expr, _ in key]
+        self.key_columns = [column for _, column in key]
+        self.descending = descending
+        direction = "DESC" if descending else "ASC"
+        self.offset_order = ", ".join(f"{expr} {direction}" for expr in self.key_exprs)
+        self._compiled: Dict[Tuple[int, int, int, Optional[str]], str] = {}
+        self.hits = 0
+        self.misses = 0
+        _registry[name] = self
+
+    def _compile(self, mask: int, inlined: int, mode: int, columns: Optional[str] = None) -> str:
+        """Build the SQL text for the filters selected by mask in a paging mode"""
+        sql = self.base
+        if self.columns is not None:
+            sql = sql.replace("{columns}", columns or self.columns)
+        for bit, (name, fragment) in enumerate(self.filters):
+            if mask & (1 << bit):
+                if inlined & (1 << bit):
+                    fragment = fragment.replace("?", _sql_literal(self.literals[name]))
+                sql += f" AND {fragment}"
+
+        if mode == OFFSET:
+            return f"{sql} ORDER BY {self.offset_order} LIMIT ? OFFSET ?"
+
+        # Seeking forward in a descending list means smaller keys, and vice versa;
+        # 'before' pages scan backwards and are reversed after fetching
+        forward = mode == AFTER
+        op = "<" if forward == self.descending else ">"
+        direction = "DESC" if forward == self.descending else "ASC"
+        exprs = ", ".join(self.key_exprs)
+        marks = ", ".join("?" for _ in self.key_exprs)
+        order = ", ".join(f"{expr} {direction}" for expr in self.key_exprs)
+        return f"{sql} AND ({exprs}) {op} ({marks}) ORDER BY {order} LIMIT ?"
+
+    def build(
+        self,
+        values: Dict[str, object],
+        limit: int,
+        skip: int = 0,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        base_params: Sequence = (),
+        columns: Optional[str] = None,
+    ) -> Tuple[str, List]:
+        """Get cached SQL and parameters; filters whose value is None are skipped"""
+        check_cursor_params(after, before)
+        mask = 0
+        inlined = 0
+        params = list(base_params)
+        for bit, (name, fragment) in enumerate(self.filters):
+            value = values.get(name)
+            if value is None:
+                continue
+            mask |= 1 << bit
+            if name in self.literals and value == self.literals[name]:
+                inlined |= 1 << bit
+            elif "?" in fragment:
+                params.append(value)
+
+        mode = AFTER if after else BEFORE if before else OFFSET
+        if columns == self.columns:
+            columns = None
+        cache_key = (mask, inlined, mode, columns)
+        sql = self._compiled.get(cache_key)
+        if sql is None:
+            self.misses += 1
+            sql = self._compile(mask, inlined, mode, columns)
+            if len(self._compiled) < MAX_COMPILED:
+                self._compiled[cache_key] = sql
+        else:
+            self.hits += 1
+
+        if mode == OFFSET:
+            params.extend([limit, skip])
+        else:
+            params.extend(decode_cursor(after or before, len(self.key_exprs)))
+            params.append(limit)
+        return sql, params
+
+    def _key_of(self, positions: List[int], row) -> str:
+        return encode_cursor(tuple(row[index] for index in positions))
+
+    def paginate(
+        self,
+        cursor,
+        rows: list,
+        limit: int,
+        skip: int = 0,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> Tuple[list, Dict[str, str]]:
+        """Put fetched rows in list order and build next/previous cursor headers"""
+        if before:
+            rows = rows[::-1]
+        headers = {}
+        if not rows:
+            return rows, headers
+
+        columns = [column[0] for column in cursor.description]
+        positions = [columns.index(column) for column in self.key_columns]
+        full_page = len(rows) == limit
+        if before or full_page:
+            headers[NEXT_CURSOR_HEADER] = self._key_of(positions, rows[-1])
+        if after or skip or (before and full_page):
+            headers[PREV_CURSOR_HEADER] = self._key_of(positions, rows[0])
+        return rows, headers
+
+    def variants(self):
+        """Yield (filters, paging mode, SQL) for every compilable variant"""
+        inlinable = [bit for bit, (name, _) in enumerate(self.filters) if name in self.literals]
+        for mask in range(1 << len(self.filters)):
+            inline_bits = [bit for bit in inlinable if mask & (1 << bit)]
+            for choice in range(1 << len(inline_bits)):
+                inlined = sum(1 << bit for i, bit in enumerate(inline_bits) if choice & (1 << i))
+                names = []
+                for bit, (name, _) in enumerate(self.filters):
+                    if mask & (1 << bit):
+                        literal = f"={_sql_literal(self.literals[name])}" if inlined & (1 << bit) else ""
+                        names.append(name + literal)
+                for mode, label in ((OFFSET, "offset"), (AFTER, "after"), (BEFORE, "before")):
+                    yield names, label, self._compile(mask, inlined, mode)
+
+    def get_stats(self) -> dict:
+        """Get compile cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "variants": len(self._compiled),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+def _sql_literal(value) -> str:
+    """Render a trusted, code-declared value as an SQL literal"""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+_registry: Dict[str, FilterQuery] = {}
+
+def get_registered_queries() -> Dict[str, FilterQuery]:
+    """Get every registered list query by name"""
+    return dict(_registry)
+
+def get_query_stats() -> dict:
+    """Get compile cache statistics for every registered query"""
+    return {
+        "statement_cache_size": STATEMENT_CACHE_SIZE,
+        "queries": {name: query.get_stats() for name, query in _registry.items()},
+    }
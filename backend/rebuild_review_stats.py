@@ -0,0 +1,72 @@
+"""
+Rebuild Review Statistics
+=========================
+
+Recomputes the review_stats rollup from the reviews table. Triggers keep the
+rollup current on every review write; this repairs drift after manual edits,
+restores from partial backups, or imports that bypassed the triggers.
+
+The rebuild runs in a single write transaction, so the API keeps serving the
+old figures until it commits.
+
+Usage (from the backend directory):
+    python rebuild_review_stats.py                  # rebuild and report drift
+    python rebuild_review_stats.py --check          # report drift only
+    python rebuild_review_stats.py --db path/to.db  # use another database
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import sys
+
+from database import db_manager
+from migrations import REVIEW_STATS_AGGREGATE, REVIEW_STATS_COLUMNS
+
+def find_drift(db: sqlite3.Connection) -> int:
+    """Count subjects whose stored statistics differ from the reviews table"""
+    db.execute("DROP TABLE IF EXISTS temp.fresh_review_stats")
+    db.execute("CREATE TEMP TABLE fresh_review_stats AS SELECT * FROM main.review_stats WHERE 0")
+    db.execute(f"INSERT INTO temp.fresh_review_stats ({REVIEW_STATS_COLUMNS}) {REVIEW_STATS_AGGREGATE}")
+    # Subjects whose last review was deleted keep an all-zero row
+    stored = f"SELECT {REVIEW_STATS_COLUMNS} FROM main.review_stats WHERE total_reviews != 0"
+    fresh = f"SELECT {REVIEW_STATS_COLUMNS} FROM temp.fresh_review_stats"
+    cursor = db.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT subject_type, subject_id FROM ({fresh} EXCEPT {stored})
+            UNION
+            SELECT subject_type, subject_id FROM ({stored} EXCEPT {fresh})
+        )
+    """)
+    return cursor.fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database file (default: the application database)")
+    parser.add_argument("--check", action="store_true", help="report drift without rewriting; exit 1 if any")
+    args = parser.parse_args()
+
+    if args.db:
+        db_manager.db_path = args.db
+    asyncio.run(db_manager.init_database())
+
+    db = sqlite3.connect(db_manager.db_path, isolation_level=None, timeout=30)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        drift = find_drift(db)
+        total = db.execute("SELECT COUNT(*) FROM temp.fresh_review_stats").fetchone()[0]
+        if args.check:
+            db.execute("ROLLBACK")
+        else:
+            db.execute("DELETE FROM review_stats")
+            db.execute("INSERT INTO review_stats SELECT * FROM temp.fresh_review_stats")
+            db.execute("COMMIT")
+    finally:
+        db.close()
+
+    print(f"{total} subjects with reviews, {drift} drifted" + ("" if args.check else ", rebuilt"))
+    if args.check and drift:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
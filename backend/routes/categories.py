@@ -1,20 +1,43 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
+from cache import EntityCache
+from category_tree import category_tree
 from database import db_manager
-from models import ProductCategory, ProductCategoryCreate, ProductCategoryUpdate
+from etags import entity_tag, matches, not_modified, table_version, tagged
+from fuzzy_index import fuzzy_index
+from suggest_index import suggest_index
+from routes.products import PRODUCT_CACHE, PRODUCT_FACETS, PRODUCT_LIST_CACHE
+from models import CategoryTreeNode, ProductCategory, ProductCategoryCreate, ProductCategoryUpdate, category_mapper
+from serialization import encode_item, encode_list, json_response
+from query_builder import FilterQuery
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
+CATEGORY_LIST_QUERY = FilterQuery(
+    "categories",
+    "SELECT * FROM product_categories WHERE 1=1",
+    {
+        "parent_category_id": "parent_category_id = ?",
+        "top_level": "parent_category_id IS NULL",
+        "is_active": "is_active = ?",
+    },
+    [("created_at", "created_at"), ("category_id", "category_id")],
+    literals={"is_active": True},
+)
+
+# Encoded category details, dropped on writes to the category
+CATEGORY_CACHE = EntityCache("categories")
+
 @router.post("/", response_model=ProductCategory)
 async def create_category(category: ProductCategoryCreate):
     """Create a new product category"""
     category_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         try:
             await db.execute("""
                 INSERT INTO product_categories (category_id, name, description, parent_category_id, created_at, is_active)
@@ -26,68 +49,83 @@ async def create_category(category: ProductCategoryCreate):
             cursor = await db.execute("SELECT * FROM product_categories WHERE category_id = ?", (category_id,))
             row = await cursor.fetchone()
             if row:
-                return ProductCategory(
-                    category_id=row[0], name=row[1], description=row[2],
-                    parent_category_id=row[3], created_at=row[4], is_active=bool(row[5])
-                )
+                fuzzy_index.put("category", category_id, category.name)
+                suggest_index.put_category(category_id, category.name)
+                await category_tree.load(db)
+                return category_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating category: {str(e)}")
 
 @router.get("/", response_model=List[ProductCategory])
 async def get_categories(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
     parent_category_id: Optional[str] = None,
     is_active: Optional[bool] = None
 ):
-    """Get all product categories with optional filtering"""
-    query = "SELECT * FROM product_categories WHERE 1=1"
-    params = []
-    
-    if parent_category_id is not None:
-        if parent_category_id == "":
-            query += " AND parent_category_id IS NULL"
-        else:
-            query += " AND parent_category_id = ?"
-            params.append(parent_category_id)
-    
-    if is_active is not None:
-        query += " AND is_active = ?"
-        params.append(is_active)
-    
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, skip])
+    """Get all product categories with optional filtering, by offset or keyset cursor"""
+    query, params = CATEGORY_LIST_QUERY.build({
+        "parent_category_id": parent_category_id or None,
+        "top_level": True if parent_category_id == "" else None,
+        "is_active": is_active,
+    }, limit, skip, after, before)
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
+        # Any category write changes the list
+        etag = entity_tag("categories", await table_version(db, "product_categories"))
+        if matches(request, etag):
+            return not_modified(etag)
+        
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+        rows, headers = CATEGORY_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            ProductCategory(
-                category_id=row[0], name=row[1], description=row[2],
-                parent_category_id=row[3], created_at=row[4], is_active=bool(row[5])
-            ) for row in rows
-        ]
+        return tagged(encode_list(ProductCategory, category_mapper.from_rows(cursor, rows), headers), etag)
+
+@router.get("/tree", response_model=List[CategoryTreeNode])
+async def get_category_tree(request: Request, include_inactive: bool = False):
+    """
+    The whole hierarchy as nested children, siblings by name, from the
+    in-memory snapshot; an inactive category hides its subtree unless
+    include_inactive
+    """
+    async with await db_manager.get_read_connection() as db:
+        snapshot = await category_tree.current(db)
+    etag = entity_tag("categories", snapshot.version)
+    if matches(request, etag):
+        return not_modified(etag)
+    return tagged(json_response(snapshot.encoded(include_inactive)), etag)
 
 @router.get("/{category_id}", response_model=ProductCategory)
-async def get_category(category_id: str):
-    """Get a specific category by ID"""
-    async with await db_manager.get_connection() as db:
+async def get_category(category_id: str, request: Request):
+    """Get a specific category by ID, from cache when unchanged; If-None-Match answers 304"""
+    cached = CATEGORY_CACHE.get(category_id)
+    if cached is not None:
+        return cached.respond(request)
+    
+    generation = CATEGORY_CACHE.generation
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute("SELECT * FROM product_categories WHERE category_id = ?", (category_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Category not found")
         
-        return ProductCategory(
-            category_id=row[0], name=row[1], description=row[2],
-            parent_category_id=row[3], created_at=row[4], is_active=bool(row[5])
-        )
+        # The tag is the table version, so check the row exists before answering 304
+        etag = entity_tag("categories", await table_version(db, "product_categories"))
+        if matches(request, etag):
+            return not_modified(etag)
+        
+        response = tagged(encode_item(ProductCategory, category_mapper.from_row(cursor, row)), etag)
+        CATEGORY_CACHE.put(category_id, (), response, generation)
+        return response
 
 @router.put("/{category_id}", response_model=ProductCategory)
 async def update_category(category_id: str, category_update: ProductCategoryUpdate):
     """Update a category"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if category exists
         cursor = await db.execute("SELECT category_id FROM product_categories WHERE category_id = ?", (category_id,))
         if not await cursor.fetchone():
@@ -115,17 +153,28 @@ async def update_category(category_id: str, category_update: ProductCategoryUpda
             # Return updated category
             cursor = await db.execute("SELECT * FROM product_categories WHERE category_id = ?", (category_id,))
             row = await cursor.fetchone()
-            return ProductCategory(
-                category_id=row[0], name=row[1], description=row[2],
-                parent_category_id=row[3], created_at=row[4], is_active=bool(row[5])
-            )
+            updated = category_mapper.from_row(cursor, row)
+            # Category facet labels, product details and listing pages show the category's name
+            PRODUCT_FACETS.invalidate()
+            CATEGORY_CACHE.invalidate(category_id)
+            PRODUCT_CACHE.invalidate_dependents("category", category_id)
+            if category_update.name is not None:
+                PRODUCT_LIST_CACHE.clear()
+            await category_tree.load(db)
+            if updated.is_active:
+                fuzzy_index.put("category", category_id, updated.name)
+                suggest_index.put_category(category_id, updated.name)
+            else:
+                fuzzy_index.remove("category", category_id)
+                suggest_index.remove_category(category_id)
+            return updated
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating category: {str(e)}")
 
 @router.delete("/{category_id}")
 async def delete_category(category_id: str):
     """Delete a category (soft delete)"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         cursor = await db.execute("SELECT category_id FROM product_categories WHERE category_id = ?", (category_id,))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="Category not found")
@@ -133,5 +182,9 @@ async def delete_category(category_id: str):
         await db.execute("UPDATE product_categories SET is_active = ? WHERE category_id = ?", 
                         (False, category_id))
         await db.commit()
+        fuzzy_index.remove("category", category_id)
+        suggest_index.remove_category(category_id)
+        CATEGORY_CACHE.invalidate(category_id)
+        await category_tree.load(db)
         
         return {"message": "Category deleted successfully"}
\ No newline at end of file
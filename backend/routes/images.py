@@ -0,0 +1,143 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
+import asyncio
+import json
+from datetime import datetime
+
+from blob_store import BLOB_ID, MAX_BLOB_BYTES, BlobTooLargeError, UnsupportedBlobError, blob_store, read_file_range
+from database import db_manager
+from etags import matches
+from image_pipeline import DERIVATIVE_CONTENT_TYPE, DERIVATIVE_SIZES, ImageProcessingError, image_pipeline
+from models import ImageBlob
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+# A blob id names fixed content, so clients may keep it forever
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# Stored size and type of an uploaded original
+BLOB_META_SQL = "SELECT size, content_type FROM blobs WHERE blob_id = ?"
+
+def image_url(blob_id: str, size: Optional[str] = None) -> str:
+    return f"/api/images/{blob_id}?size={size}" if size else f"/api/images/{blob_id}"
+
+def _unsatisfiable(size: int) -> HTTPException:
+    return HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single byte range; None serves the whole blob"""
+    unit, _, spec = header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if (unit.strip().lower() != "bytes" or "," in spec or not dash or not (first or last)
+            or (first and not first.isdigit()) or (last and not last.isdigit())):
+        # Malformed and multipart ranges are ignored; the full body is a valid answer
+        return None
+    if not first:
+        # bytes=-N is the last N bytes
+        if int(last) == 0:
+            raise _unsatisfiable(size)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise _unsatisfiable(size)
+    if last and int(last) < start:
+        return None
+    return start, min(int(last), size - 1) if last else size - 1
+
+def _serve_file(request: Request, path, size: int, content_type: str, etag: str) -> Response:
+    """Conditional and ranged response for a file whose content never changes"""
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE, "Accept-Ranges": "bytes"}
+    if matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        requested = _parse_range(range_header, size)
+        if requested is not None:
+            start, end = requested
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        read_file_range(path, start, end), status_code=status_code, media_type=content_type, headers=headers
+    )
+
+async def check_image_ids(db, images: Optional[str]) -> Optional[str]:
+    """Validate a product's images as a JSON array of uploaded blob ids"""
+    if images is None:
+        return None
+    try:
+        blob_ids = json.loads(images)
+    except ValueError:
+        blob_ids = None
+    if not isinstance(blob_ids, list) or not all(isinstance(blob_id, str) and BLOB_ID.match(blob_id) for blob_id in blob_ids):
+        raise HTTPException(status_code=400, detail="images must be a JSON array of ids returned by POST /api/images")
+    if blob_ids:
+        marks = ", ".join("?" for _ in set(blob_ids))
+        cursor = await db.execute(f"SELECT COUNT(*) FROM blobs WHERE blob_id IN ({marks})", list(set(blob_ids)))
+        if (await cursor.fetchone())[0] != len(set(blob_ids)):
+            raise HTTPException(status_code=400, detail="images refers to an image that was never uploaded")
+    return json.dumps(blob_ids)
+
+@router.post("", response_model=ImageBlob)
+async def upload_image(request: Request):
+    """Stream a raw JPEG, PNG, GIF or WebP request body into the blob store"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_BLOB_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {MAX_BLOB_BYTES} bytes")
+    try:
+        blob_id, size, content_type, created = await blob_store.save(request.stream())
+    except BlobTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedBlobError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    async with await db_manager.get_write_connection() as db:
+        try:
+            # The same content uploaded again is the same blob
+            await db.execute(
+                "INSERT OR IGNORE INTO blobs (blob_id, size, content_type, created_at) VALUES (?, ?, ?, ?)",
+                (blob_id, size, content_type, datetime.utcnow())
+            )
+            await db.commit()
+        except Exception as e:
+            # A file this upload created has no metadata row; one stored before is left alone
+            if created:
+                await asyncio.to_thread(blob_store.discard, blob_id)
+            raise HTTPException(status_code=400, detail=f"Error storing image: {str(e)}")
+
+    image_pipeline.queue_all(blob_id)
+    return ImageBlob(
+        blob_id=blob_id, size=size, content_type=content_type,
+        url=image_url(blob_id), thumbnail_url=image_url(blob_id, "thumb")
+    )
+
+@router.get("/{blob_id}")
+async def get_image(
+    blob_id: str,
+    request: Request,
+    size: Optional[str] = Query(None, description="Resized WebP variant: thumb or medium; the original when omitted")
+):
+    """Serve an image or one of its derivatives with Content-Length, single byte ranges and immutable caching"""
+    if size is not None and size not in DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of: {', '.join(DERIVATIVE_SIZES)}")
+    if not BLOB_ID.match(blob_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(BLOB_META_SQL, (blob_id,))
+        row = await cursor.fetchone()
+    if not row or not blob_store.exists(blob_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if size is None:
+        return _serve_file(request, blob_store.path_for(blob_id), row[0], row[1], f'"{blob_id}"')
+    try:
+        path = await image_pipeline.ensure(blob_id, size)
+    except ImageProcessingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    file_size = (await asyncio.to_thread(path.stat)).st_size
+    return _serve_file(request, path, file_size, DERIVATIVE_CONTENT_TYPE, f'"{blob_id}-{size}"')
@@ -3,122 +3,208 @@ from typing import List, Optional
 import uuid
 from datetime import datetime
 
-from database import db_manager
-from models import Message, MessageCreate, MessageUpdate
+from database import db_manager, PoolTimeoutError
+from models import Message, MessageCreate, MessageUpdate, message_mapper
+from serialization import encode_list
+from query_builder import FilterQuery
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+# A message counts as read when it was flagged individually or when it is
+# at or below the recipient's read watermark
+MESSAGE_SELECT = """
+    SELECT m.message_id, m.conversation_id, m.sender_id, m.content, m.message_type,
+           CASE WHEN m.is_read OR m.seq <= r.last_read_seq THEN 1 ELSE 0 END as is_read,
+           m.sent_at,
+           COALESCE(m.read_at, CASE WHEN m.seq <= r.last_read_seq THEN r.last_read_at END) as read_at
+    FROM messages m
+    LEFT JOIN conversations c ON c.conversation_id = m.conversation_id
+    LEFT JOIN conversation_reads r ON r.conversation_id = m.conversation_id
+        AND r.user_id = CASE WHEN m.sender_id = c.participant_1_id
+                             THEN c.participant_2_id ELSE c.participant_1_id END
+"""
+
+# Recipient of a message sent by ? in conversation ?
+RECIPIENT_SQL = """
+    SELECT CASE WHEN participant_1_id = ? THEN participant_2_id ELSE participant_1_id END
+    FROM conversations WHERE conversation_id = ?
+"""
+
+# Per-message read flag change applied to the recipient's unread counter;
+# messages at or below the watermark are already counted as read
+ADJUST_UNREAD_SQL = f"""
+    UPDATE conversation_reads
+    SET unread_count = MAX(unread_count + ?, 0)
+    WHERE conversation_id = ? AND user_id = ({RECIPIENT_SQL}) AND last_read_seq < ?
+"""
+
+# Lowering a recipient's watermark below a message: read it, flag the
+# messages it covered above the message, then move it
+WATERMARK_SQL = f"""
+    SELECT user_id, last_read_seq, last_read_at FROM conversation_reads
+    WHERE conversation_id = ? AND user_id = ({RECIPIENT_SQL})
+"""
+FLAG_COVERED_SQL = """
+    UPDATE messages SET is_read = 1, read_at = COALESCE(read_at, ?)
+    WHERE conversation_id = ? AND sender_id = ? AND seq > ? AND seq <= ? AND is_read = 0
+"""
+LOWER_WATERMARK_SQL = """
+    UPDATE conversation_reads SET last_read_seq = ?, unread_count = unread_count + 1
+    WHERE conversation_id = ? AND user_id = ?
+"""
+
+# Moves a user's watermark to the latest message instead of touching every unread row
+MARK_READ_SQL = """
+    INSERT INTO conversation_reads (conversation_id, user_id, last_read_seq, last_read_at, unread_count)
+    SELECT conversation_id, ?, message_seq, ?, 0 FROM conversations WHERE conversation_id = ?
+    ON CONFLICT (conversation_id, user_id) DO UPDATE
+    SET last_read_seq = excluded.last_read_seq, last_read_at = excluded.last_read_at, unread_count = 0
+"""
+
+MESSAGE_LIST_QUERY = FilterQuery(
+    "messages",
+    MESSAGE_SELECT + " WHERE m.conversation_id = ?",
+    {},
+    [("m.sent_at", "sent_at"), ("m.message_id", "message_id")],
+    descending=False,
+)
+
+async def _adjust_unread(db, conversation_id: str, sender_id: str, seq: Optional[int], delta: int):
+    """Apply a per-message read flag change to the recipient's unread counter"""
+    await db.execute(ADJUST_UNREAD_SQL, (delta, conversation_id, sender_id, conversation_id, seq))
+
+async def _lower_watermark(db, conversation_id: str, sender_id: str, seq: int) -> bool:
+    """
+    Make a message the recipient has read through the watermark unread again:
+    flag the other messages the watermark covered above it as read one by one,
+    then lower the watermark just below it. False when the watermark is below
+    the message already
+    """
+    cursor = await db.execute(WATERMARK_SQL, (conversation_id, sender_id, conversation_id))
+    reads = await cursor.fetchone()
+    if not reads or reads[1] < seq:
+        return False
+    recipient_id, last_read_seq, last_read_at = reads
+    await db.execute(FLAG_COVERED_SQL, (last_read_at, conversation_id, sender_id, seq, last_read_seq))
+    await db.execute(LOWER_WATERMARK_SQL, (seq - 1, conversation_id, recipient_id))
+    return True
+
+def message_statements(message_id: str, message: MessageCreate, now: datetime) -> list:
+    """
+    Statements writing one message: take the next sequence number, insert
+    the message and bump the recipient's unread counter
+    """
+    return [
+        ("""
+            UPDATE conversations 
+            SET last_message = ?, last_message_at = ?, message_seq = message_seq + 1
+            WHERE conversation_id = ?
+        """, (message.content[:100] + ('...' if len(message.content) > 100 else ''), now, message.conversation_id)),
+        ("""
+            INSERT INTO messages (message_id, conversation_id, sender_id, content, message_type, is_read, sent_at, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT message_seq FROM conversations WHERE conversation_id = ?))
+        """, (message_id, message.conversation_id, message.sender_id, message.content,
+              message.message_type, False, now, message.conversation_id)),
+        (f"""
+            INSERT INTO conversation_reads (conversation_id, user_id, unread_count)
+            SELECT ?, ({RECIPIENT_SQL}), 1
+            WHERE EXISTS (SELECT 1 FROM conversations WHERE conversation_id = ?)
+            ON CONFLICT (conversation_id, user_id) DO UPDATE SET unread_count = unread_count + 1
+        """, (message.conversation_id, message.sender_id, message.conversation_id, message.conversation_id)),
+    ]
+
 @router.post("/", response_model=Message)
 async def create_message(message: MessageCreate):
     """Create a new message"""
     message_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
-        try:
-            # Insert message
-            await db.execute("""
-                INSERT INTO messages (message_id, conversation_id, sender_id, content, message_type, is_read, sent_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (message_id, message.conversation_id, message.sender_id, message.content, 
-                  message.message_type, False, now))
-            
-            # Update conversation's last message
-            await db.execute("""
-                UPDATE conversations 
-                SET last_message = ?, last_message_at = ?
-                WHERE conversation_id = ?
-            """, (message.content[:100] + ('...' if len(message.content) > 100 else ''), now, message.conversation_id))
-            
-            await db.commit()
-            
-            return Message(
-                message_id=message_id,
-                conversation_id=message.conversation_id,
-                sender_id=message.sender_id,
-                content=message.content,
-                message_type=message.message_type,
-                is_read=False,
-                sent_at=now
-            )
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error creating message: {str(e)}")
+    try:
+        # One job; concurrent messages share a single commit
+        await db_manager.group_commit(message_statements(message_id, message, now))
+        
+        return Message(
+            message_id=message_id,
+            conversation_id=message.conversation_id,
+            sender_id=message.sender_id,
+            content=message.content,
+            message_type=message.message_type,
+            is_read=False,
+            sent_at=now
+        )
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error creating message: {str(e)}")
 
 @router.get("/", response_model=List[Message])
 async def get_messages(
     conversation_id: str = Query(..., description="Conversation ID to get messages for"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page")
 ):
-    """Get all messages in a conversation"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("""
-            SELECT * FROM messages 
-            WHERE conversation_id = ?
-            ORDER BY sent_at ASC
-            LIMIT ? OFFSET ?
-        """, (conversation_id, limit, skip))
-        
-        rows = await cursor.fetchall()
+    """Get all messages in a conversation, oldest first, by offset or keyset cursor"""
+    query, params = MESSAGE_LIST_QUERY.build(
+        {}, limit, skip, after, before, base_params=(conversation_id,)
+    )
+    
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(query, params)
+        rows, headers = MESSAGE_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            Message(
-                message_id=row[0], conversation_id=row[1], sender_id=row[2], content=row[3],
-                message_type=row[4], is_read=bool(row[5]), sent_at=row[6], read_at=row[7]
-            ) for row in rows
-        ]
+        return encode_list(Message, message_mapper.from_rows(cursor, rows), headers)
 
 @router.get("/{message_id}", response_model=Message)
 async def get_message(message_id: str):
     """Get a specific message by ID"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(MESSAGE_SELECT + " WHERE m.message_id = ?", (message_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Message not found")
         
-        return Message(
-            message_id=row[0], conversation_id=row[1], sender_id=row[2], content=row[3],
-            message_type=row[4], is_read=bool(row[5]), sent_at=row[6], read_at=row[7]
-        )
+        return message_mapper.from_row(cursor, row)
 
 @router.put("/{message_id}", response_model=Message)
 async def update_message(message_id: str, message_update: MessageUpdate):
     """Update a message (mainly for marking as read)"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if message exists
-        cursor = await db.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
+        cursor = await db.execute(
+            "SELECT conversation_id, sender_id, seq, is_read FROM messages WHERE message_id = ?", (message_id,)
+        )
         row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Message not found")
         
         try:
+            conversation_id, sender_id, seq, was_read = row
+            # Unread below the watermark needs the watermark moved, which also
+            # counts the message as unread again
+            lowered = not message_update.is_read and await _lower_watermark(db, conversation_id, sender_id, seq)
             read_at = datetime.utcnow() if message_update.is_read else None
             await db.execute("UPDATE messages SET is_read = ?, read_at = ? WHERE message_id = ?", 
                            (message_update.is_read, read_at, message_id))
+            if not lowered and bool(was_read) != message_update.is_read:
+                await _adjust_unread(db, conversation_id, sender_id, seq, -1 if message_update.is_read else 1)
             await db.commit()
             
             # Return updated message
-            cursor = await db.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
+            cursor = await db.execute(MESSAGE_SELECT + " WHERE m.message_id = ?", (message_id,))
             row = await cursor.fetchone()
-            return Message(
-                message_id=row[0], conversation_id=row[1], sender_id=row[2], content=row[3],
-                message_type=row[4], is_read=bool(row[5]), sent_at=row[6], read_at=row[7]
-            )
+            return message_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating message: {str(e)}")
 
 @router.put("/conversation/{conversation_id}/mark-read")
 async def mark_conversation_messages_read(conversation_id: str, user_id: str = Query(...)):
     """Mark all messages in a conversation as read for a user"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         now = datetime.utcnow()
-        await db.execute("""
-            UPDATE messages 
-            SET is_read = 1, read_at = ?
-            WHERE conversation_id = ? AND sender_id != ? AND is_read = 0
-        """, (now, conversation_id, user_id))
+        await db.execute(MARK_READ_SQL, (user_id, now, conversation_id))
         await db.commit()
         
         return {"message": "Messages marked as read"}
@@ -126,12 +212,18 @@ async def mark_conversation_messages_read(conversation_id: str, user_id: str = Q
 @router.delete("/{message_id}")
 async def delete_message(message_id: str):
     """Delete a message"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("SELECT message_id FROM messages WHERE message_id = ?", (message_id,))
-        if not await cursor.fetchone():
+    async with await db_manager.get_write_connection() as db:
+        cursor = await db.execute(
+            "SELECT conversation_id, sender_id, seq, is_read FROM messages WHERE message_id = ?", (message_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
             raise HTTPException(status_code=404, detail="Message not found")
         
+        conversation_id, sender_id, seq, is_read = row
         await db.execute("DELETE FROM messages WHERE message_id = ?", (message_id,))
+        if not is_read:
+            await _adjust_unread(db, conversation_id, sender_id, seq, -1)
         await db.commit()
         
         return {"message": "Message deleted successfully"}
\ No newline at end of file
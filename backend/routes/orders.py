@@ -4,17 +4,57 @@ import uuid
 from datetime import datetime
 
 from database import db_manager
-from models import Order, OrderCreate, OrderUpdate, OrderWithDetails
+from fieldsets import FIELDS_HELP, FieldSet
+from suggest_index import suggest_index
+from models import Order, OrderCreate, OrderUpdate, OrderWithDetails, order_mapper
+from query_builder import FilterQuery
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+# Response fields over orders o with buyer b, seller s and product p, for ?fields=
+ORDER_FIELDS = FieldSet(OrderWithDetails, "o", {
+    "buyer_name": "b.full_name",
+    "seller_name": "s.full_name",
+    "product_name": "p.name",
+})
+
+ORDER_LIST_QUERY = FilterQuery(
+    "orders",
+    """
+        SELECT {columns}
+        FROM orders o
+        LEFT JOIN users b ON o.buyer_id = b.user_id
+        LEFT JOIN users s ON o.seller_id = s.user_id
+        LEFT JOIN products p ON o.product_id = p.product_id
+        WHERE 1=1
+    """,
+    {
+        "buyer_id": "o.buyer_id = ?",
+        "seller_id": "o.seller_id = ?",
+        "status": "o.status = ?",
+        "payment_status": "o.payment_status = ?",
+    },
+    [("o.created_at", "created_at"), ("o.order_id", "order_id")],
+    columns=ORDER_FIELDS.all.columns,
+)
+
+# One order with its party and product names, formatted with the selected columns
+ORDER_DETAIL_SQL = """
+    SELECT {columns}
+    FROM orders o
+    LEFT JOIN users b ON o.buyer_id = b.user_id
+    LEFT JOIN users s ON o.seller_id = s.user_id
+    LEFT JOIN products p ON o.product_id = p.product_id
+    WHERE o.order_id = ?
+"""
+
 @router.post("/", response_model=Order)
 async def create_order(order: OrderCreate):
     """Create a new order"""
     order_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         try:
             await db.execute("""
                 INSERT INTO orders (
@@ -32,12 +72,8 @@ async def create_order(order: OrderCreate):
             cursor = await db.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,))
             row = await cursor.fetchone()
             if row:
-                return Order(
-                    order_id=row[0], buyer_id=row[1], seller_id=row[2], product_id=row[3],
-                    quantity=row[4], unit_price=row[5], total_amount=row[6], status=row[7],
-                    delivery_address=row[8], order_date=row[9], delivery_date=row[10],
-                    notes=row[11], payment_status=row[12], created_at=row[13], updated_at=row[14]
-                )
+                suggest_index.record_order(order.product_id)
+                return order_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating order: {str(e)}")
 
@@ -45,90 +81,46 @@ async def create_order(order: OrderCreate):
 async def get_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
     buyer_id: Optional[str] = None,
     seller_id: Optional[str] = None,
     status: Optional[str] = None,
-    payment_status: Optional[str] = None
+    payment_status: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
 ):
-    """Get all orders with optional filtering"""
-    query = """
-        SELECT o.*, 
-               b.full_name as buyer_name,
-               s.full_name as seller_name,
-               p.name as product_name
-        FROM orders o
-        LEFT JOIN users b ON o.buyer_id = b.user_id
-        LEFT JOIN users s ON o.seller_id = s.user_id
-        LEFT JOIN products p ON o.product_id = p.product_id
-        WHERE 1=1
-    """
-    params = []
-    
-    if buyer_id:
-        query += " AND o.buyer_id = ?"
-        params.append(buyer_id)
-    
-    if seller_id:
-        query += " AND o.seller_id = ?"
-        params.append(seller_id)
-    
-    if status:
-        query += " AND o.status = ?"
-        params.append(status)
-    
-    if payment_status:
-        query += " AND o.payment_status = ?"
-        params.append(payment_status)
-    
-    query += " ORDER BY o.created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, skip])
+    """Get all orders with optional filtering, by offset or keyset cursor"""
+    selection = ORDER_FIELDS.select(fields, ORDER_LIST_QUERY.key_columns)
+    query, params = ORDER_LIST_QUERY.build({
+        "buyer_id": buyer_id or None,
+        "seller_id": seller_id or None,
+        "status": status or None,
+        "payment_status": payment_status or None,
+    }, limit, skip, after, before, columns=selection.columns)
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+        rows, headers = ORDER_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            OrderWithDetails(
-                order_id=row[0], buyer_id=row[1], seller_id=row[2], product_id=row[3],
-                quantity=row[4], unit_price=row[5], total_amount=row[6], status=row[7],
-                delivery_address=row[8], order_date=row[9], delivery_date=row[10],
-                notes=row[11], payment_status=row[12], created_at=row[13], updated_at=row[14],
-                buyer_name=row[15], seller_name=row[16], product_name=row[17]
-            ) for row in rows
-        ]
+        return selection.encode_rows(cursor, rows, headers)
 
 @router.get("/{order_id}", response_model=OrderWithDetails)
-async def get_order(order_id: str):
+async def get_order(order_id: str, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """Get a specific order by ID"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("""
-            SELECT o.*, 
-                   b.full_name as buyer_name,
-                   s.full_name as seller_name,
-                   p.name as product_name
-            FROM orders o
-            LEFT JOIN users b ON o.buyer_id = b.user_id
-            LEFT JOIN users s ON o.seller_id = s.user_id
-            LEFT JOIN products p ON o.product_id = p.product_id
-            WHERE o.order_id = ?
-        """, (order_id,))
+    selection = ORDER_FIELDS.select(fields, ("order_id",))
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(ORDER_DETAIL_SQL.format(columns=selection.columns), (order_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        return OrderWithDetails(
-            order_id=row[0], buyer_id=row[1], seller_id=row[2], product_id=row[3],
-            quantity=row[4], unit_price=row[5], total_amount=row[6], status=row[7],
-            delivery_address=row[8], order_date=row[9], delivery_date=row[10],
-            notes=row[11], payment_status=row[12], created_at=row[13], updated_at=row[14],
-            buyer_name=row[15], seller_name=row[16], product_name=row[17]
-        )
+        return selection.encode_row(cursor, row)
 
 @router.put("/{order_id}", response_model=Order)
 async def update_order(order_id: str, order_update: OrderUpdate):
     """Update an order"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if order exists
         cursor = await db.execute("SELECT order_id FROM orders WHERE order_id = ?", (order_id,))
         if not await cursor.fetchone():
@@ -159,19 +151,14 @@ async def update_order(order_id: str, order_update: OrderUpdate):
             # Return updated order
             cursor = await db.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,))
             row = await cursor.fetchone()
-            return Order(
-                order_id=row[0], buyer_id=row[1], seller_id=row[2], product_id=row[3],
-                quantity=row[4], unit_price=row[5], total_amount=row[6], status=row[7],
-                delivery_address=row[8], order_date=row[9], delivery_date=row[10],
-                notes=row[11], payment_status=row[12], created_at=row[13], updated_at=row[14]
-            )
+            return order_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating order: {str(e)}")
 
 @router.delete("/{order_id}")
 async def delete_order(order_id: str):
     """Cancel an order"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         cursor = await db.execute("SELECT order_id FROM orders WHERE order_id = ?", (order_id,))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="Order not found")
@@ -1,30 +1,207 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
+import json
+import re
 import uuid
 from datetime import datetime
 
+from cache import EntityCache, TaggedCache
+from category_tree import category_tree
 from database import db_manager
-from models import Product, ProductCreate, ProductUpdate, ProductWithDetails
+from etags import entity_tag, matches, not_modified, tagged
+from facets import FacetEngine
+from fieldsets import FIELDS_HELP, FieldSet
+from fuzzy_index import fuzzy_index, DEFAULT_THRESHOLD
+from geo import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, fetch_nearest
+from suggest_index import suggest_index
+from models import (
+    FuzzyMatch, NearbyProduct, Product, ProductFacets, ProductCreate, ProductStatus, ProductUpdate, ProductWithDetails,
+    product_mapper,
+)
+from routes.images import check_image_ids
+from serialization import encode_list
+from query_builder import FilterQuery
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+PRODUCT_FILTERS = {
+    "category_id": "p.category_id = ?",
+    # A category with its descendants, bound as one JSON array so every
+    # subtree shares one statement
+    "category_ids": "p.category_id IN (SELECT value FROM json_each(?))",
+    "seller_id": "p.seller_id = ?",
+    "status": "p.status = ?",
+    "is_organic": "p.is_organic = ?",
+    "min_price": "p.price >= ?",
+    "max_price": "p.price <= ?",
+}
+
+# Listing cards show the thumbnail derivative of a product's first image
+THUMBNAIL_URL = """
+    CASE WHEN json_valid(p.images) AND length(json_extract(p.images, '$[0]')) = 64
+         THEN '/api/images/' || json_extract(p.images, '$[0]') || '?size=thumb' END
+"""
+
+# Response fields and their expressions over products p, users u and
+# product_categories pc, for ?fields=
+PRODUCT_EXPRESSIONS = {
+    "seller_name": "u.full_name",
+    "category_name": "pc.name",
+    "thumbnail_url": THUMBNAIL_URL,
+}
+PRODUCT_FIELDS = FieldSet(ProductWithDetails, "p", PRODUCT_EXPRESSIONS)
+NEARBY_PRODUCT_FIELDS = FieldSet(NearbyProduct, "p", {**PRODUCT_EXPRESSIONS, "distance_km": None})
+
+PRODUCT_LIST_QUERY = FilterQuery(
+    "products",
+    """
+        SELECT {columns}
+        FROM products p
+        LEFT JOIN users u ON p.seller_id = u.user_id
+        LEFT JOIN product_categories pc ON p.category_id = pc.category_id
+        WHERE 1=1
+    """,
+    PRODUCT_FILTERS,
+    [("p.created_at", "created_at"), ("p.product_id", "product_id")],
+    literals={"status": "active"},
+    columns=PRODUCT_FIELDS.all.columns,
+)
+
+# BM25 with name matches weighted above description, then location;
+# lower scores are better
+SEARCH_RANK = "bm25(products_fts, 10.0, 3.0, 1.0)"
+
+PRODUCT_SEARCH_QUERY = FilterQuery(
+    "products_search",
+    f"""
+        SELECT {{columns}}, {SEARCH_RANK} as rank
+        FROM products_fts
+        JOIN product_doc_ids d ON d.doc_id = products_fts.rowid
+        JOIN products p ON p.product_id = d.product_id
+        LEFT JOIN users u ON p.seller_id = u.user_id
+        LEFT JOIN product_categories pc ON p.category_id = pc.category_id
+        WHERE products_fts MATCH ?
+    """,
+    PRODUCT_FILTERS,
+    [(SEARCH_RANK, "rank"), ("p.product_id", "product_id")],
+    descending=False,
+    literals={"status": "active"},
+    columns=PRODUCT_FIELDS.all.columns,
+)
+
+# Listings within a radius, nearest first: the R*Tree narrows to the
+# bounding box and the exact distance filters and orders what it returns.
+# Run through geo.fetch_nearest, which supplies the centre, box and radius
+PRODUCT_NEAR_QUERY = FilterQuery(
+    "products_near",
+    """
+        SELECT {columns}, haversine_km(p.latitude, p.longitude, ?, ?) as distance_km
+        FROM products_geo g
+        JOIN product_doc_ids d ON d.doc_id = g.id
+        JOIN products p ON p.product_id = d.product_id
+        LEFT JOIN users u ON p.seller_id = u.user_id
+        LEFT JOIN product_categories pc ON p.category_id = pc.category_id
+        WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+          AND distance_km <= ?
+    """,
+    PRODUCT_FILTERS,
+    [("distance_km", "distance_km"), ("p.product_id", "product_id")],
+    descending=False,
+    literals={"status": "active"},
+    columns=NEARBY_PRODUCT_FIELDS.all.columns,
+)
+
+# Facet counts for the same filters, cached until the next product write
+PRODUCT_FACETS = FacetEngine(PRODUCT_FILTERS, literals={"status": "active"})
+
+# Encoded listing pages by normalized filters and paging, tagged with the
+# category or seller they are filtered by; see _listing_tags
+PRODUCT_LIST_CACHE = TaggedCache("product_listings", max_entries=2048, max_bytes=64 * 1024 * 1024)
+
+# Encoded product details, dropped on writes to the product, its seller or
+# its category
+PRODUCT_CACHE = EntityCache("products")
+
+# Versions a product detail response depends on, including its seller's and
+# category's names, for its ETag; then the seller and category themselves
+PRODUCT_VERSION_SQL = """
+    SELECT p.row_version, u.row_version,
+           (SELECT version FROM table_versions WHERE table_name = 'product_categories'),
+           p.seller_id, p.category_id
+    FROM products p
+    LEFT JOIN users u ON p.seller_id = u.user_id
+    WHERE p.product_id = ?
+"""
+
+# One product with its seller's and category's names, formatted with the selected columns
+PRODUCT_DETAIL_SQL = """
+    SELECT {columns}
+    FROM products p
+    LEFT JOIN users u ON p.seller_id = u.user_id
+    LEFT JOIN product_categories pc ON p.category_id = pc.category_id
+    WHERE p.product_id = ?
+"""
+
+SEARCH_TERM = re.compile(r"\w+")
+
+DESCENDANTS_HELP = "With category_id, also match products in every subcategory below it"
+
+def _category_values(category_id: Optional[str], include_descendants: bool) -> dict:
+    """Category filter values; with descendants, a category that has any binds its whole subtree"""
+    if category_id and include_descendants:
+        subtree = category_tree.subtree(category_id)
+        if len(subtree) > 1:
+            return {"category_id": None, "category_ids": json.dumps(subtree)}
+    return {"category_id": category_id or None, "category_ids": None}
+
+def _listing_tags(values: dict) -> list:
+    """
+    Tags for a listing page. Any product a page can show lies in its category
+    filter, or failing that its seller filter, so those tags suffice;
+    unfiltered pages can show any product.
+    """
+    if values["category_ids"] is not None:
+        return [("category", category_id) for category_id in json.loads(values["category_ids"])]
+    if values["category_id"] is not None:
+        return [("category", values["category_id"])]
+    if values["seller_id"] is not None:
+        return [("seller", values["seller_id"])]
+    return [("all",)]
+
+def _product_tags(*products) -> list:
+    """Tags of listing pages that can show these products, e.g. before and after an update"""
+    tags = [("all",)]
+    for seller_id, category_id in products:
+        tags += [("seller", seller_id), ("category", category_id)]
+    return tags
+
+def _match_expression(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching every word, the last as a prefix"""
+    terms = SEARCH_TERM.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
 @router.post("/", response_model=Product)
 async def create_product(product: ProductCreate):
     """Create a new product"""
     product_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
+        images = await check_image_ids(db, product.images)
         try:
             await db.execute("""
                 INSERT INTO products (
                     product_id, seller_id, category_id, name, description, price, quantity_available,
-                    unit, images, location, harvest_date, expiry_date, is_organic, status, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    unit, images, location, latitude, longitude, harvest_date, expiry_date, is_organic, status,
+                    created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 product_id, product.seller_id, product.category_id, product.name, product.description,
-                product.price, product.quantity_available, product.unit, product.images,
-                product.location, product.harvest_date, product.expiry_date, product.is_organic,
+                product.price, product.quantity_available, product.unit, images,
+                product.location, product.latitude, product.longitude, product.harvest_date,
+                product.expiry_date, product.is_organic,
                 'active', now, now
             ))
             await db.commit()
@@ -33,108 +210,181 @@ async def create_product(product: ProductCreate):
             cursor = await db.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
             row = await cursor.fetchone()
             if row:
-                return Product(
-                    product_id=row[0], seller_id=row[1], category_id=row[2], name=row[3],
-                    description=row[4], price=row[5], quantity_available=row[6], unit=row[7],
-                    images=row[8], location=row[9], harvest_date=row[10], expiry_date=row[11],
-                    is_organic=bool(row[12]), status=row[13], created_at=row[14], updated_at=row[15]
-                )
+                fuzzy_index.put("product", product_id, product.name)
+                suggest_index.put_product(product_id, product.name, product.category_id, product.seller_id)
+                PRODUCT_FACETS.invalidate()
+                PRODUCT_LIST_CACHE.invalidate(_product_tags((product.seller_id, product.category_id)))
+                return product_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating product: {str(e)}")
 
 @router.get("/", response_model=List[ProductWithDetails])
 async def get_products(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
     category_id: Optional[str] = None,
+    include_descendants: bool = Query(False, description=DESCENDANTS_HELP),
     seller_id: Optional[str] = None,
     status: Optional[str] = None,
     is_organic: Optional[bool] = None,
     min_price: Optional[float] = None,
-    max_price: Optional[float] = None
+    max_price: Optional[float] = None,
+    near: Optional[str] = Query(None, description="'latitude,longitude'; only listings within radius_km, nearest first"),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
 ):
-    """Get all products with optional filtering"""
-    query = """
-        SELECT p.*, u.full_name as seller_name, pc.name as category_name
-        FROM products p
-        LEFT JOIN users u ON p.seller_id = u.user_id
-        LEFT JOIN product_categories pc ON p.category_id = pc.category_id
-        WHERE 1=1
     """
-    params = []
-    
-    if category_id:
-        query += " AND p.category_id = ?"
-        params.append(category_id)
-    
-    if seller_id:
-        query += " AND p.seller_id = ?"
-        params.append(seller_id)
-    
-    if status:
-        query += " AND p.status = ?"
-        params.append(status)
-    
-    if is_organic is not None:
-        query += " AND p.is_organic = ?"
-        params.append(is_organic)
-    
-    if min_price is not None:
-        query += " AND p.price >= ?"
-        params.append(min_price)
-    
-    if max_price is not None:
-        query += " AND p.price <= ?"
-        params.append(max_price)
+    Get all products with optional filtering, by offset or keyset cursor;
+    nearest first when near is given. Pages without near are cached until a
+    product they could show is written
+    """
+    values = {
+        **_category_values(category_id, include_descendants),
+        "seller_id": seller_id or None,
+        "status": status or None,
+        "is_organic": is_organic,
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+    async with await db_manager.get_read_connection() as db:
+        if near:
+            selection = NEARBY_PRODUCT_FIELDS.select(fields, PRODUCT_NEAR_QUERY.key_columns)
+            cursor, rows = await fetch_nearest(
+                db, PRODUCT_NEAR_QUERY, values, near, radius_km, limit, skip, after, before, selection.columns
+            )
+            rows, headers = PRODUCT_NEAR_QUERY.paginate(cursor, rows, limit, skip, after, before)
+            return selection.encode_rows(cursor, rows, headers)
+        
+        selection = PRODUCT_FIELDS.select(fields, PRODUCT_LIST_QUERY.key_columns)
+        key = (
+            tuple((name, value) for name, value in values.items() if value is not None),
+            limit, skip, after, before, selection.fields
+        )
+        cached = PRODUCT_LIST_CACHE.get(key)
+        if cached is not None:
+            return cached.respond(request)
+        
+        generation = PRODUCT_LIST_CACHE.generation
+        query, params = PRODUCT_LIST_QUERY.build(values, limit, skip, after, before, columns=selection.columns)
+        cursor = await db.execute(query, params)
+        rows, headers = PRODUCT_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
+        
+        response = selection.encode_rows(cursor, rows, headers)
+        PRODUCT_LIST_CACHE.put(key, response, generation, _listing_tags(values), headers)
+        return response
+
+@router.get("/search", response_model=List[ProductWithDetails])
+async def search_products(
+    q: str = Query(..., min_length=1, description="Words to find in product names, descriptions and locations"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
+    category_id: Optional[str] = None,
+    include_descendants: bool = Query(False, description=DESCENDANTS_HELP),
+    seller_id: Optional[str] = None,
+    status: Optional[str] = None,
+    is_organic: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
+):
+    """Search products by relevance with optional filtering, by offset or keyset cursor"""
+    selection = PRODUCT_FIELDS.select(fields, PRODUCT_SEARCH_QUERY.key_columns)
+    match = _match_expression(q)
+    if match is None:
+        return encode_list(ProductWithDetails, [])
     
-    query += " ORDER BY p.created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, skip])
+    query, params = PRODUCT_SEARCH_QUERY.build({
+        **_category_values(category_id, include_descendants),
+        "seller_id": seller_id or None,
+        "status": status or None,
+        "is_organic": is_organic,
+        "min_price": min_price,
+        "max_price": max_price,
+    }, limit, skip, after, before, base_params=(match,), columns=selection.columns)
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+        rows, headers = PRODUCT_SEARCH_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            ProductWithDetails(
-                product_id=row[0], seller_id=row[1], category_id=row[2], name=row[3],
-                description=row[4], price=row[5], quantity_available=row[6], unit=row[7],
-                images=row[8], location=row[9], harvest_date=row[10], expiry_date=row[11],
-                is_organic=bool(row[12]), status=row[13], created_at=row[14], updated_at=row[15],
-                seller_name=row[16], category_name=row[17]
-            ) for row in rows
-        ]
+        return selection.encode_rows(cursor, rows, headers)
+
+@router.get("/facets", response_model=ProductFacets)
+async def get_product_facets(
+    category_id: Optional[str] = None,
+    include_descendants: bool = Query(False, description=DESCENDANTS_HELP),
+    seller_id: Optional[str] = None,
+    status: Optional[str] = None,
+    is_organic: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """Counts per category, organic flag, price bucket and location for a product filter set"""
+    async with await db_manager.get_read_connection() as db:
+        return await PRODUCT_FACETS.get(db, {
+            **_category_values(category_id, include_descendants),
+            "seller_id": seller_id or None,
+            "status": status or None,
+            "is_organic": is_organic,
+            "min_price": min_price,
+            "max_price": max_price,
+        })
+
+@router.get("/fuzzy", response_model=List[FuzzyMatch])
+async def fuzzy_search(
+    q: str = Query(..., min_length=1, description="Product or category name, possibly misspelled"),
+    limit: int = Query(20, ge=1, le=100),
+    min_score: float = Query(DEFAULT_THRESHOLD, gt=0, le=1, description="Minimum trigram similarity"),
+    include_categories: bool = True
+):
+    """Typo-tolerant matches on active product and category names, best first"""
+    kinds = {"product", "category"} if include_categories else {"product"}
+    return fuzzy_index.search(q, limit, min_score, kinds)
 
 @router.get("/{product_id}", response_model=ProductWithDetails)
-async def get_product(product_id: str):
-    """Get a specific product by ID"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("""
-            SELECT p.*, u.full_name as seller_name, pc.name as category_name
-            FROM products p
-            LEFT JOIN users u ON p.seller_id = u.user_id
-            LEFT JOIN product_categories pc ON p.category_id = pc.category_id
-            WHERE p.product_id = ?
-        """, (product_id,))
+async def get_product(product_id: str, request: Request, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
+    """Get a specific product by ID, from cache when unchanged; If-None-Match answers 304"""
+    selection = PRODUCT_FIELDS.select(fields, ("product_id",))
+    cached = PRODUCT_CACHE.get(product_id, selection.fields)
+    if cached is not None:
+        return cached.respond(request)
+    
+    generation = PRODUCT_CACHE.generation
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(PRODUCT_VERSION_SQL, (product_id,))
+        versions = await cursor.fetchone()
+        if not versions:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product_version, seller_version, categories_version, seller_id, category_id = versions
+        etag = entity_tag("product", product_version, seller_version, categories_version, *selection.tag_parts)
+        if matches(request, etag):
+            return not_modified(etag)
+        
+        cursor = await db.execute(PRODUCT_DETAIL_SQL.format(columns=selection.columns), (product_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        return ProductWithDetails(
-            product_id=row[0], seller_id=row[1], category_id=row[2], name=row[3],
-            description=row[4], price=row[5], quantity_available=row[6], unit=row[7],
-            images=row[8], location=row[9], harvest_date=row[10], expiry_date=row[11],
-            is_organic=bool(row[12]), status=row[13], created_at=row[14], updated_at=row[15],
-            seller_name=row[16], category_name=row[17]
+        response = tagged(selection.encode_row(cursor, row), etag)
+        PRODUCT_CACHE.put(
+            product_id, selection.fields, response, generation,
+            depends_on=[("user", seller_id), ("category", category_id)]
         )
+        return response
 
 @router.put("/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_update: ProductUpdate):
     """Update a product"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if product exists
-        cursor = await db.execute("SELECT product_id FROM products WHERE product_id = ?", (product_id,))
-        if not await cursor.fetchone():
+        cursor = await db.execute("SELECT seller_id, category_id FROM products WHERE product_id = ?", (product_id,))
+        previous = await cursor.fetchone()
+        if not previous:
             raise HTTPException(status_code=404, detail="Product not found")
         
         # Build update query
@@ -143,6 +393,8 @@ async def update_product(product_id: str, product_update: ProductUpdate):
         
         for field, value in product_update.dict(exclude_unset=True).items():
             if value is not None:
+                if field == "images":
+                    value = await check_image_ids(db, value)
                 update_fields.append(f"{field} = ?")
                 params.append(value)
         
@@ -162,25 +414,36 @@ async def update_product(product_id: str, product_update: ProductUpdate):
             # Return updated product
             cursor = await db.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
             row = await cursor.fetchone()
-            return Product(
-                product_id=row[0], seller_id=row[1], category_id=row[2], name=row[3],
-                description=row[4], price=row[5], quantity_available=row[6], unit=row[7],
-                images=row[8], location=row[9], harvest_date=row[10], expiry_date=row[11],
-                is_organic=bool(row[12]), status=row[13], created_at=row[14], updated_at=row[15]
-            )
+            updated = product_mapper.from_row(cursor, row)
+            PRODUCT_FACETS.invalidate()
+            PRODUCT_CACHE.invalidate(product_id)
+            PRODUCT_LIST_CACHE.invalidate(_product_tags(tuple(previous), (updated.seller_id, updated.category_id)))
+            if updated.status == ProductStatus.ACTIVE:
+                fuzzy_index.put("product", product_id, updated.name)
+                suggest_index.put_product(product_id, updated.name, updated.category_id, updated.seller_id)
+            else:
+                fuzzy_index.remove("product", product_id)
+                suggest_index.remove_product(product_id)
+            return updated
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating product: {str(e)}")
 
 @router.delete("/{product_id}")
 async def delete_product(product_id: str):
     """Delete a product (soft delete by setting status to inactive)"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("SELECT product_id FROM products WHERE product_id = ?", (product_id,))
-        if not await cursor.fetchone():
+    async with await db_manager.get_write_connection() as db:
+        cursor = await db.execute("SELECT seller_id, category_id FROM products WHERE product_id = ?", (product_id,))
+        previous = await cursor.fetchone()
+        if not previous:
             raise HTTPException(status_code=404, detail="Product not found")
         
         await db.execute("UPDATE products SET status = ?, updated_at = ? WHERE product_id = ?", 
                         ('inactive', datetime.utcnow(), product_id))
         await db.commit()
+        fuzzy_index.remove("product", product_id)
+        suggest_index.remove_product(product_id)
+        PRODUCT_FACETS.invalidate()
+        PRODUCT_CACHE.invalidate(product_id)
+        PRODUCT_LIST_CACHE.invalidate(_product_tags(tuple(previous)))
         
         return {"message": "Product deleted successfully"}
\ No newline at end of file
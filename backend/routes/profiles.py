@@ -1,19 +1,30 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 import uuid
 from datetime import datetime
 
+from cache import EntityCache
 from database import db_manager
-from models import Profile, ProfileCreate, ProfileUpdate
+from models import Profile, ProfileCreate, ProfileUpdate, profile_mapper
+from routes.users import PROFILE_BY_USER_SQL, USER_CACHE
+from serialization import encode_item
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
+# Encoded profiles by user ID, dropped on writes to the profile
+PROFILE_CACHE = EntityCache("profiles")
+
+def _profile_written(user_id: str):
+    """Drop cached copies of a profile, including the one in its user's details"""
+    PROFILE_CACHE.invalidate(user_id)
+    USER_CACHE.invalidate(user_id)
+
 @router.post("/", response_model=Profile)
 async def create_profile(profile: ProfileCreate):
     """Create a new user profile"""
     profile_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         try:
             await db.execute("""
                 INSERT INTO profiles (
@@ -31,53 +42,46 @@ async def create_profile(profile: ProfileCreate):
             cursor = await db.execute("SELECT * FROM profiles WHERE profile_id = ?", (profile_id,))
             row = await cursor.fetchone()
             if row:
-                return Profile(
-                    profile_id=row[0], user_id=row[1], bio=row[2], avatar_url=row[3],
-                    address=row[4], city=row[5], state=row[6], country=row[7],
-                    postal_code=row[8], date_of_birth=row[9], gender=row[10],
-                    occupation=row[11], created_at=row[12], updated_at=row[13]
-                )
+                _profile_written(profile.user_id)
+                return profile_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating profile: {str(e)}")
 
 @router.get("/{user_id}", response_model=Profile)
-async def get_profile_by_user_id(user_id: str):
-    """Get user profile by user ID"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
+async def get_profile_by_user_id(user_id: str, request: Request):
+    """Get user profile by user ID, from cache when unchanged"""
+    cached = PROFILE_CACHE.get(user_id)
+    if cached is not None:
+        return cached.respond(request)
+    
+    generation = PROFILE_CACHE.generation
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(PROFILE_BY_USER_SQL, (user_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Profile not found")
         
-        return Profile(
-            profile_id=row[0], user_id=row[1], bio=row[2], avatar_url=row[3],
-            address=row[4], city=row[5], state=row[6], country=row[7],
-            postal_code=row[8], date_of_birth=row[9], gender=row[10],
-            occupation=row[11], created_at=row[12], updated_at=row[13]
-        )
+        response = encode_item(Profile, profile_mapper.from_row(cursor, row))
+        PROFILE_CACHE.put(user_id, (), response, generation)
+        return response
 
 @router.get("/profile/{profile_id}", response_model=Profile)
 async def get_profile_by_profile_id(profile_id: str):
     """Get profile by profile ID"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute("SELECT * FROM profiles WHERE profile_id = ?", (profile_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Profile not found")
         
-        return Profile(
-            profile_id=row[0], user_id=row[1], bio=row[2], avatar_url=row[3],
-            address=row[4], city=row[5], state=row[6], country=row[7],
-            postal_code=row[8], date_of_birth=row[9], gender=row[10],
-            occupation=row[11], created_at=row[12], updated_at=row[13]
-        )
+        return profile_mapper.from_row(cursor, row)
 
 @router.put("/{user_id}", response_model=Profile)
 async def update_profile(user_id: str, profile_update: ProfileUpdate):
     """Update a user profile"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if profile exists
         cursor = await db.execute("SELECT profile_id FROM profiles WHERE user_id = ?", (user_id,))
         if not await cursor.fetchone():
@@ -106,26 +110,23 @@ async def update_profile(user_id: str, profile_update: ProfileUpdate):
             await db.commit()
             
             # Return updated profile
-            cursor = await db.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
+            cursor = await db.execute(PROFILE_BY_USER_SQL, (user_id,))
             row = await cursor.fetchone()
-            return Profile(
-                profile_id=row[0], user_id=row[1], bio=row[2], avatar_url=row[3],
-                address=row[4], city=row[5], state=row[6], country=row[7],
-                postal_code=row[8], date_of_birth=row[9], gender=row[10],
-                occupation=row[11], created_at=row[12], updated_at=row[13]
-            )
+            _profile_written(user_id)
+            return profile_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating profile: {str(e)}")
 
 @router.delete("/{user_id}")
 async def delete_profile(user_id: str):
     """Delete a user profile"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         cursor = await db.execute("SELECT profile_id FROM profiles WHERE user_id = ?", (user_id,))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="Profile not found")
         
         await db.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
         await db.commit()
+        _profile_written(user_id)
         
         return {"message": "Profile deleted successfully"}
\ No newline at end of file
@@ -4,17 +4,38 @@ import uuid
 from datetime import datetime
 
 from database import db_manager
-from models import Review, ReviewCreate, ReviewUpdate
+from fieldsets import FIELDS_HELP, FieldSet
+from models import Review, ReviewCreate, ReviewUpdate, review_mapper
+from query_builder import FilterQuery
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
+# Response fields, for ?fields=
+REVIEW_FIELDS = FieldSet(Review)
+
+REVIEW_LIST_QUERY = FilterQuery(
+    "reviews",
+    "SELECT {columns} FROM reviews WHERE 1=1",
+    {
+        "reviewer_id": "reviewer_id = ?",
+        "reviewed_user_id": "reviewed_user_id = ?",
+        "product_id": "product_id = ?",
+        "order_id": "order_id = ?",
+        "min_rating": "rating >= ?",
+        "max_rating": "rating <= ?",
+        "is_verified": "is_verified = ?",
+    },
+    [("created_at", "created_at"), ("review_id", "review_id")],
+    columns=REVIEW_FIELDS.all.columns,
+)
+
 @router.post("/", response_model=Review)
 async def create_review(review: ReviewCreate):
     """Create a new review"""
     review_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         try:
             await db.execute("""
                 INSERT INTO reviews (
@@ -31,11 +52,7 @@ async def create_review(review: ReviewCreate):
             cursor = await db.execute("SELECT * FROM reviews WHERE review_id = ?", (review_id,))
             row = await cursor.fetchone()
             if row:
-                return Review(
-                    review_id=row[0], reviewer_id=row[1], reviewed_user_id=row[2],
-                    product_id=row[3], order_id=row[4], rating=row[5],
-                    comment=row[6], created_at=row[7], is_verified=bool(row[8])
-                )
+                return review_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating review: {str(e)}")
 
@@ -43,81 +60,52 @@ async def create_review(review: ReviewCreate):
 async def get_reviews(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
     reviewer_id: Optional[str] = None,
     reviewed_user_id: Optional[str] = None,
     product_id: Optional[str] = None,
     order_id: Optional[str] = None,
     min_rating: Optional[int] = Query(None, ge=1, le=5),
     max_rating: Optional[int] = Query(None, ge=1, le=5),
-    is_verified: Optional[bool] = None
+    is_verified: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
 ):
-    """Get all reviews with optional filtering"""
-    query = "SELECT * FROM reviews WHERE 1=1"
-    params = []
-    
-    if reviewer_id:
-        query += " AND reviewer_id = ?"
-        params.append(reviewer_id)
-    
-    if reviewed_user_id:
-        query += " AND reviewed_user_id = ?"
-        params.append(reviewed_user_id)
-    
-    if product_id:
-        query += " AND product_id = ?"
-        params.append(product_id)
-    
-    if order_id:
-        query += " AND order_id = ?"
-        params.append(order_id)
-    
-    if min_rating is not None:
-        query += " AND rating >= ?"
-        params.append(min_rating)
-    
-    if max_rating is not None:
-        query += " AND rating <= ?"
-        params.append(max_rating)
-    
-    if is_verified is not None:
-        query += " AND is_verified = ?"
-        params.append(is_verified)
-    
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, skip])
+    """Get all reviews with optional filtering, by offset or keyset cursor"""
+    selection = REVIEW_FIELDS.select(fields, REVIEW_LIST_QUERY.key_columns)
+    query, params = REVIEW_LIST_QUERY.build({
+        "reviewer_id": reviewer_id or None,
+        "reviewed_user_id": reviewed_user_id or None,
+        "product_id": product_id or None,
+        "order_id": order_id or None,
+        "min_rating": min_rating,
+        "max_rating": max_rating,
+        "is_verified": is_verified,
+    }, limit, skip, after, before, columns=selection.columns)
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+        rows, headers = REVIEW_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            Review(
-                review_id=row[0], reviewer_id=row[1], reviewed_user_id=row[2],
-                product_id=row[3], order_id=row[4], rating=row[5],
-                comment=row[6], created_at=row[7], is_verified=bool(row[8])
-            ) for row in rows
-        ]
+        return selection.encode_rows(cursor, rows, headers)
 
 @router.get("/{review_id}", response_model=Review)
-async def get_review(review_id: str):
+async def get_review(review_id: str, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """Get a specific review by ID"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("SELECT * FROM reviews WHERE review_id = ?", (review_id,))
+    selection = REVIEW_FIELDS.select(fields, ("review_id",))
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(f"SELECT {selection.columns} FROM reviews WHERE review_id = ?", (review_id,))
         row = await cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Review not found")
         
-        return Review(
-            review_id=row[0], reviewer_id=row[1], reviewed_user_id=row[2],
-            product_id=row[3], order_id=row[4], rating=row[5],
-            comment=row[6], created_at=row[7], is_verified=bool(row[8])
-        )
+        return selection.encode_row(cursor, row)
 
 @router.put("/{review_id}", response_model=Review)
 async def update_review(review_id: str, review_update: ReviewUpdate):
     """Update a review"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if review exists
         cursor = await db.execute("SELECT review_id FROM reviews WHERE review_id = ?", (review_id,))
         if not await cursor.fetchone():
@@ -145,18 +133,14 @@ async def update_review(review_id: str, review_update: ReviewUpdate):
             # Return updated review
             cursor = await db.execute("SELECT * FROM reviews WHERE review_id = ?", (review_id,))
             row = await cursor.fetchone()
-            return Review(
-                review_id=row[0], reviewer_id=row[1], reviewed_user_id=row[2],
-                product_id=row[3], order_id=row[4], rating=row[5],
-                comment=row[6], created_at=row[7], is_verified=bool(row[8])
-            )
+            return review_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating review: {str(e)}")
 
 @router.delete("/{review_id}")
 async def delete_review(review_id: str):
     """Delete a review"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         cursor = await db.execute("SELECT review_id FROM reviews WHERE review_id = ?", (review_id,))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="Review not found")
@@ -166,22 +150,17 @@ async def delete_review(review_id: str):
         
         return {"message": "Review deleted successfully"}
 
-@router.get("/stats/product/{product_id}")
-async def get_product_review_stats(product_id: str):
-    """Get review statistics for a product"""
-    async with await db_manager.get_connection() as db:
-        cursor = await db.execute("""
-            SELECT 
-                COUNT(*) as total_reviews,
-                AVG(rating) as average_rating,
-                COUNT(CASE WHEN rating = 5 THEN 1 END) as five_star,
-                COUNT(CASE WHEN rating = 4 THEN 1 END) as four_star,
-                COUNT(CASE WHEN rating = 3 THEN 1 END) as three_star,
-                COUNT(CASE WHEN rating = 2 THEN 1 END) as two_star,
-                COUNT(CASE WHEN rating = 1 THEN 1 END) as one_star
-            FROM reviews 
-            WHERE product_id = ?
-        """, (product_id,))
+# Maintained statistics of one product or reviewed user
+REVIEW_STATS_SQL = """
+    SELECT total_reviews, rating_sum, five_star, four_star, three_star, two_star, one_star
+    FROM review_stats
+    WHERE subject_type = ? AND subject_id = ?
+"""
+
+async def _get_review_stats(subject_type: str, subject_id: str):
+    """Read the maintained review statistics for a product or reviewed user"""
+    async with await db_manager.get_read_connection() as db:
+        cursor = await db.execute(REVIEW_STATS_SQL, (subject_type, subject_id))
         row = await cursor.fetchone()
         
         if not row or row[0] == 0:
@@ -197,10 +176,20 @@ async def get_product_review_stats(product_id: str):
         
         return {
             "total_reviews": row[0],
-            "average_rating": round(row[1], 2) if row[1] else 0,
+            "average_rating": round(row[1] / row[0], 2),
             "five_star": row[2],
             "four_star": row[3],
             "three_star": row[4],
             "two_star": row[5],
             "one_star": row[6]
-        }
\ No newline at end of file
+        }
+
+@router.get("/stats/product/{product_id}")
+async def get_product_review_stats(product_id: str):
+    """Get review statistics for a product"""
+    return await _get_review_stats("product", product_id)
+
+@router.get("/stats/user/{user_id}")
+async def get_user_review_stats(user_id: str):
+    """Get review statistics for a reviewed user, such as a seller"""
+    return await _get_review_stats("user", user_id)
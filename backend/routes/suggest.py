@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+
+from models import Suggestion
+from suggest_index import suggest_index
+
+router = APIRouter(prefix="/suggest", tags=["suggest"])
+
+SUGGESTION_KINDS = {"product", "category", "farmer"}
+
+@router.get("", response_model=List[Suggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, description="What has been typed so far"),
+    limit: int = Query(10, ge=1, le=50),
+    kind: Optional[List[str]] = Query(None, description="Restrict to product, category and/or farmer")
+):
+    """Autocomplete suggestions for the search box, most popular first"""
+    kinds = set(kind) if kind else None
+    if kinds and not kinds <= SUGGESTION_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(sorted(SUGGESTION_KINDS))}")
+    return suggest_index.suggest(q, limit, kinds)
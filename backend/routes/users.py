@@ -1,35 +1,92 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
+from cache import EntityCache
 from database import db_manager
-from models import User, UserCreate, UserUpdate, UserWithProfile, Profile
+from etags import entity_tag, matches, not_modified, tagged
+from fieldsets import FIELDS_HELP, FieldSet
+from geo import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, fetch_nearest
+from suggest_index import suggest_index
+from models import (
+    NearbyUser, User, UserCreate, UserType, UserUpdate, UserWithProfile,
+    user_mapper, profile_mapper,
+)
+from query_builder import FilterQuery
+from routes.products import PRODUCT_CACHE, PRODUCT_LIST_CACHE
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Response fields, for ?fields=; a user's profile is read separately
+USER_FIELDS = FieldSet(User)
+NEARBY_USER_FIELDS = FieldSet(NearbyUser, "u", {"distance_km": None})
+USER_DETAIL_FIELDS = FieldSet(UserWithProfile, "", {"profile": None})
+
+# Encoded user details with profile, dropped on writes to the user or profile
+USER_CACHE = EntityCache("users")
+
+# A user's version for its ETag, then the user with the selected columns and its profile
+USER_VERSION_SQL = "SELECT row_version FROM users WHERE user_id = ?"
+USER_DETAIL_SQL = "SELECT {columns} FROM users WHERE user_id = ?"
+PROFILE_BY_USER_SQL = "SELECT * FROM profiles WHERE user_id = ?"
+
+USER_LIST_QUERY = FilterQuery(
+    "users",
+    "SELECT {columns} FROM users WHERE 1=1",
+    {
+        "user_type": "user_type = ?",
+        "is_active": "is_active = ?",
+    },
+    [("created_at", "created_at"), ("user_id", "user_id")],
+    literals={"is_active": True},
+    columns=USER_FIELDS.all.columns,
+)
+
+# Active farmers within a radius, nearest first; run through
+# geo.fetch_nearest like products.PRODUCT_NEAR_QUERY
+FARMER_NEAR_QUERY = FilterQuery(
+    "farmers_near",
+    """
+        SELECT {columns}, haversine_km(u.latitude, u.longitude, ?, ?) as distance_km
+        FROM users_geo g
+        JOIN user_doc_ids d ON d.doc_id = g.id
+        JOIN users u ON u.user_id = d.user_id
+        WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+          AND distance_km <= ? AND u.user_type = 'farmer' AND u.is_active = 1
+    """,
+    {},
+    [("distance_km", "distance_km"), ("u.user_id", "user_id")],
+    descending=False,
+    columns=NEARBY_USER_FIELDS.all.columns,
+)
+
 @router.post("/", response_model=User)
 async def create_user(user: UserCreate):
     """Create a new user"""
     user_id = str(uuid.uuid4())
     now = datetime.utcnow()
     
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         try:
             await db.execute("""
-                INSERT INTO users (user_id, user_type, full_name, email, phone_number, location, created_at, updated_at, is_active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, user.user_type, user.full_name, user.email, user.phone_number, user.location, now, now, True))
+                INSERT INTO users (
+                    user_id, user_type, full_name, email, phone_number, location, latitude, longitude,
+                    created_at, updated_at, is_active
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                user_id, user.user_type, user.full_name, user.email, user.phone_number, user.location,
+                user.latitude, user.longitude, now, now, True
+            ))
             await db.commit()
             
             # Return the created user
             cursor = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
             row = await cursor.fetchone()
             if row:
-                return User(
-                    user_id=row[0], user_type=row[1], full_name=row[2], email=row[3],
-                    phone_number=row[4], location=row[5], created_at=row[6], updated_at=row[7], is_active=bool(row[8])
-                )
+                if user.user_type == UserType.FARMER:
+                    suggest_index.put_farmer(user_id, user.full_name)
+                return user_mapper.from_row(cursor, row)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error creating user: {str(e)}")
 
@@ -37,71 +94,101 @@ async def create_user(user: UserCreate):
 async def get_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
     user_type: Optional[str] = None,
-    is_active: Optional[bool] = None
+    is_active: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
 ):
-    """Get all users with optional filtering"""
-    query = "SELECT * FROM users WHERE 1=1"
-    params = []
-    
-    if user_type:
-        query += " AND user_type = ?"
-        params.append(user_type)
-    
-    if is_active is not None:
-        query += " AND is_active = ?"
-        params.append(is_active)
+    """Get all users with optional filtering, by offset or keyset cursor"""
+    selection = USER_FIELDS.select(fields, USER_LIST_QUERY.key_columns)
+    query, params = USER_LIST_QUERY.build({
+        "user_type": user_type or None,
+        "is_active": is_active,
+    }, limit, skip, after, before, columns=selection.columns)
     
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, skip])
-    
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+        rows, headers = USER_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
         
-        return [
-            User(
-                user_id=row[0], user_type=row[1], full_name=row[2], email=row[3],
-                phone_number=row[4], location=row[5], created_at=row[6], updated_at=row[7], is_active=bool(row[8])
-            ) for row in rows
-        ]
+        return selection.encode_rows(cursor, rows, headers)
+
+@router.get("/farmers", response_model=List[NearbyUser])
+async def get_farmers(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor; returns the following page"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor; returns the preceding page"),
+    near: Optional[str] = Query(None, description="'latitude,longitude'; only farmers within radius_km, nearest first"),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
+):
+    """Farmer directory: active farmers, nearest first when a location is given"""
+    async with await db_manager.get_read_connection() as db:
+        if near:
+            selection = NEARBY_USER_FIELDS.select(fields, FARMER_NEAR_QUERY.key_columns)
+            cursor, rows = await fetch_nearest(
+                db, FARMER_NEAR_QUERY, {}, near, radius_km, limit, skip, after, before, selection.columns
+            )
+            rows, headers = FARMER_NEAR_QUERY.paginate(cursor, rows, limit, skip, after, before)
+            return selection.encode_rows(cursor, rows, headers)
+        
+        selection = USER_FIELDS.select(fields, USER_LIST_QUERY.key_columns)
+        query, params = USER_LIST_QUERY.build(
+            {"user_type": UserType.FARMER.value, "is_active": True}, limit, skip, after, before,
+            columns=selection.columns
+        )
+        cursor = await db.execute(query, params)
+        rows, headers = USER_LIST_QUERY.paginate(cursor, await cursor.fetchall(), limit, skip, after, before)
+        
+        return selection.encode_rows(cursor, rows, headers)
 
 @router.get("/{user_id}", response_model=UserWithProfile)
-async def get_user(user_id: str):
-    """Get a specific user by ID with profile"""
-    async with await db_manager.get_connection() as db:
+async def get_user(user_id: str, request: Request, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
+    """Get a specific user by ID with profile, from cache when unchanged; If-None-Match answers 304"""
+    selection = USER_DETAIL_FIELDS.select(fields, ("user_id",))
+    cached = USER_CACHE.get(user_id, selection.fields)
+    if cached is not None:
+        return cached.respond(request)
+    
+    generation = USER_CACHE.generation
+    async with await db_manager.get_read_connection() as db:
+        # Profile writes bump the user's row_version too
+        cursor = await db.execute(USER_VERSION_SQL, (user_id,))
+        version = await cursor.fetchone()
+        if not version:
+            raise HTTPException(status_code=404, detail="User not found")
+        etag = entity_tag("user", version[0], *selection.tag_parts)
+        if matches(request, etag):
+            return not_modified(etag)
+        
         # Get user
-        cursor = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user_row = await cursor.fetchone()
+        user_cursor = await db.execute(USER_DETAIL_SQL.format(columns=selection.columns), (user_id,))
+        user_row = await user_cursor.fetchone()
         
         if not user_row:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get profile
-        cursor = await db.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
-        profile_row = await cursor.fetchone()
-        
-        user = User(
-            user_id=user_row[0], user_type=user_row[1], full_name=user_row[2], email=user_row[3],
-            phone_number=user_row[4], location=user_row[5], created_at=user_row[6], updated_at=user_row[7], is_active=bool(user_row[8])
-        )
-        
-        profile = None
-        if profile_row:
-            profile = Profile(
-                profile_id=profile_row[0], user_id=profile_row[1], bio=profile_row[2],
-                avatar_url=profile_row[3], address=profile_row[4], city=profile_row[5],
-                state=profile_row[6], country=profile_row[7], postal_code=profile_row[8],
-                date_of_birth=profile_row[9], gender=profile_row[10], occupation=profile_row[11],
-                created_at=profile_row[12], updated_at=profile_row[13]
-            )
+        if not selection.wants("profile"):
+            response = tagged(selection.encode_row(user_cursor, user_row), etag)
+        else:
+            # Get profile
+            cursor = await db.execute(PROFILE_BY_USER_SQL, (user_id,))
+            profile_row = await cursor.fetchone()
+            
+            profile = None
+            if profile_row:
+                profile = profile_mapper.from_row(cursor, profile_row)
+            
+            response = tagged(selection.encode_row(user_cursor, user_row, profile=profile), etag)
         
-        return UserWithProfile(**user.dict(), profile=profile)
+        USER_CACHE.put(user_id, selection.fields, response, generation)
+        return response
 
 @router.put("/{user_id}", response_model=User)
 async def update_user(user_id: str, user_update: UserUpdate):
     """Update a user"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         # Check if user exists
         cursor = await db.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
         if not await cursor.fetchone():
@@ -123,6 +210,12 @@ async def update_user(user_id: str, user_update: UserUpdate):
         if user_update.location is not None:
             update_fields.append("location = ?")
             params.append(user_update.location)
+        if user_update.latitude is not None:
+            update_fields.append("latitude = ?")
+            params.append(user_update.latitude)
+        if user_update.longitude is not None:
+            update_fields.append("longitude = ?")
+            params.append(user_update.longitude)
         if user_update.is_active is not None:
             update_fields.append("is_active = ?")
             params.append(user_update.is_active)
@@ -143,17 +236,25 @@ async def update_user(user_id: str, user_update: UserUpdate):
             # Return updated user
             cursor = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
             row = await cursor.fetchone()
-            return User(
-                user_id=row[0], user_type=row[1], full_name=row[2], email=row[3],
-                phone_number=row[4], location=row[5], created_at=row[6], updated_at=row[7], is_active=bool(row[8])
-            )
+            updated = user_mapper.from_row(cursor, row)
+            USER_CACHE.invalidate(user_id)
+            # Product details show the seller's name
+            PRODUCT_CACHE.invalidate_dependents("user", user_id)
+            if user_update.full_name is not None:
+                # So do listing pages of any filter
+                PRODUCT_LIST_CACHE.clear()
+            if updated.user_type == UserType.FARMER and updated.is_active:
+                suggest_index.put_farmer(user_id, updated.full_name)
+            else:
+                suggest_index.remove_farmer(user_id)
+            return updated
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error updating user: {str(e)}")
 
 @router.delete("/{user_id}")
 async def delete_user(user_id: str):
     """Delete a user (soft delete by setting is_active to False)"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_write_connection() as db:
         cursor = await db.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="User not found")
@@ -161,5 +262,8 @@ async def delete_user(user_id: str):
         await db.execute("UPDATE users SET is_active = ?, updated_at = ? WHERE user_id = ?", 
                         (False, datetime.utcnow(), user_id))
         await db.commit()
+        suggest_index.remove_farmer(user_id)
+        USER_CACHE.invalidate(user_id)
+        PRODUCT_CACHE.invalidate_dependents("user", user_id)
         
         return {"message": "User deleted successfully"}
\ No newline at end of file
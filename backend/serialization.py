@@ -0,0 +1,41 @@
+"""
+Fast-path JSON encoding for list endpoints.
+
+Rows built by the mappers in models.py come from our own database and are
+already trusted. Returning them through `response_model` makes FastAPI
+validate every row a second time (including EmailStr checks) before encoding.
+Endpoints that opt in return `encode_list(...)` instead: a TypeAdapter
+compiled once per model serializes the rows straight to JSON bytes in
+pydantic-core, and the Response bypasses the second validation pass.
+`response_model` stays on the route so the OpenAPI schema is unchanged.
+"""
+
+from typing import Dict, List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+_adapters: Dict[type, TypeAdapter] = {}
+_item_adapters: Dict[type, TypeAdapter] = {}
+
+def _list_adapter(model) -> TypeAdapter:
+    """Get the compiled List[model] adapter"""
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(List[model])
+    return adapter
+
+def json_response(content: bytes, headers: dict = None) -> Response:
+    """Response for an already encoded JSON body"""
+    return Response(content=content, media_type="application/json", headers=headers)
+
+def encode_list(model, items: list, headers: dict = None) -> Response:
+    """Encode trusted model instances as a JSON array response"""
+    return json_response(_list_adapter(model).dump_json(items), headers)
+
+def encode_item(model, item) -> Response:
+    """Encode one trusted model instance as a JSON object response"""
+    adapter = _item_adapters.get(model)
+    if adapter is None:
+        adapter = _item_adapters[model] = TypeAdapter(model)
+    return json_response(adapter.dump_json(item))
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, Depends, Query, Request
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -11,9 +12,18 @@ import uuid
 from datetime import datetime
 
 # SQLite3 imports
-from database import db_manager
+from database import db_manager, PoolTimeoutError
+from migrations import ANALYTICS_SUMMARY_SQL
+from fuzzy_index import fuzzy_index
+from suggest_index import suggest_index
+from category_tree import category_tree
+from image_pipeline import image_pipeline
+from compression import CompressionMiddleware, compression_stats
+from query_builder import get_query_stats
+from cache import get_cache_stats
+from pagination import NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER
 from websocket_manager import manager, WebSocketEventTypes
-from routes import users, products, orders, conversations, messages, categories, reviews, profiles
+from routes import users, products, orders, conversations, messages, categories, reviews, profiles, suggest, images
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -42,6 +52,8 @@ api_router.include_router(messages.router)
 api_router.include_router(categories.router)
 api_router.include_router(reviews.router)
 api_router.include_router(profiles.router)
+api_router.include_router(suggest.router)
+api_router.include_router(images.router)
 
 # MongoDB Models (keeping existing)
 class StatusCheck(BaseModel):
@@ -72,10 +84,10 @@ async def get_status_checks():
 # Database initialization endpoint
 @api_router.post("/init-database")
 async def initialize_database():
-    """Initialize SQLite3 database with all tables"""
+    """Bring the SQLite3 schema up to date and report time-to-ready"""
     try:
-        await db_manager.init_database()
-        return {"message": "Database initialized successfully"}
+        report = await db_manager.init_database()
+        return {"message": "Database initialized successfully", **report}
     except Exception as e:
         return {"error": f"Failed to initialize database: {str(e)}"}
 
@@ -133,27 +145,65 @@ async def get_user_status(user_id: str):
     """Check if a specific user is online"""
     return {"user_id": user_id, "is_online": manager.is_user_online(user_id)}
 
+@api_router.get("/system/db-pool")
+async def get_db_pool_stats():
+    """Get SQLite3 connection pool statistics"""
+    return db_manager.get_pool_stats()
+
+@api_router.get("/system/query-cache")
+async def get_query_cache_stats():
+    """Get compiled list query cache statistics"""
+    return get_query_stats()
+
+@api_router.get("/system/entity-cache")
+async def get_entity_cache_stats():
+    """Get product, category, user and profile detail cache hit rate and memory use"""
+    return get_cache_stats()
+
+@api_router.get("/system/listing-cache")
+async def get_listing_cache_stats():
+    """Get product listing page cache hit rate, memory use and evictions"""
+    return products.PRODUCT_LIST_CACHE.get_stats()
+
+@api_router.get("/system/fuzzy-index")
+async def get_fuzzy_index_stats():
+    """Get fuzzy name index size and search timing"""
+    return fuzzy_index.get_stats()
+
+@api_router.get("/system/facet-cache")
+async def get_facet_cache_stats():
+    """Get product facet result cache statistics"""
+    return products.PRODUCT_FACETS.get_stats()
+
+@api_router.get("/system/suggest-index")
+async def get_suggest_index_stats():
+    """Get autocomplete index size and cache hit rate"""
+    return suggest_index.get_stats()
+
+@api_router.get("/system/category-tree")
+async def get_category_tree_stats():
+    """Get category tree snapshot size and rebuild time"""
+    return category_tree.get_stats()
+
+@api_router.get("/system/image-pipeline")
+async def get_image_pipeline_stats():
+    """Get image derivative render counts and timing"""
+    return image_pipeline.get_stats()
+
+@api_router.get("/system/compression")
+async def get_compression_stats():
+    """Get response compression ratio and time per route"""
+    return compression_stats.get_stats()
+
 # Analytics endpoints
 @api_router.get("/analytics/summary")
 async def get_analytics_summary():
     """Get system analytics summary"""
-    async with await db_manager.get_connection() as db:
+    async with await db_manager.get_read_connection() as db:
         try:
-            # Count totals
-            cursor = await db.execute("SELECT COUNT(*) FROM users")
-            total_users = (await cursor.fetchone())[0]
-            
-            cursor = await db.execute("SELECT COUNT(*) FROM products WHERE status = 'active'")
-            active_products = (await cursor.fetchone())[0]
-            
-            cursor = await db.execute("SELECT COUNT(*) FROM orders")
-            total_orders = (await cursor.fetchone())[0]
-            
-            cursor = await db.execute("SELECT COUNT(*) FROM conversations WHERE is_active = 1")
-            active_conversations = (await cursor.fetchone())[0]
-            
-            cursor = await db.execute("SELECT COUNT(*) FROM messages WHERE sent_at >= datetime('now', '-24 hours')")
-            messages_24h = (await cursor.fetchone())[0]
+            # Counters and message buckets are maintained by triggers
+            cursor = await db.execute(ANALYTICS_SUMMARY_SQL)
+            total_users, active_products, total_orders, active_conversations, messages_24h = await cursor.fetchone()
             
             return {
                 "total_users": total_users,
@@ -169,12 +219,20 @@ async def get_analytics_summary():
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """Report database pool exhaustion as a retryable error"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER],
 )
 
 # Configure logging
@@ -188,11 +246,24 @@ logger = logging.getLogger(__name__)
 async def startup_event():
     """Initialize database on startup"""
     try:
-        await db_manager.init_database()
-        logger.info("SQLite3 database initialized successfully")
+        report = await db_manager.init_database()
+        logger.info(
+            f"SQLite3 database initialized successfully "
+            f"(schema v{report['schema_version']}, ready in {report['time_to_ready_ms']} ms)"
+        )
+        async with await db_manager.get_read_connection() as db:
+            await fuzzy_index.load(db)
+            await suggest_index.load(db)
+            await category_tree.load(db)
+        logger.info(
+            f"Search indexes loaded: {fuzzy_index.get_stats()['entries']} fuzzy entries, "
+            f"{suggest_index.get_stats()['suggestions']} suggestions"
+        )
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    image_pipeline.shutdown()
+    await db_manager.close()
@@ -0,0 +1,235 @@
+"""
+In-memory autocomplete index for the search box.
+
+Suggestions are active product names, active category names and active
+farmer names. Every word of a name starts a key, so "tom" suggests both
+"Tomato" and "Cherry Tomato". Keys live in one sorted array and a prefix is a
+contiguous range found by binary search. Identical names of one kind are a
+single suggestion whose weight adds up its owners:
+
+- product name: 1 per active listing plus 1 per order of those listings
+- category: 1 plus its active listings
+- farmer: 1 plus their active listings
+
+Short prefixes match the most keys, so the top-k results for prefixes of up
+to CACHED_PREFIX_LENGTH characters are cached and invalidated precisely when
+a key under them changes weight.
+
+The index is loaded from the database on startup and updated by the product,
+category, user and order routes after each committed write. It is per
+process; with several workers each one holds its own copy.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from fuzzy_index import normalize
+
+CACHED_PREFIX_LENGTH = 3
+
+# Sorts after every real character, closing a prefix range
+_RANGE_END = "\U0010ffff"
+
+# Listings repeat the same few names, so normalize each one once
+_normalize = lru_cache(maxsize=65536)(normalize)
+
+Entry = Tuple[str, str]  # (kind, normalized name)
+Owner = Tuple[str, str]  # (kind, product/category/user id)
+
+def _keys_for(normalized: str) -> List[str]:
+    """The name itself and every word-suffix of it"""
+    words = normalized.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+class SuggestIndex:
+    """Popularity-weighted prefix suggestions over products, categories and farmers"""
+
+    def __init__(self):
+        self._reset()
+        self.lookups = 0
+        self.cache_hits = 0
+        self.loaded = False
+
+    def _reset(self):
+        """Drop every suggestion"""
+        self._keys: List[Tuple[str, str, str]] = []  # (key, kind, normalized name), sorted
+        self._entry_weight: Dict[Entry, int] = {}
+        self._entry_display: Dict[Entry, str] = {}
+        self._owner_name: Dict[Owner, Tuple[str, str]] = {}  # (display, normalized)
+        self._owner_weight: Dict[Owner, int] = {}
+        self._listings: Counter = Counter()  # active listings per category/farmer owner
+        self._orders: Counter = Counter()  # orders per product owner
+        self._product_links: Dict[str, Tuple[str, str]] = {}  # product_id -> (category_id, seller_id)
+        self._cache: Dict[str, Dict[tuple, list]] = {}
+        self._loading = False  # keys are sorted once at the end of load()
+
+    async def load(self, db):
+        """Index active products, categories and farmers"""
+        self._reset()
+        self._loading = True
+        cursor = await db.execute("SELECT product_id, COUNT(*) FROM orders GROUP BY product_id")
+        self._orders.update({("product", product_id): count for product_id, count in await cursor.fetchall()})
+        cursor = await db.execute("SELECT category_id, name FROM product_categories WHERE is_active = 1")
+        for category_id, name in await cursor.fetchall():
+            self.put_category(category_id, name)
+        cursor = await db.execute("SELECT user_id, full_name FROM users WHERE user_type = 'farmer' AND is_active = 1")
+        for user_id, name in await cursor.fetchall():
+            self.put_farmer(user_id, name)
+        cursor = await db.execute("SELECT product_id, name, category_id, seller_id FROM products WHERE status = 'active'")
+        for product_id, name, category_id, seller_id in await cursor.fetchall():
+            self.put_product(product_id, name, category_id, seller_id)
+        self._keys = sorted(
+            (key, kind, normalized) for kind, normalized in self._entry_weight for key in _keys_for(normalized)
+        )
+        self._loading = False
+        self.loaded = True
+
+    # Entity maintenance
+    def put_product(self, product_id: str, name: str, category_id: str, seller_id: str):
+        """Add or update an active product"""
+        self.remove_product(product_id)
+        self._product_links[product_id] = (category_id, seller_id)
+        self._listings[("category", category_id)] += 1
+        self._listings[("farmer", seller_id)] += 1
+        self._set_owner(("product", product_id), name)
+        self._reweigh(("category", category_id))
+        self._reweigh(("farmer", seller_id))
+
+    def remove_product(self, product_id: str):
+        """Drop a product that was deleted or is no longer active"""
+        links = self._product_links.pop(product_id, None)
+        if links is None:
+            return
+        category_id, seller_id = links
+        self._listings[("category", category_id)] -= 1
+        self._listings[("farmer", seller_id)] -= 1
+        self._set_owner(("product", product_id), None)
+        self._reweigh(("category", category_id))
+        self._reweigh(("farmer", seller_id))
+
+    def record_order(self, product_id: str):
+        """Count an order towards its product's popularity"""
+        self._orders[("product", product_id)] += 1
+        self._reweigh(("product", product_id))
+
+    def put_category(self, category_id: str, name: str):
+        """Add or rename an active category"""
+        self._set_owner(("category", category_id), name)
+
+    def remove_category(self, category_id: str):
+        """Drop a category that was deleted or deactivated"""
+        self._set_owner(("category", category_id), None)
+
+    def put_farmer(self, user_id: str, name: str):
+        """Add or rename an active farmer"""
+        self._set_owner(("farmer", user_id), name)
+
+    def remove_farmer(self, user_id: str):
+        """Drop a farmer who was deleted, deactivated or changed role"""
+        self._set_owner(("farmer", user_id), None)
+
+    # Weights
+    def _weight_of(self, owner: Owner) -> int:
+        if owner[0] == "product":
+            return 1 + self._orders[owner]
+        return 1 + self._listings[owner]
+
+    def _set_owner(self, owner: Owner, name: Optional[str]):
+        """Move an owner's weight to the entry for its new name (None removes it)"""
+        old = self._owner_name.pop(owner, None)
+        old_weight = self._owner_weight.pop(owner, 0)
+        if old is not None:
+            self._add_weight((owner[0], old[1]), old[0], -old_weight)
+        if name:
+            weight = self._weight_of(owner)
+            normalized = _normalize(name)
+            self._owner_name[owner] = (name, normalized)
+            self._owner_weight[owner] = weight
+            self._add_weight((owner[0], normalized), name, weight)
+
+    def _reweigh(self, owner: Owner):
+        """Apply a change in an indexed owner's listings or orders"""
+        named = self._owner_name.get(owner)
+        if named is None:
+            return
+        weight = self._weight_of(owner)
+        delta = weight - self._owner_weight[owner]
+        if delta:
+            self._owner_weight[owner] = weight
+            self._add_weight((owner[0], named[1]), named[0], delta)
+
+    def _add_weight(self, entry: Entry, display: str, delta: int):
+        """Change a suggestion's weight, adding or removing its keys as needed"""
+        kind, normalized = entry
+        existed = entry in self._entry_weight
+        weight = self._entry_weight.get(entry, 0) + delta
+        if weight > 0:
+            self._entry_weight[entry] = weight
+            if not existed:
+                self._entry_display[entry] = display
+                if not self._loading:
+                    for key in _keys_for(normalized):
+                        insort(self._keys, (key, kind, normalized))
+        elif existed:
+            del self._entry_weight[entry]
+            del self._entry_display[entry]
+            if self._loading:
+                return
+            for key in _keys_for(normalized):
+                index = bisect_left(self._keys, (key, kind, normalized))
+                if index < len(self._keys) and self._keys[index] == (key, kind, normalized):
+                    del self._keys[index]
+        if self._cache:
+            for key in _keys_for(normalized):
+                for length in range(1, min(len(key), CACHED_PREFIX_LENGTH) + 1):
+                    self._cache.pop(key[:length], None)
+
+    # Lookup
+    def suggest(self, prefix: str, limit: int = 10, kinds: Optional[Set[str]] = None) -> List[dict]:
+        """Top suggestions starting with prefix, heaviest first"""
+        normalized = " ".join(_normalize(prefix).split())
+        if not normalized:
+            return []
+        self.lookups += 1
+        # An empty kinds set matches nothing; it must not share the unfiltered key
+        cache_key = (None if kinds is None else tuple(sorted(kinds)), limit)
+        cacheable = len(normalized) <= CACHED_PREFIX_LENGTH
+        if cacheable:
+            cached = self._cache.get(normalized, {}).get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        start = bisect_left(self._keys, (normalized,))
+        end = bisect_left(self._keys, (normalized + _RANGE_END,), start)
+        entries = {
+            (kind, name) for _, kind, name in self._keys[start:end]
+            if kinds is None or kind in kinds
+        }
+        top = heapq.nsmallest(
+            limit, entries, key=lambda entry: (-self._entry_weight[entry], self._entry_display[entry])
+        )
+        results = [
+            {"kind": entry[0], "text": self._entry_display[entry], "weight": self._entry_weight[entry]}
+            for entry in top
+        ]
+        if cacheable:
+            self._cache.setdefault(normalized, {})[cache_key] = results
+        return results
+
+    def get_stats(self) -> dict:
+        """Get index size and cache effectiveness"""
+        return {
+            "loaded": self.loaded,
+            "suggestions": len(self._entry_weight),
+            "keys": len(self._keys),
+            "cached_prefixes": len(self._cache),
+            "lookups": self.lookups,
+            "cache_hit_rate": round(self.cache_hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+# Global suggestion index instance
+suggest_index = SuggestIndex()
@@ -0,0 +1,46 @@
+"""
+Shared fixtures: the backend modules are flat imports from backend/, and the
+app runs against a fresh SQLite database and blob store in a temporary
+directory.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """TestClient over the whole app, migrated from scratch"""
+    from fastapi.testclient import TestClient
+    from blob_store import blob_store
+    from database import db_manager
+    from image_pipeline import image_pipeline
+    import server
+
+    data_dir = tmp_path_factory.mktemp("db")
+    db_manager.db_path = str(data_dir / "application.db")
+    blob_store.root = data_dir / "blobs"
+    image_pipeline.root = data_dir / "blobs" / "derived"
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def seller(client):
+    response = client.post("/api/users/", json={
+        "full_name": "Test Farmer", "email": f"farmer-{os.urandom(4).hex()}@example.com", "user_type": "farmer",
+    })
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.fixture
+def category(client):
+    response = client.post("/api/categories/", json={"name": f"Category {os.urandom(4).hex()}"})
+    assert response.status_code == 200
+    return response.json()
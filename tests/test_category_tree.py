@@ -0,0 +1,38 @@
+import os
+
+def make_category(client, parent=None):
+    response = client.post("/api/categories/", json={
+        "name": f"Category {os.urandom(4).hex()}", "parent_category_id": parent and parent["category_id"],
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def make_product(client, seller, category):
+    response = client.post("/api/products/", json={
+        "name": "Greens", "price": 1.5, "seller_id": seller["user_id"], "category_id": category["category_id"],
+    })
+    assert response.status_code == 200
+    return response.json()["product_id"]
+
+def product_ids(client, category, **params):
+    response = client.get("/api/products/", params={"category_id": category["category_id"], **params})
+    assert response.status_code == 200
+    return {product["product_id"] for product in response.json()}
+
+def test_tree_nests_children(client):
+    root = make_category(client)
+    child = make_category(client, root)
+    grandchild = make_category(client, child)
+    tree = {node["category_id"]: node for node in client.get("/api/categories/tree").json()}
+    [child_node] = tree[root["category_id"]]["children"]
+    assert child_node["category_id"] == child["category_id"]
+    assert [node["category_id"] for node in child_node["children"]] == [grandchild["category_id"]]
+
+def test_include_descendants_lists_the_subtree(client, seller):
+    root = make_category(client)
+    child = make_category(client, root)
+    grandchild = make_category(client, child)
+    products = [make_product(client, seller, category) for category in (root, child, grandchild)]
+    assert product_ids(client, root) == {products[0]}
+    assert product_ids(client, root, include_descendants=True) == set(products)
+    assert product_ids(client, child, include_descendants=True) == set(products[1:])
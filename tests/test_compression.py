@@ -0,0 +1,28 @@
+import pytest
+
+def vary(response) -> set:
+    return {part.strip().lower() for part in response.headers.get("vary", "").split(",") if part.strip()}
+
+def test_compressed_response_varies_on_accept_encoding(client):
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in vary(response)
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip;q=0, br;q=0, zstd;q=0, deflate;q=0"])
+def test_identity_response_still_varies(client, accept_encoding):
+    response = client.get("/openapi.json", headers={"Accept-Encoding": accept_encoding})
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in vary(response)
+
+def test_small_response_still_varies(client, category):
+    response = client.get(f"/api/categories/{category['category_id']}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in vary(response)
+
+def test_incompressible_response_does_not_vary(client):
+    data = b"\x89PNG\r\n\x1a\n" + bytes(2048)
+    blob_id = client.post("/api/images", content=data).json()["blob_id"]
+    response = client.get(f"/api/images/{blob_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" not in vary(response)
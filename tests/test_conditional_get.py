@@ -0,0 +1,58 @@
+import pytest
+
+@pytest.fixture
+def product(client, seller, category):
+    response = client.post("/api/products/", json={
+        "name": "Beans", "price": 3.5, "seller_id": seller["user_id"], "category_id": category["category_id"],
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def test_matching_etag_answers_304(client, product):
+    url = f"/api/products/{product['product_id']}"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+def test_update_changes_product_etag(client, product):
+    url = f"/api/products/{product['product_id']}"
+    etag = client.get(url).headers["etag"]
+    assert client.put(url, json={"price": 4.0}).status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["price"] == 4.0
+
+@pytest.mark.parametrize("kind", ["product", "user"])
+def test_partial_etag_does_not_validate_full_body(client, product, kind):
+    url = f"/api/products/{product['product_id']}" if kind == "product" else f"/api/users/{product['seller_id']}"
+    # Twice each, so the second read of each comes from the entity cache
+    for _ in range(2):
+        partial = client.get(url, params={"fields": "full_name" if kind == "user" else "name"})
+        full = client.get(url, headers={"If-None-Match": partial.headers["etag"]})
+        assert full.status_code == 200
+        assert len(full.json()) > 1
+        assert partial.headers["etag"] != full.headers["etag"]
+    same = client.get(url, params={"fields": "full_name" if kind == "user" else "name"},
+                      headers={"If-None-Match": partial.headers["etag"]})
+    assert same.status_code == 304
+
+def test_weak_etag_from_compressed_response_matches(client, product):
+    url = f"/api/products/{product['product_id']}"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+@pytest.mark.parametrize("if_none_match", ["current", "*"])
+def test_missing_category_is_404_not_304(client, category, if_none_match):
+    etag = client.get(f"/api/categories/{category['category_id']}").headers["etag"]
+    response = client.get("/api/categories/no-such-category", headers={
+        "If-None-Match": etag if if_none_match == "current" else "*",
+    })
+    assert response.status_code == 404
+
+def test_category_revalidates(client, category):
+    url = f"/api/categories/{category['category_id']}"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
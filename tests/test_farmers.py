@@ -0,0 +1,17 @@
+def test_farmer_directory_schema_declares_distance(client):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/users/farmers"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response["items"]["$ref"].endswith("/NearbyUser")
+    assert "distance_km" in schema["components"]["schemas"]["NearbyUser"]["properties"]
+
+def test_nearby_farmers_carry_distance(client):
+    user = client.post("/api/users/", json={
+        "full_name": "Near Farmer", "email": "near-farmer@example.com", "user_type": "farmer",
+        "latitude": 7.2906, "longitude": 80.6337,
+    }).json()
+    farmers = client.get("/api/users/farmers", params={"near": "7.29,80.63", "radius_km": 5}).json()
+    match = next(f for f in farmers if f["user_id"] == user["user_id"])
+    assert 0 <= match["distance_km"] < 5
+
+    listed = client.get("/api/users/farmers").json()
+    assert any(f["user_id"] == user["user_id"] for f in listed)
@@ -0,0 +1,67 @@
+import asyncio
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+import image_pipeline as pipeline_module
+from blob_store import blob_store
+from image_pipeline import ImagePipeline, ImageProcessingError
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "root", tmp_path / "blobs")
+    pipeline = ImagePipeline(tmp_path / "derived", workers=1)
+    yield pipeline
+    pipeline.shutdown()
+
+def store(data: bytes) -> str:
+    return blob_store.save_bytes(data)[0]
+
+def photo() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), "green").save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_undecodable_source_is_remembered(pipeline):
+    blob_id = store(b"\x89PNG\r\n\x1a\n" + b"not an image" * 10)
+    with pytest.raises(ImageProcessingError):
+        asyncio.run(pipeline.ensure(blob_id, "thumb"))
+    assert blob_id in pipeline._unprocessable
+
+def test_missing_source_is_not_remembered(pipeline):
+    data = photo()
+    blob_id = store(data)
+    source = blob_store.path_for(blob_id)
+    source.rename(source.with_suffix(".moved"))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(pipeline.ensure(blob_id, "thumb"))
+    assert blob_id not in pipeline._unprocessable
+    source.with_suffix(".moved").rename(source)
+    assert asyncio.run(pipeline.ensure(blob_id, "thumb")).is_file()
+
+def test_broken_pool_is_replaced(pipeline, monkeypatch):
+    blob_id = store(photo())
+    broken = pipeline._pool()
+    run_render = pipeline._run_render
+    calls = []
+
+    async def fail_once(*args):
+        calls.append(pipeline._executor)
+        if len(calls) == 1:
+            raise BrokenProcessPool("worker died")
+        await run_render(*args)
+
+    monkeypatch.setattr(pipeline, "_run_render", fail_once)
+    assert asyncio.run(pipeline.ensure(blob_id, "thumb")).is_file()
+    assert calls[0] is broken and pipeline._executor is not broken
+    assert not pipeline._unprocessable
+
+def test_unprocessable_sources_are_bounded(pipeline, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "MAX_UNPROCESSABLE", 2)
+    blob_ids = [store(b"GIF89a" + bytes([number]) * 20) for number in range(3)]
+    for blob_id in blob_ids:
+        with pytest.raises(ImageProcessingError):
+            asyncio.run(pipeline.ensure(blob_id, "thumb"))
+    assert list(pipeline._unprocessable) == blob_ids[1:]
@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+import pytest
+
+from blob_store import blob_store
+import routes.images
+
+def png() -> bytes:
+    """A PNG signature with random trailing bytes: new content, sniffed as PNG"""
+    return b"\x89PNG\r\n\x1a\n" + os.urandom(64)
+
+def upload(client, data: bytes):
+    return client.post("/api/images", content=data, headers={"Content-Type": "application/octet-stream"})
+
+class FailingClock:
+    """Stands in for datetime so the blobs metadata insert fails"""
+
+    @staticmethod
+    def utcnow():
+        raise OSError("disk I/O error")
+
+@pytest.fixture
+def failing_metadata(monkeypatch):
+    monkeypatch.setattr(routes.images, "datetime", FailingClock)
+
+def test_upload_stores_file_and_metadata(client):
+    response = upload(client, png())
+    assert response.status_code == 200
+    blob_id = response.json()["blob_id"]
+    assert blob_store.exists(blob_id)
+    assert client.get(f"/api/images/{blob_id}").status_code == 200
+
+def test_failed_metadata_insert_removes_new_file(client, failing_metadata):
+    data = png()
+    response = upload(client, data)
+    assert response.status_code == 400
+    assert not blob_store.exists(hashlib.sha256(data).hexdigest())
+
+def test_failed_metadata_insert_keeps_existing_file(client, monkeypatch):
+    data = png()
+    blob_id = upload(client, data).json()["blob_id"]
+    monkeypatch.setattr(routes.images, "datetime", FailingClock)
+    assert upload(client, data).status_code == 400
+    assert blob_store.exists(blob_id)
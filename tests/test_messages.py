@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+def _user(client, name):
+    response = client.post("/api/users/", json={
+        "full_name": name, "email": f"{name.lower()}-{os.urandom(4).hex()}@example.com", "user_type": "buyer",
+    })
+    return response.json()["user_id"]
+
+@pytest.fixture
+def chat(client):
+    """A conversation where alice sent bob three messages"""
+    alice, bob = _user(client, "Alice"), _user(client, "Bob")
+    conversation_id = client.post("/api/conversations/", json={
+        "participant_1_id": alice, "participant_2_id": bob,
+    }).json()["conversation_id"]
+    message_ids = [
+        client.post("/api/messages/", json={
+            "conversation_id": conversation_id, "sender_id": alice, "content": f"message {n}",
+        }).json()["message_id"]
+        for n in range(3)
+    ]
+    return conversation_id, bob, message_ids
+
+def _unread(client, conversation_id, user_id):
+    conversations = client.get("/api/conversations/", params={"user_id": user_id}).json()
+    return next(c["unread_count"] for c in conversations if c["conversation_id"] == conversation_id)
+
+def _read_flags(client, conversation_id):
+    messages = client.get("/api/messages/", params={"conversation_id": conversation_id}).json()
+    return [m["is_read"] for m in messages]
+
+def test_new_messages_count_as_unread(client, chat):
+    conversation_id, bob, _ = chat
+    assert _unread(client, conversation_id, bob) == 3
+    assert _read_flags(client, conversation_id) == [False, False, False]
+
+def test_mark_read_moves_the_watermark(client, chat):
+    conversation_id, bob, _ = chat
+    response = client.put(f"/api/messages/conversation/{conversation_id}/mark-read", params={"user_id": bob})
+    assert response.status_code == 200
+    assert _unread(client, conversation_id, bob) == 0
+    assert _read_flags(client, conversation_id) == [True, True, True]
+
+def test_mark_unread_below_the_watermark(client, chat):
+    conversation_id, bob, message_ids = chat
+    client.put(f"/api/messages/conversation/{conversation_id}/mark-read", params={"user_id": bob})
+
+    response = client.put(f"/api/messages/{message_ids[1]}", json={"is_read": False})
+    assert response.status_code == 200
+    assert response.json()["is_read"] is False
+    assert _unread(client, conversation_id, bob) == 1
+    assert _read_flags(client, conversation_id) == [True, False, True]
+
+    # And back again
+    assert client.put(f"/api/messages/{message_ids[1]}", json={"is_read": True}).json()["is_read"] is True
+    assert _unread(client, conversation_id, bob) == 0
+    assert _read_flags(client, conversation_id) == [True, True, True]
+
+def test_mark_single_message_read_and_unread_above_the_watermark(client, chat):
+    conversation_id, bob, message_ids = chat
+    client.put(f"/api/messages/{message_ids[2]}", json={"is_read": True})
+    assert _unread(client, conversation_id, bob) == 2
+    client.put(f"/api/messages/{message_ids[2]}", json={"is_read": False})
+    assert _unread(client, conversation_id, bob) == 3
+    assert _read_flags(client, conversation_id) == [False, False, False]
@@ -0,0 +1,45 @@
+import pytest
+
+@pytest.fixture
+def listing(client, seller, category):
+    """Seven products of one seller, in list order"""
+    for number in range(7):
+        response = client.post("/api/products/", json={
+            "name": f"Crate {number}", "price": 2.0 + number,
+            "seller_id": seller["user_id"], "category_id": category["category_id"],
+        })
+        assert response.status_code == 200
+    response = client.get("/api/products/", params={"seller_id": seller["user_id"], "limit": 100})
+    return [product["product_id"] for product in response.json()]
+
+def page(client, seller, **params):
+    response = client.get("/api/products/", params={"seller_id": seller["user_id"], "limit": 3, **params})
+    assert response.status_code == 200
+    return [product["product_id"] for product in response.json()], response.headers
+
+def test_next_cursors_walk_the_whole_list(client, seller, listing):
+    ids, headers = page(client, seller)
+    assert "X-Prev-Cursor" not in headers
+    while "X-Next-Cursor" in headers:
+        more, headers = page(client, seller, after=headers["X-Next-Cursor"])
+        ids += more
+    assert ids == listing
+
+def test_prev_cursor_returns_to_the_previous_page(client, seller, listing):
+    first, headers = page(client, seller)
+    second, headers = page(client, seller, after=headers["X-Next-Cursor"])
+    assert second == listing[3:6]
+    back, headers = page(client, seller, before=headers["X-Prev-Cursor"])
+    assert back == first == listing[:3]
+    assert "X-Next-Cursor" in headers
+
+def test_cursors_survive_a_field_selection(client, seller, listing):
+    # The sort key (created_at) is selected for the cursor but not returned
+    _, headers = page(client, seller, fields="product_id")
+    rest, _ = page(client, seller, fields="product_id", after=headers["X-Next-Cursor"])
+    assert rest == listing[3:6]
+
+@pytest.mark.parametrize("params", [{"after": "not-a-cursor"}, {"after": "WzFd", "before": "WzFd"}])
+def test_bad_cursor_params_are_rejected(client, seller, params):
+    response = client.get("/api/products/", params={"seller_id": seller["user_id"], **params})
+    assert response.status_code == 400
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+@pytest.fixture
+def produce(client, seller, category):
+    """A product with a name no other test uses, so its prefix is uncached"""
+    name = f"Qx{os.urandom(3).hex()} Fennel"
+    response = client.post("/api/products/", json={
+        "name": name, "price": 2.0, "seller_id": seller["user_id"], "category_id": category["category_id"],
+    })
+    assert response.status_code == 200
+    return name
+
+def test_suggests_by_prefix(client, produce):
+    response = client.get("/api/suggest", params={"q": produce[:4]})
+    assert [suggestion["text"] for suggestion in response.json()] == [produce]
+
+def test_unknown_kind_is_rejected_and_not_cached(client, produce):
+    prefix = produce[:4]
+    assert client.get("/api/suggest", params={"q": prefix, "kind": "bogus"}).status_code == 400
+    assert client.get("/api/suggest", params={"q": prefix, "kind": "farmer"}).json() == []
+    assert [suggestion["text"] for suggestion in client.get("/api/suggest", params={"q": prefix}).json()] == [produce]
+
+def test_empty_kinds_do_not_share_the_unfiltered_cache_entry():
+    from suggest_index import SuggestIndex
+    index = SuggestIndex()
+    index.put_category("c1", "Fennel")
+    assert index.suggest("fen", kinds=set()) == []
+    assert [suggestion["text"] for suggestion in index.suggest("fen")] == ["Fennel"]
@@ -0,0 +1,43 @@
+import asyncio
+
+from database import WriterLane
+
+def test_concurrent_first_writes_share_one_connection(tmp_path):
+    async def scenario():
+        lane = WriterLane(str(tmp_path / "lane.db"))
+        holders = []
+
+        async def write(n):
+            conn = await lane.acquire()
+            try:
+                holders.append(conn)
+                await conn.execute("CREATE TABLE IF NOT EXISTS t (n INTEGER)")
+                await conn.execute("INSERT INTO t VALUES (?)", (n,))
+                await conn.commit()
+            finally:
+                await lane.release(conn)
+
+        await asyncio.gather(*(write(n) for n in range(20)))
+        stats = lane.get_stats()
+        await lane.close()
+        return holders, stats
+
+    holders, stats = asyncio.run(scenario())
+    assert len({id(conn) for conn in holders}) == 1
+    assert stats["checkouts"] == 20
+    assert not stats["busy"]
+
+def test_close_fails_queued_callers(tmp_path):
+    async def scenario():
+        lane = WriterLane(str(tmp_path / "lane.db"), checkout_timeout=5)
+        conn = await lane.acquire()
+        waiter = asyncio.create_task(lane.acquire())
+        await asyncio.sleep(0.05)
+        await lane.close()
+        try:
+            await asyncio.wait_for(waiter, timeout=1)
+        except RuntimeError as e:
+            return str(e)
+        return "granted"
+
+    assert asyncio.run(scenario()) == "Writer lane is closed"